@@ -1,5 +1,37 @@
+import secrets
+from functools import partial
+
 import streamlit as st
+import numpy as np
 import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+from moteur import (
+    cles_variables, courbes_reponse, creer_plan, depart_a_chaud, donnees_optimisation, donnees_optimisation_lignes,
+    donnees_optimisation_periodes, lignes_disponibles, maj_resumes, resume_supports, tableau_periodes, tableau_plans
+)
+from reponse import courbes_variables
+from incertitude import LOIS, evaluer_tirages, incertitudes_defaut, resume_tirages, tirer_facteurs
+from ingestion import statistiques_lignes
+from stockage import FICHIER_STOCKAGE, lire_plan_memorise, ouvrir_stockage
+from taches import ANNULEE, ECHEC, EN_ATTENTE, TERMINEE
+
+# Formats des tableaux de résumé: valeurs gardées numériques (tri, export), formatées à l'affichage
+FORMATS_RESUMES = {
+    'Contacts': st.column_config.NumberColumn(format="localized"),
+    'Budget (€)': st.column_config.NumberColumn(format="localized"),
+    'CO2g/Contact': st.column_config.NumberColumn(format="%.3f"),
+    'CO2 Total (g)': st.column_config.NumberColumn(format="localized"),
+    'CO2 Total (kg)': st.column_config.NumberColumn(format="%.2f"),
+    '% du CO2 total': st.column_config.NumberColumn(format="%.1f %%"),
+}
+# Lignes affichées par page dans « Détails par Plan »
+TAILLE_PAGE_DETAILS = 1_000
+# Secondes entre deux rafraîchissements de la progression d'un calcul en arrière-plan
+INTERVALLE_SUIVI = 0.5
+# Attente après le lancement d'un calcul: les calculs rapides s'affichent sans suivi
+ATTENTE_TACHE_RAPIDE = 0.3
 
 # Configuration de la page
 st.set_page_config(
@@ -13,19 +45,757 @@ st.title("Calculateur d'Empreinte Carbone des Plans Média")
 st.markdown("---")
 
 # Chargement du fichier de référence CO2
-@st.cache_data
 def load_co2_reference():
-    """Charge le fichier de référence CO2g contact.xlsx"""
+    """Charge la table de référence CO2g contact.xlsx (cache binaire, relu si l'Excel change)"""
     try:
-        df = pd.read_excel('CO2g contact.xlsx')
-        # Nettoyer les données - garder Alpha même avec NaN
-        df = df[['Support', 'CO2g/Contact', 'Alpha']]
-        df = df[df['Support'].notna() & df['CO2g/Contact'].notna()]
-        return df
+        from reference import charger_reference
+        return charger_reference('CO2g contact.xlsx')
     except Exception as e:
         st.error(f"Erreur lors du chargement du fichier CO2g contact.xlsx : {e}")
         return None
 
+# Stockage persistant (SQLite): fichiers lus, plans et résultats conservés entre sessions
+@st.cache_resource
+def get_stockage():
+    """Stockage partagé entre sessions, ou None si la base ne peut pas être ouverte"""
+    return ouvrir_stockage(FICHIER_STOCKAGE)
+
+# Cache des résultats d'optimisation, partagé entre toutes les sessions
+@st.cache_resource
+def get_cache_optimisation():
+    """Cache LRU de l'optimiseur (mêmes scénarios => résultats instantanés), adossé au stockage"""
+    from optimizer import CacheResultats
+    return CacheResultats(taille_max=256, stockage=get_stockage())
+
+# Calculs en arrière-plan (optimisation, Pareto, grille), partagés entre sessions
+@st.cache_resource
+def get_gestionnaire_taches():
+    """File de calculs indépendante des reruns: un slider déplacé n'interrompt pas un calcul"""
+    from taches import GestionnaireTaches
+    return GestionnaireTaches()
+
+def lancer_tache(nom, description, fonction, *args, contexte=None, **kwargs):
+    """
+    Lance fonction(*args, **kwargs) en arrière-plan comme tâche `nom` de la session (la
+    précédente du même nom est annulée). Le contexte est lié à la version des plans.
+    """
+    gestionnaire = get_gestionnaire_taches()
+    taches_session = st.session_state.setdefault('taches', {})
+    if nom in taches_session:
+        gestionnaire.annuler(taches_session[nom])
+    contexte = dict(contexte or {}, version_plans=st.session_state.version_plans)
+    id_tache = gestionnaire.soumettre(description, fonction, *args, contexte=contexte, **kwargs)
+    taches_session[nom] = id_tache
+    gestionnaire.tache(id_tache).attendre(ATTENTE_TACHE_RAPIDE)
+    return id_tache
+
+def tache_session(nom, version_courante=True):
+    """
+    Dernière tâche `nom` de la session, ou None (aucune, oubliée, ou lancée sur d'autres plans
+    si version_courante)
+    """
+    tache = get_gestionnaire_taches().tache(st.session_state.get('taches', {}).get(nom))
+    if tache is None or (version_courante and tache.contexte.get('version_plans') != st.session_state.version_plans):
+        return None
+    return tache
+
+def courbes_plans(modele):
+    """Courbes de réponse par support, ajustées une fois par ensemble de plans et par modèle"""
+    cle = (st.session_state.version_plans, modele)
+    if st.session_state.get('cle_courbes') != cle:
+        st.session_state.courbes = courbes_reponse(st.session_state.plans, modele, get_stockage())
+        st.session_state.cle_courbes = cle
+    return st.session_state.courbes
+
+def carbone_minimal_plans(df_optim, co2_ref, stockage, min_budget_par_canal, max_variation, granularite):
+    """Carbone minimal atteignable (g) par l'optimisation des plans avec ces bornes (plancher du plafond de CO2)"""
+    from optimizer import carbone_minimal
+    
+    df_variables = df_optim
+    if granularite == "ligne":
+        df_variables, _ = donnees_optimisation_lignes(st.session_state.plans, co2_ref, stockage)
+    return carbone_minimal(df_variables, min_budget_par_canal, max_variation, granularite)
+
+def lancer_optimisation(df_optim, co2_ref, stockage, parametres, modele_reponse="lineaire"):
+    """
+    Lance l'optimisation en arrière-plan, démarrée à chaud depuis la dernière allocation optimale
+    de même granularité: après l'ajout ou le retrait d'un plan, seules les variables nouvelles
+    partent du budget initial. Hors modèle "lineaire", contacts à rendements décroissants.
+    Avec parametres['carbone_max'] (g) au lieu de w_carbone: contacts maximaux sous ce plafond
+    de CO2 (contacts linéaires).
+    """
+    from optimizer import optimisation_media, optimisation_plafond_carbone
+    
+    # Variables de l'optimiseur: supports, ou lignes de plans
+    granularite = parametres['granularite']
+    df_variables = df_optim
+    if granularite == "ligne":
+        df_variables, _ = donnees_optimisation_lignes(st.session_state.plans, co2_ref, stockage)
+    x_depart = depart_a_chaud(df_variables, st.session_state.get('allocations', {}).get(granularite))
+    courbes = None
+    if modele_reponse != "lineaire":
+        courbes = courbes_variables(df_variables, courbes_plans(modele_reponse))
+    
+    # Plafond de CO2: résolution exacte directe (pas de départ à chaud ni de courbes)
+    if 'carbone_max' in parametres:
+        fonction, options = optimisation_plafond_carbone, {}
+        objectif = f"Plafond CO2 {parametres['carbone_max'] / 1000:,.0f} kg"
+    else:
+        fonction, options = optimisation_media, dict(x_depart=x_depart, courbes=courbes)
+        objectif = f"Optimisation w={parametres['w_carbone']:.2f}"
+    
+    # Calcul en arrière-plan: un rerun (slider déplacé...) ne l'interrompt pas
+    lancer_tache(
+        'optimisation',
+        "Optimisation",
+        fonction,
+        df_variables,
+        **parametres,
+        **options,
+        cache=get_cache_optimisation(),
+        contexte=dict(
+            granularite=granularite,
+            parametres=parametres,
+            modele_reponse=modele_reponse,
+            courbes=courbes,
+            df_variables=df_variables,
+            df_optim=df_optim.copy(),
+            scenario=(
+                f"{objectif}, variation={parametres['max_variation']:.1f}, "
+                f"min={parametres['min_budget_par_canal']} €"
+                + ("" if modele_reponse == "lineaire" else f", réponse {modele_reponse}")
+            )
+        )
+    )
+
+@st.fragment(run_every=INTERVALLE_SUIVI)
+def suivre_tache(id_tache, afficher_partiel=None):
+    """Progression d'une tâche, rafraîchie seule (sans rerun de la page) jusqu'à sa fin"""
+    gestionnaire = get_gestionnaire_taches()
+    tache = gestionnaire.tache(id_tache)
+    if tache is None or tache.terminee:
+        st.rerun()
+    etat = "en attente" if tache.etat == EN_ATTENTE else (tache.message or "en cours")
+    st.progress(tache.progression, text=f"{tache.description} : {etat} ({tache.duree:.1f} s)")
+    if st.button("⏹️ Annuler", key=f"annuler_{id_tache}"):
+        gestionnaire.annuler(id_tache)
+    if afficher_partiel is not None and tache.partiel is not None:
+        afficher_partiel(tache.partiel)
+
+def calculer_grille(tache, df_optim, poids, variations, budgets):
+    """Tâche de fond: grille de scénarios, tableau partiel publié au fil des tranches"""
+    import time
+    from moteur import tableau_grille
+    from optimizer import grille_scenarios
+    
+    nb_tranches = len(variations) * len(budgets)
+    tranches, dernier_partiel = [], 0.0
+    for tranche in grille_scenarios(df_optim, poids, variations, budgets, annulation=tache.annulation):
+        tranches.append(tranche)
+        partiel = None
+        if time.perf_counter() - dernier_partiel > INTERVALLE_SUIVI:
+            partiel, dernier_partiel = tableau_grille(tranches), time.perf_counter()
+        tache.avancer(
+            len(tranches) / nb_tranches,
+            f"{len(tranches) * len(poids):,} / {nb_tranches * len(poids):,} scénarios",
+            partiel
+        )
+    # Grille annulée: les scénarios déjà calculés sont conservés
+    return tableau_grille(tranches)
+
+def graphique_grille(df_grille):
+    """Nuage Contacts Utiles / Carbone des scénarios d'une grille"""
+    return px.scatter(
+        df_grille.dropna(subset=['Carbone_g']).assign(
+            Carbone_kg=lambda d: d['Carbone_g'] / 1000,
+            Variation=lambda d: d['Max_variation'].map("±{:.0%}".format)
+        ),
+        x='Carbone_kg',
+        y='Contacts_utiles',
+        color='Variation',
+        symbol='Min_budget',
+        hover_data=['w_carbone', 'Min_budget'],
+        labels={'Carbone_kg': 'Carbone (kg)', 'Contacts_utiles': 'Contacts Utiles'},
+        title='Scénarios : Contacts Utiles vs Carbone'
+    )
+
+def resultats_periodes(contexte, allocation):
+    """Tableau par période (plafonds atteints signalés) et graphiques budget / CO2 d'une optimisation par période"""
+    df_resultat = tableau_periodes(contexte['df_variables'], allocation)
+    # Plafond atteint: dépense ou carbone de la période à son plafond (à 0,01 % près)
+    plafond_budget = df_resultat['Periode'].map(contexte['plafonds_budget']).to_numpy(dtype=float)
+    plafond_carbone = df_resultat['Periode'].map(contexte['plafonds_carbone']).to_numpy(dtype=float)
+    df_resultat['Plafond_atteint'] = np.where(
+        df_resultat['Budget_Optimise'] >= plafond_budget * (1 - 1e-4), "budget", ""
+    )
+    df_resultat['Plafond_atteint'] = np.where(
+        df_resultat['Carbone_Optimise_g'] >= plafond_carbone * (1 - 1e-4),
+        (df_resultat['Plafond_atteint'] + " CO2").str.strip(), df_resultat['Plafond_atteint']
+    )
+    figures = []
+    for initial, optimise, titre, echelle in (
+        ('Budget', 'Budget_Optimise', "Budget par période (€)", 1.0),
+        ('Carbone_g', 'Carbone_Optimise_g', "CO2 par période (kg)", 1000.0),
+    ):
+        donnees = pd.DataFrame({
+            'Periode': np.tile(df_resultat['Periode'].to_numpy(), 2),
+            'Valeur': np.concatenate((df_resultat[initial], df_resultat[optimise])) / echelle,
+            'Type': ['Initial'] * len(df_resultat) + ['Optimisé'] * len(df_resultat),
+        })
+        figures.append(px.bar(
+            donnees, x='Periode', y='Valeur', color='Type', barmode='group', title=titre,
+            labels={'Periode': 'Période', 'Valeur': ''},
+            color_discrete_map={'Initial': '#1f77b4', 'Optimisé': '#2ca02c'}
+        ))
+    return df_resultat, figures
+
+def afficher_optimisation_periodes(co2_ref, w_carbone, max_variation):
+    """
+    Optimisation support × période avec plafonds de budget et de carbone par période (saisis
+    dans un tableau), lancée en arrière-plan, puis résultats par période
+    """
+    df_periodes, _ = donnees_optimisation_periodes(st.session_state.plans, co2_ref)
+    if df_periodes is None:
+        return
+    resume = tableau_periodes(df_periodes, df_periodes['Budget'])
+    st.caption(
+        f"{len(df_periodes):,} variables (support × période) sur {len(resume)} périodes. "
+        "Plafond vide : pas de limite. Poids carbone et variation max : ceux de l'optimisation ci-dessus ; "
+        "le budget total peut passer d'une période à l'autre."
+    )
+    plafonds = st.data_editor(
+        pd.DataFrame({
+            'Periode': resume['Periode'],
+            'Budget': resume['Budget'],
+            'Carbone_kg': resume['Carbone_g'] / 1000,
+            'Plafond_budget': np.nan,
+            'Plafond_carbone_kg': np.nan,
+        }),
+        column_config={
+            'Periode': st.column_config.TextColumn("Période"),
+            'Budget': st.column_config.NumberColumn("Budget initial (€)", format="%.0f"),
+            'Carbone_kg': st.column_config.NumberColumn("CO2 initial (kg)", format="%.1f"),
+            'Plafond_budget': st.column_config.NumberColumn("Plafond budget (€)", min_value=0.0, format="%.0f"),
+            'Plafond_carbone_kg': st.column_config.NumberColumn("Plafond CO2 (kg)", min_value=0.0, format="%.1f"),
+        },
+        disabled=['Periode', 'Budget', 'Carbone_kg'],
+        hide_index=True,
+        key='plafonds_periodes',
+        width=1200
+    ).set_index('Periode')
+    plafonds_budget = plafonds['Plafond_budget'].dropna().to_dict()
+    plafonds_carbone = (plafonds['Plafond_carbone_kg'].dropna() * 1000).to_dict()
+    
+    if st.button("Lancer l'optimisation par période"):
+        from optimizer import optimisation_periodes
+        lancer_tache(
+            'periodes',
+            "Optimisation par période",
+            optimisation_periodes,
+            df_periodes,
+            w_carbone=w_carbone,
+            max_variation=max_variation,
+            plafonds_budget=plafonds_budget,
+            plafonds_carbone=plafonds_carbone,
+            cache=get_cache_optimisation(),
+            contexte=dict(
+                df_variables=df_periodes,
+                plafonds_budget=plafonds_budget,
+                plafonds_carbone=plafonds_carbone,
+                scenario=(
+                    f"Par période w={w_carbone:.2f}, variation={max_variation:.1f}, "
+                    f"{len(plafonds_budget)} plafond(s) budget, {len(plafonds_carbone)} plafond(s) CO2"
+                )
+            )
+        )
+    
+    tache = tache_session('periodes')
+    if tache is not None and not tache.terminee:
+        suivre_tache(tache.id)
+    elif tache is not None and tache.etat == ECHEC:
+        st.error(f"❌ Erreur lors de l'optimisation par période : {tache.erreur}")
+    elif tache is not None and tache.etat == ANNULEE:
+        st.info("Optimisation par période annulée")
+    elif tache is not None and tache.etat == TERMINEE:
+        resultat, contexte = tache.resultat, tache.contexte
+        afficher_performance(resultat.telemetrie, contexte['scenario'], cle=tache.id)
+        if not resultat.success:
+            st.error(f"❌ L'optimisation par période a échoué : {resultat.message}")
+            return
+        df_resultat, figures = rendu('periodes', partial(resultats_periodes, contexte, resultat.x), tache.id)
+        
+        col1, col2 = st.columns(2)
+        contacts_avant, contacts_apres = df_resultat[['Contacts_utiles', 'Contacts_utiles_Optimise']].sum()
+        carbone_avant, carbone_apres = df_resultat[['Carbone_g', 'Carbone_Optimise_g']].sum()
+        col1.metric(
+            "Contacts Utiles", f"{contacts_apres:,.0f}",
+            delta=f"{(contacts_apres - contacts_avant) / contacts_avant * 100:+.1f}%" if contacts_avant else None
+        )
+        col2.metric(
+            "CO2 Total (g)", f"{carbone_apres:,.0f}",
+            delta=f"{(carbone_apres - carbone_avant) / carbone_avant * 100:+.1f}%" if carbone_avant else None,
+            delta_color="inverse"
+        )
+        
+        for colonne, fig in zip(st.columns(2), figures):
+            colonne.plotly_chart(fig, config={'responsive': True})
+        
+        st.dataframe(
+            df_resultat,
+            column_config={
+                'Periode': st.column_config.TextColumn("Période"),
+                'Budget': st.column_config.NumberColumn("Budget initial (€)", format="%.0f"),
+                'Budget_Optimise': st.column_config.NumberColumn("Budget optimisé (€)", format="%.0f"),
+                'Carbone_g': st.column_config.NumberColumn("CO2 initial (g)", format="%.0f"),
+                'Carbone_Optimise_g': st.column_config.NumberColumn("CO2 optimisé (g)", format="%.0f"),
+                'Contacts_utiles': st.column_config.NumberColumn("Contacts utiles initiaux", format="%.0f"),
+                'Contacts_utiles_Optimise': st.column_config.NumberColumn("Contacts utiles optimisés", format="%.0f"),
+                'Plafond_atteint': st.column_config.TextColumn("Plafond atteint"),
+            },
+            hide_index=True,
+            width=1200
+        )
+        st.download_button(
+            "Télécharger l'allocation par support et période (CSV)",
+            data=contexte['df_variables'][['Support', 'Periode', 'Budget']].assign(Budget_Optimise=resultat.x)
+            .to_csv(index=False),
+            file_name="allocation_periodes.csv",
+            mime="text/csv"
+        )
+
+# Tirages Monte Carlo gardés en mémoire: une évaluation ne coûte qu'un produit matriciel
+@st.cache_resource(max_entries=4)
+def tirages_incertitude(incertitudes, nb_tirages, loi):
+    """Facteurs tirés une fois par jeu d'incertitudes: toutes les allocations sur les mêmes tirages"""
+    return tirer_facteurs(incertitudes, nb_tirages, loi)
+
+def afficher_robustesse(df_optim, w_carbone, min_budget_par_canal, max_variation):
+    """
+    Distribution Monte Carlo des contacts utiles et du CO2 des plans actuels, de l'allocation
+    optimisée et de l'allocation robuste (incertitudes par support saisies dans un tableau)
+    """
+    from optimizer import CRITERES_ROBUSTES, optimisation_robuste
+    
+    supports = incertitudes_defaut(df_optim['Support'])
+    saisie = st.data_editor(
+        pd.DataFrame({
+            'Support': supports.index,
+            'CO2': supports['CO2'].to_numpy() * 100,
+            'Alpha': supports['Alpha'].to_numpy() * 100,
+        }),
+        column_config={
+            'Support': st.column_config.TextColumn("Support"),
+            'CO2': st.column_config.NumberColumn("CO2g/Contact ± (%)", min_value=0.0, max_value=100.0, format="%.0f"),
+            'Alpha': st.column_config.NumberColumn("Alpha ± (%)", min_value=0.0, max_value=100.0, format="%.0f"),
+        },
+        disabled=['Support'],
+        hide_index=True,
+        key='incertitudes',
+        width=1200
+    )
+    incertitudes = saisie.set_index('Support')[['CO2', 'Alpha']].fillna(0.0) / 100
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        nb_tirages = st.select_slider("Tirages", [10_000, 20_000, 50_000, 100_000], value=10_000)
+    with col2:
+        loi = st.radio(
+            "Loi des facteurs",
+            list(LOIS),
+            format_func={"triangulaire": "Triangulaire (référence la plus probable)", "uniforme": "Uniforme"}.get,
+            help="Facteurs multiplicatifs de CO2g/Contact et d'Alpha, indépendants par support"
+        )
+    with col3:
+        critere = st.selectbox(
+            "Critère robuste",
+            list(CRITERES_ROBUSTES),
+            format_func={
+                "cvar": "CVaR 95 % (moyenne des 5 % pires scénarios)",
+                "pire_cas": "Pire cas (bornes des intervalles)",
+            }.get,
+            help="Même objectif que l'optimisation (poids carbone, variation max, budget minimum), "
+                 "évalué sur les scénarios défavorables"
+        )
+    
+    if st.button("Lancer l'optimisation robuste"):
+        lancer_tache(
+            'robuste',
+            "Optimisation robuste",
+            optimisation_robuste,
+            df_optim,
+            incertitudes,
+            w_carbone=w_carbone,
+            critere=critere,
+            min_budget_par_canal=min_budget_par_canal,
+            max_variation=max_variation,
+            loi=loi,
+            cache=get_cache_optimisation(),
+            contexte=dict(
+                critere=critere,
+                scenario=(
+                    f"Robuste {critere} w={w_carbone:.2f}, variation={max_variation:.1f}, "
+                    f"min={min_budget_par_canal} €"
+                )
+            )
+        )
+    
+    # Allocations comparées: plans actuels, dernière optimisation (contacts linéaires), robuste
+    # (ids des tâches: clé du rendu)
+    allocations, ids = {"Plans actuels": (df_optim, df_optim['Budget'].to_numpy())}, []
+    optimisation = tache_session('optimisation')
+    if optimisation is not None and optimisation.etat == TERMINEE and optimisation.resultat.success:
+        if optimisation.contexte['courbes'] is None:
+            allocations["Optimisée"] = (optimisation.contexte['df_variables'], optimisation.resultat.x)
+            ids.append(optimisation.id)
+        else:
+            st.caption("Optimisation à rendements décroissants : non comparée (évaluation à contacts linéaires)")
+    tache = tache_session('robuste')
+    if tache is not None and not tache.terminee:
+        suivre_tache(tache.id)
+    elif tache is not None and tache.etat == ECHEC:
+        st.error(f"❌ Erreur lors de l'optimisation robuste : {tache.erreur}")
+    elif tache is not None and tache.etat == TERMINEE:
+        afficher_performance(tache.resultat.telemetrie, tache.contexte['scenario'], cle=tache.id)
+        if tache.resultat.success:
+            nom = {"cvar": "Robuste (CVaR)", "pire_cas": "Robuste (pire cas)"}[tache.contexte['critere']]
+            allocations[nom] = (df_optim, tache.resultat.x)
+            ids.append(tache.id)
+        else:
+            st.error(f"❌ L'optimisation robuste a échoué : {tache.resultat.message}")
+    
+    try:
+        tirages = tirages_incertitude(incertitudes, nb_tirages, loi)
+    except ValueError as e:
+        st.error(f"❌ {e}")
+        return
+    df_resumes, fig = rendu(
+        'robustesse', partial(affichages_robustesse, allocations, tirages),
+        *ids, nb_tirages, loi, tuple(incertitudes.index), incertitudes.to_numpy().tobytes()
+    )
+    st.dataframe(
+        df_resumes,
+        column_config={
+            colonne: st.column_config.NumberColumn(colonne, format="localized")
+            for colonne in df_resumes.columns[2:]
+        },
+        hide_index=True,
+        width=1200
+    )
+    st.caption(
+        f"{len(tirages):,} tirages. P5 / P50 / P95 : centiles ; CVaR 95 % : moyenne des 5 % de tirages "
+        "les plus défavorables (moins de contacts, plus de CO2)."
+    )
+    st.plotly_chart(fig, config={'responsive': True})
+
+def affichages_robustesse(allocations, tirages):
+    """
+    Résumé Monte Carlo (moyenne, centiles, CVaR) de chaque allocation et distribution du CO2,
+    pour rendu()
+    """
+    resumes, carbones = [], {}
+    for nom, (df_variables, x) in allocations.items():
+        contacts_utiles, carbone_g = evaluer_tirages(df_variables, x, tirages)
+        carbones[nom] = carbone_g / 1000
+        resume = resume_tirages(contacts_utiles, carbone_g / 1000).rename(index={'CO2 (g)': 'CO2 (kg)'})
+        resumes.append(resume.rename_axis('Indicateur').reset_index().assign(Allocation=nom))
+    df_resumes = pd.concat(resumes, ignore_index=True)
+    colonnes = ['Allocation', 'Indicateur'] + [c for c in df_resumes.columns if c not in ('Allocation', 'Indicateur')]
+    
+    # Distribution du CO2: histogrammes calculés ici (figure légère, même à 100 000 tirages)
+    bords = np.histogram_bin_edges(np.concatenate(list(carbones.values())), bins=60)
+    centres = (bords[:-1] + bords[1:]) / 2
+    fig = px.line(
+        pd.concat([
+            pd.DataFrame({
+                'CO2 (kg)': centres,
+                'Part des tirages': np.histogram(valeurs, bins=bords)[0] / len(valeurs),
+                'Allocation': nom,
+            })
+            for nom, valeurs in carbones.items()
+        ]),
+        x='CO2 (kg)', y='Part des tirages', color='Allocation', line_shape='hvh',
+        title="Distribution du CO2 total selon les incertitudes"
+    )
+    return df_resumes[colonnes], fig
+
+def ajouter_plans(nouveaux_plans):
+    """Ajoute des plans à la session (et au stockage: ils seront restaurés à la prochaine session)"""
+    stockage = get_stockage()
+    for plan in nouveaux_plans:
+        if stockage is not None and plan['empreinte'] is not None:
+            plan['id'] = stockage.ajouter_plan(plan, st.session_state.espace)
+    st.session_state.plans.extend(nouveaux_plans)
+    plans_modifies(ajoutes=nouveaux_plans)
+
+def plans_modifies(ajoutes=(), retires=()):
+    """
+    Nouvelle version de l'ensemble des plans après l'ajout de plans (en fin de liste) ou le
+    retrait de plans (positions avant retrait): des résumés à jour sont corrigés des seuls
+    plans concernés au lieu d'être recalculés.
+    """
+    if st.session_state.get('version_resumes') == st.session_state.version_plans:
+        st.session_state.resumes = maj_resumes(*st.session_state.resumes, ajoutes=ajoutes, retires=retires)
+        st.session_state.version_resumes = st.session_state.version_plans + 1
+    st.session_state.version_plans += 1
+
+def lignes_plan(plan, debut=0, fin=None):
+    """
+    Lignes [debut, fin) d'un plan: en mémoire, sinon lues dans le stockage (seule la tranche
+    demandée est lue). None si le détail n'est pas conservé.
+    """
+    if plan['data'] is not None:
+        return plan['data'].iloc[debut:fin]
+    stockage = get_stockage()
+    if not plan.get('lignes_stockees') or stockage is None:
+        return None
+    return stockage.lignes(plan['empreinte'], debut, fin)
+
+def afficher_details_plan(plan, cle):
+    """Statistiques précalculées du plan, puis ses lignes page par page (seule la page affichée est envoyée)"""
+    statistiques = plan.get('statistiques')
+    if statistiques is None and plan['data'] is not None:
+        statistiques = plan['statistiques'] = statistiques_lignes(plan['data'])
+    if statistiques is not None:
+        colonnes = [c for c in ('Contact', 'Budget') if statistiques[c] is not None]
+        if colonnes:
+            st.dataframe(
+                pd.DataFrame({c: statistiques[c] for c in colonnes}).T,
+                column_config={
+                    'min': st.column_config.NumberColumn("Min", format="%.2f"),
+                    'q25': st.column_config.NumberColumn("Q1", format="%.2f"),
+                    'mediane': st.column_config.NumberColumn("Médiane", format="%.2f"),
+                    'q75': st.column_config.NumberColumn("Q3", format="%.2f"),
+                    'max': st.column_config.NumberColumn("Max", format="%.2f"),
+                },
+                width=1200
+            )
+            if statistiques['estimees']:
+                st.caption("Quartiles estimés sur un échantillon (min et max exacts)")
+    
+    if not lignes_disponibles(plan):
+        st.caption(f"{plan.get('nb_lignes', 0):,} lignes lues (détail non conservé)")
+        return
+    nb_lignes = len(plan['data']) if plan['data'] is not None else plan['nb_lignes']
+    nb_pages = max(1, -(-nb_lignes // TAILLE_PAGE_DETAILS))
+    page = 1
+    if nb_pages > 1:
+        page = st.number_input("Page", min_value=1, max_value=nb_pages, value=1, key=f"page_{cle}")
+    debut = (page - 1) * TAILLE_PAGE_DETAILS
+    fin = min(debut + TAILLE_PAGE_DETAILS, nb_lignes)
+    st.dataframe(lignes_plan(plan, debut, fin), width=1200)
+    st.caption(f"Lignes {debut + 1:,} à {fin:,} sur {nb_lignes:,} (page {page}/{nb_pages})")
+
+def resumes_plans():
+    """Tableaux par plan et par support, recalculés seulement quand l'ensemble des plans change"""
+    version = st.session_state.version_plans
+    if st.session_state.get('version_resumes') != version:
+        df_plans = tableau_plans(st.session_state.plans)
+        st.session_state.resumes = (df_plans, resume_supports(df_plans))
+        st.session_state.version_resumes = version
+    return st.session_state.resumes
+
+def affichages_resumes():
+    """
+    Tableaux par plan et par support (valeurs numériques, formatées par FORMATS_RESUMES) et
+    données des graphiques de répartition, pour rendu()
+    """
+    df_plans, df_supports = resumes_plans()
+    df_summary = pd.DataFrame({
+        'Nom du Plan': df_plans['Plan'],
+        'Support': df_plans['Support'],
+        'Contacts': df_plans['Contacts'],
+        'Budget (€)': df_plans['Budget'],
+        'CO2g/Contact': df_plans['CO2_factor'],
+        'CO2 Total (g)': df_plans['CO2_total'],
+        'CO2 Total (kg)': df_plans['CO2_total'] / 1000
+    })
+    df_support_summary = pd.DataFrame({
+        'Support': df_supports['Support'],
+        'Nombre de Plans': df_supports['Nombre de Plans'],
+        'Contacts': df_supports['Contacts'],
+        'Budget (€)': df_supports['Budget'],
+        'CO2g/Contact': df_supports['CO2_factor'],
+        'CO2 Total (g)': df_supports['CO2_total'],
+        'CO2 Total (kg)': df_supports['CO2_total'] / 1000,
+        '% du CO2 total': df_supports['Part_CO2']
+    })
+    repartition = df_supports.set_index('Support')
+    return (
+        df_summary,
+        df_support_summary,
+        (repartition['CO2_total'] / 1000).to_frame('CO2 (kg)'),
+        repartition['Budget'].to_frame('Budget (€)'),
+    )
+
+def affichages_optimisation(df_resultat):
+    """Répartition optimisée par support (valeurs numériques) et graphique initial / optimisé, pour rendu()"""
+    df_display = df_resultat[['Support', 'Budget', 'Budget_Optimise', 'Variation_€', 'Variation_%']].copy()
+    comparison_data = pd.DataFrame({
+        'Support': df_resultat['Support'].tolist() + df_resultat['Support'].tolist(),
+        'Budget': df_resultat['Budget'].tolist() + df_resultat['Budget_Optimise'].tolist(),
+        'Type': ['Initial'] * len(df_resultat) + ['Optimisé'] * len(df_resultat)
+    })
+    fig = px.bar(
+        comparison_data,
+        x='Support',
+        y='Budget',
+        color='Type',
+        barmode='group',
+        title='Comparaison Budget Initial vs Optimisé par Support',
+        labels={'Budget': 'Budget (€)'},
+        color_discrete_map={'Initial': '#1f77b4', 'Optimisé': '#2ca02c'}
+    )
+    return df_display, fig
+
+def affichages_pareto(front, df_optim):
+    """
+    Points du front exact (dict par point), tableau des points, indice du compromis (coude),
+    figure et tableau détaillé (variations par rapport aux budgets initiaux), pour rendu()
+    """
+    from optimizer import evaluer, point_coude
+    
+    supports = df_optim['Support'].tolist()
+    pareto_results = [{
+        'w_carbone': front.w_carbone[k],
+        'contacts_utiles': front.contacts_utiles[k],
+        'carbone_g': front.carbone_g[k],
+        'carbone_kg': front.carbone_g[k] / 1000,
+        'budgets': front.x[k],
+        'changements': ", ".join(
+            f"{supports[i]}: {avant} → {apres}" for i, avant, apres in front.changements[k]
+        )
+    } for k in range(len(front.w_carbone))]
+    
+    # Créer le DataFrame pour Pareto
+    df_pareto = pd.DataFrame([{
+        'Poids Carbone': r['w_carbone'],
+        'Contacts Utiles': r['contacts_utiles'],
+        'Carbone (kg)': r['carbone_kg'],
+        'Changement': r['changements']
+    } for r in pareto_results])
+    df_pareto["Derive_Contacts"] = (df_pareto["Contacts Utiles"].diff() / df_pareto["Carbone (kg)"].diff()).fillna(0)
+    
+    # Compromis optimal: coude du front exact
+    optimal_idx = point_coude(df_pareto['Carbone (kg)'], df_pareto['Contacts Utiles'])
+    
+    # Graphique Pareto interactif
+    fig = go.Figure()
+    
+    # Ajouter la courbe Pareto
+    fig.add_trace(go.Scatter(
+        x=df_pareto['Carbone (kg)'],
+        y=df_pareto['Contacts Utiles'],
+        mode='lines+markers',
+        marker=dict(
+            size=12,
+            color=df_pareto['Poids Carbone'],
+            colorscale='RdYlGn',
+            showscale=True,
+            colorbar=dict(title="Poids<br>Carbone"),
+            line=dict(width=1, color='white')
+        ),
+        line=dict(width=2, color='rgba(100, 100, 100, 0.3)'),
+        text=[f"w={w:.3f}" for w in df_pareto['Poids Carbone']],
+        hovertemplate='<b>Poids Carbone: %{text}</b><br>' +
+                     'Carbone: %{x:,.0f} kg<br>' +
+                     'Contacts Utiles: %{y:,.0f}<br>' +
+                     '<extra></extra>'
+    ))
+    
+    # Ajouter le point initial (avant optimisation)
+    contacts_init, carbone_init = evaluer(df_optim, df_optim['Budget'].to_numpy())
+    carbone_init = carbone_init / 1000
+    
+    fig.add_trace(go.Scatter(
+        x=[carbone_init],
+        y=[contacts_init],
+        mode='markers',
+        marker=dict(size=15, color='red', symbol='star', line=dict(width=2, color='white')),
+        name='Budget Initial',
+        hovertemplate='<b>Budget Initial</b><br>' +
+                     'Carbone: %{x:,.0f} kg<br>' +
+                     'Contacts Utiles: %{y:,.0f}<br>' +
+                     '<extra></extra>'
+    ))
+
+    fig.add_trace(go.Scatter(
+        x=[df_pareto['Carbone (kg)'][optimal_idx]],
+        y=[df_pareto['Contacts Utiles'][optimal_idx]],
+        mode='markers+text',
+        marker=dict(color='green', size=15, symbol='circle'),
+        text=['Poids optimal'],
+        textposition='top center',
+        hoverinfo='skip',
+        showlegend=False
+    ))
+    
+    fig.update_layout(
+        title='Courbe de Pareto : Efficacité vs Empreinte Carbone',
+        xaxis_title='Empreinte Carbone (kg)',
+        yaxis_title='Contacts Utiles',
+        hovermode='closest',
+        height=600,
+    )
+    
+    # Variations par rapport à l'initial (valeurs numériques, formatées à l'affichage)
+    df_pareto_final = df_pareto.assign(**{
+        'Δ Contacts (%)': (df_pareto['Contacts Utiles'] - contacts_init) / contacts_init * 100,
+        'Δ Carbone (%)': (df_pareto['Carbone (kg)'] - carbone_init) / carbone_init * 100,
+    })
+    return pareto_results, df_pareto, optimal_idx, fig, df_pareto_final
+
+def rendu(nom, construire, *cle):
+    """
+    Objet d'affichage (tableau, figure Plotly...) gardé dans la session: construire() n'est
+    rappelé que si la version des plans ou la clé (ex: id de la tâche affichée) change. Une
+    entrée par nom: un widget déplacé réaffiche sans reconstruire tableaux ni figures.
+    """
+    rendus = st.session_state.setdefault('rendus', {})
+    cle = (st.session_state.version_plans, *cle)
+    if nom not in rendus or rendus[nom][0] != cle:
+        rendus[nom] = (cle, construire())
+    return rendus[nom][1]
+
+def afficher_performance(telemetrie, scenario, cle):
+    """Panneau "Performance" d'une résolution ou d'un front, ajouté une fois (par clé) à l'historique de la session"""
+    temps = telemetrie['temps']
+    solveur = telemetrie['solveur'] + (" (repli)" if telemetrie.get('repli') or telemetrie.get('nb_replis') else "")
+    if telemetrie['cache']:
+        solveur += " · cache"
+    elif telemetrie.get('depart_a_chaud'):
+        solveur += " · à chaud"
+    historique = st.session_state.setdefault('historique_performance', {})
+    historique.setdefault(cle, {
+        'Scénario': scenario,
+        'Solveur': solveur,
+        'Variables': telemetrie['nb_variables'],
+        'Temps total (ms)': temps['total'] * 1000,
+        'Itérations': telemetrie['iterations'],
+        'Violation (€)': telemetrie['violation_contraintes'],
+        'Résidu KKT': telemetrie['residu_kkt'],
+    })
+    
+    with st.expander("⏱️ Performance"):
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Solveur", solveur)
+        col2.metric("Temps total", f"{temps['total'] * 1000:,.1f} ms")
+        col3.metric("Itérations", f"{telemetrie['iterations']:,}")
+        col4.metric("Résidu KKT", f"{telemetrie['residu_kkt']:.1e}")
+        st.caption(
+            " · ".join(f"{phase} : {duree * 1000:,.1f} ms" for phase, duree in temps.items() if phase != 'total')
+            + f" · violation des contraintes : {telemetrie['violation_contraintes']:.2e} €"
+        )
+        if telemetrie['cache']:
+            st.caption("Résultat servi par le cache : temps et itérations du calcul d'origine")
+        
+        # Front de Pareto: points les plus coûteux (temps si mesuré par point, sinon résidu KKT)
+        par_point = telemetrie.get('par_point')
+        if par_point is not None:
+            df_points = pd.DataFrame({k: v for k, v in par_point.items() if len(v) == telemetrie['nb_points']})
+            tri = 'temps' if 'temps' in df_points else 'residu_kkt'
+            st.markdown(f"**{telemetrie['nb_points']} points** — les plus coûteux :")
+            st.dataframe(df_points.sort_values(tri, ascending=False).head(5), width=1200)
+
 # Chargement des données de référence
 co2_ref = load_co2_reference()
 
@@ -33,19 +803,59 @@ if co2_ref is not None:
     # Sidebar pour la configuration
     st.sidebar.header("Gestion des Plans")
     
-    # Initialiser la session state pour stocker les plans
+    # Espace de travail: les plans enregistrés sont propres à chaque espace (paramètre d'URL
+    # ?espace=..., tiré au hasard à la première visite: l'URL permet de retrouver ses plans)
+    if not st.query_params.get('espace'):
+        st.query_params['espace'] = secrets.token_hex(8)
+    if 'espace_saisi' not in st.session_state:
+        st.session_state.espace_saisi = st.query_params['espace']
+    espace = st.sidebar.text_input(
+        "Espace de travail",
+        key='espace_saisi',
+        help="Plans enregistrés de cet espace. Saisir le nom d'un autre espace pour retrouver ou partager ses plans"
+    ).strip() or st.query_params['espace']
+    if espace != st.session_state.get('espace'):
+        if 'espace' in st.session_state:
+            # Changement d'espace: plans de l'espace choisi relus ci-dessous
+            st.session_state.pop('plans', None)
+            st.session_state.version_plans += 1
+        st.query_params['espace'] = st.session_state.espace = espace
+    
+    # Initialiser la session state pour stocker les plans (restaurés depuis le stockage)
+    stockage = get_stockage()
     if 'plans' not in st.session_state:
         st.session_state.plans = []
+        if stockage is not None:
+            for enregistre in stockage.plans(espace):
+                plan = creer_plan(enregistre['nom'], enregistre['support'], enregistre['co2_factor'], enregistre)
+                plan['id'] = enregistre['id']
+                st.session_state.plans.append(plan)
+    # Compteur incrémenté à chaque ajout/suppression de plan (invalide les résumés)
+    if 'version_plans' not in st.session_state:
+        st.session_state.version_plans = 0
     
     # Section d'ajout de plan
     st.sidebar.subheader("Ajouter un nouveau plan")
     
-    # Upload du fichier CSV
-    uploaded_file = st.sidebar.file_uploader(
-        "Charger un plan média (CSV)",
-        type=['csv'],
-        help="Le fichier doit contenir les colonnes : Contact, Budget"
+    # Upload des fichiers CSV (un ou plusieurs) ou d'archives ZIP
+    uploaded_files = st.sidebar.file_uploader(
+        "Charger des plans média (CSV ou ZIP)",
+        type=['csv', 'zip'],
+        accept_multiple_files=True,
+        help="Chaque fichier doit contenir les colonnes : Contact, Budget. "
+             "Support déduit du nom de fichier ou d'un manifeste CSV (colonnes Fichier, Support)"
     )
+    uploaded_file = None
+    if len(uploaded_files) == 1 and uploaded_files[0].name.lower().endswith('.csv'):
+        uploaded_file = uploaded_files[0]
+    
+    if uploaded_files:
+        # Conserver les lignes du fichier (vue détaillée) ou seulement les totaux
+        garder_lignes = st.sidebar.checkbox(
+            "Conserver le détail des lignes",
+            value=False,
+            help="Nécessaire pour la vue détaillée. Sinon seuls les totaux Contact/Budget sont gardés en mémoire (recommandé pour les gros fichiers)"
+        )
     
     if uploaded_file is not None:
         # Nom du plan
@@ -54,66 +864,112 @@ if co2_ref is not None:
             value=uploaded_file.name.replace('.csv', '')
         )
         
-        # Sélection du support
+        # Sélection du support (présélectionné d'après le nom du fichier)
+        from ingestion import associer_supports
+        supports_disponibles = co2_ref.supports
+        support_devine = associer_supports([uploaded_file.name], supports_disponibles)[uploaded_file.name]
         support_choisi = st.sidebar.selectbox(
             "Sélectionner le support média",
-            options=sorted(co2_ref['Support'].unique()),
+            options=supports_disponibles,
+            index=supports_disponibles.index(support_devine) if support_devine else 0,
             key='support_select'
         )
         
+        # Schéma du fichier (séparateur, colonnes, format des nombres), détecté une fois par fichier
+        from ingestion import sonder_schema
+        try:
+            schema = sonder_schema(uploaded_file)
+            noms_delimiteurs = {",": "virgule", ";": "point-virgule", "\t": "tabulation", "|": "barre verticale"}
+            st.sidebar.caption(
+                f"Séparateur : {noms_delimiteurs[schema['delimiter']]} · "
+                f"Contact ← {schema['colonnes']['Contact'] or '❓'} · "
+                f"Budget ← {schema['colonnes']['Budget'] or '❓'}"
+                + (f" · Période ← {schema['colonnes']['Periode']}" if schema['colonnes'].get('Periode') else "")
+            )
+        except Exception as e:
+            schema = None
+            st.sidebar.error(f"❌ Fichier illisible : {e}")
+        
         # Bouton pour ajouter le plan
         if st.sidebar.button("✅ Ajouter ce plan", key='add_plan'):
             try:
-                # Lire le fichier CSV
-                from detect_delimiter import detect
+                # Lecture en flux des seules colonnes Contact/Budget, totaux calculés bloc par bloc
+                # (fichier déjà vu: totaux relus dans le stockage)
+                from ingestion import lire_plan
+                barre_lecture = st.sidebar.progress(0.0, text="Lecture du fichier...")
+                options = dict(schema=schema, garder_lignes=garder_lignes, progression=barre_lecture.progress)
+                if stockage is not None:
+                    lecture = lire_plan_memorise(uploaded_file, stockage, **options)
+                else:
+                    lecture = lire_plan(uploaded_file, **options)
+                barre_lecture.empty()
                 
-                # Reset the file pointer to the beginning
-                uploaded_file.seek(0)
-                firstline = uploaded_file.readline().decode('utf-8')
-                uploaded_file.seek(0)
-                delimiter = detect(firstline)
-                df_plan = pd.read_csv(uploaded_file, delimiter=delimiter)
+                # Obtenir le facteur CO2
+                co2_factor = co2_ref.co2(support_choisi)
                 
-                # Vérifier les colonnes requises
-                cont,bud=False,False
-                for col_plan in df_plan.columns:
-                    if "contact" in col_plan.lower() or "impression" in col_plan.lower():
-                        df_plan.rename(columns={col_plan: "Contact"}, inplace=True)
-                        cont=True
-                    if "budget" in col_plan.lower() or "tarif" in col_plan.lower():
-                        df_plan.rename(columns={col_plan: "Budget"}, inplace=True)
-                        bud=True
-                    if cont and bud:
-                        break
-                if 'Contact' not in df_plan.columns or 'Budget' not in df_plan.columns:
-                    st.sidebar.error("❌ Le fichier doit contenir les colonnes 'Contact' et 'Budget'")
-                else:
-                    # Obtenir le facteur CO2
-                    co2_factor = co2_ref[co2_ref['Support'] == support_choisi]['CO2g/Contact'].values[0]
+                # Ajouter le plan à la session
+                ajouter_plans([creer_plan(plan_name, support_choisi, co2_factor, lecture)])
+                
+                st.sidebar.success(f"✅ Plan '{plan_name}' ajouté avec succès !")
+                st.rerun()
                     
-                    # Calculer le CO2 total
-                    df_plan['Contact'] = df_plan['Contact'].astype(str).str.replace(" ", "").str.replace(",",".").astype(float)
-                    df_plan['Budget'] = df_plan['Budget'].astype(str).str.replace(" ", "").str.replace(",",".").astype(float)
-                    total_contacts = df_plan['Contact'].sum()
-                    total_budget = df_plan['Budget'].sum()
-                    total_co2 = total_contacts * co2_factor
+            except Exception as e:
+                st.sidebar.error(f"❌ Erreur lors du traitement du fichier : {e}")
+    
+    elif uploaded_files:
+        # Import groupé : plusieurs fichiers et/ou archives ZIP
+        from ingestion import associer_supports, deplier_fichiers, lire_plans
+        supports_disponibles = co2_ref.supports
+        try:
+            sources, manifeste = deplier_fichiers(uploaded_files)
+        except Exception as e:
+            sources, manifeste = [], {}
+            st.sidebar.error(f"❌ Archive ou manifeste illisible : {e}")
+        
+        if sources:
+            # Association fichier -> support (manifeste, sinon nom du fichier), modifiable
+            association = associer_supports([src['fichier'] for src in sources], supports_disponibles, manifeste)
+            df_association = st.sidebar.data_editor(
+                pd.DataFrame({
+                    'Plan': [src['nom'] for src in sources],
+                    'Support': [association[src['fichier']] for src in sources]
+                }),
+                column_config={
+                    'Support': st.column_config.SelectboxColumn(options=supports_disponibles, required=True)
+                },
+                disabled=['Plan'],
+                hide_index=True,
+                key='association_supports'
+            )
+            
+            if st.sidebar.button(f"✅ Ajouter ces {len(sources)} plans", key='add_plans'):
+                if df_association['Support'].isna().any():
+                    st.sidebar.error("❌ Choisissez un support pour chaque fichier")
+                else:
+                    # Lecture parallèle, puis ajout de tous les plans en une seule fois
+                    barre_lecture = st.sidebar.progress(0.0, text=f"Lecture de {len(sources)} fichiers...")
+                    options = dict(garder_lignes=garder_lignes, progression=barre_lecture.progress)
+                    if stockage is not None:
+                        options['lecteur'] = partial(lire_plan_memorise, stockage=stockage)
+                    lectures = lire_plans(sources, **options)
+                    barre_lecture.empty()
                     
-                    # Ajouter le plan à la session
-                    st.session_state.plans.append({
-                        'nom': plan_name,
-                        'support': support_choisi,
-                        'data': df_plan,
-                        'contacts': total_contacts,
-                        'budget': total_budget,
-                        'co2_factor': co2_factor,
-                        'co2_total': total_co2
-                    })
+                    nouveaux_plans, erreurs = [], []
+                    for nom, support, lecture in zip(df_association['Plan'], df_association['Support'], lectures):
+                        if 'erreur' in lecture:
+                            erreurs.append(f"{nom} : {lecture['erreur']}")
+                            continue
+                        co2_factor = co2_ref.co2(support)
+                        nouveaux_plans.append(creer_plan(nom, support, co2_factor, lecture))
                     
-                    st.sidebar.success(f"✅ Plan '{plan_name}' ajouté avec succès !")
+                    ajouter_plans(nouveaux_plans)
+                    st.session_state.erreurs_import = erreurs
                     st.rerun()
-                    
-            except Exception as e:
-                st.sidebar.error(f"❌ Erreur lors du traitement du fichier : {e}")
+    
+    # Erreurs du dernier import groupé
+    if st.session_state.get('erreurs_import'):
+        st.sidebar.error("❌ Fichiers non importés :\n\n" + "\n\n".join(st.session_state.erreurs_import))
+        st.session_state.erreurs_import = []
     
     # Affichage des plans ajoutés
     st.sidebar.markdown("---")
@@ -123,10 +979,14 @@ if co2_ref is not None:
         for idx, plan in enumerate(st.session_state.plans):
             col1, col2 = st.sidebar.columns([3, 1])
             with col1:
-                st.sidebar.text(f"{idx+1}. {plan['nom']} - {plan['support']}")
+                alerte = " ⚠️" if plan.get('nb_rejets') else ""
+                st.sidebar.text(f"{idx+1}. {plan['nom']} - {plan['support']}{alerte}")
             with col2:
                 if st.sidebar.button("🗑️", key=f"delete_{idx}"):
-                    st.session_state.plans.pop(idx)
+                    plan_supprime = st.session_state.plans.pop(idx)
+                    if stockage is not None and 'id' in plan_supprime:
+                        stockage.supprimer_plan(plan_supprime['id'], espace)
+                    plans_modifies(retires=[idx])
                     st.rerun()
     else:
         st.sidebar.info("Aucun plan ajouté pour le moment")
@@ -135,70 +995,29 @@ if co2_ref is not None:
     if len(st.session_state.plans) > 0:
         st.header("Résumé des Plans Média")
         
-        # Créer un DataFrame récapitulatif
-        summary_data = []
-        for plan in st.session_state.plans:
-            summary_data.append({
-                'Nom du Plan': plan['nom'],
-                'Support': plan['support'],
-                'Contacts': f"{plan['contacts']:,.0f}",
-                'Budget (€)': f"{plan['budget']:,.2f}",
-                'CO2g/Contact': f"{plan['co2_factor']:.3f}",
-                'CO2 Total (g)': f"{plan['co2_total']:,.2f}",
-                'CO2 Total (kg)': f"{plan['co2_total']/1000:.2f}"
-            })
+        # Tableaux par plan et par support (un seul groupby, recalculé si les plans changent)
+        df_plans, df_supports = resumes_plans()
         
-        df_summary = pd.DataFrame(summary_data)
+        df_summary, df_support_summary, graphique_co2, graphique_budget = rendu('resumes', affichages_resumes)
         
         # Afficher le tableau récapitulatif par plan
         st.subheader("Par Plan")
-        st.dataframe(df_summary, width=1200)
+        st.dataframe(df_summary, column_config=FORMATS_RESUMES, width=1200)
         
         # Tableau récapitulatif par support
         st.markdown("---")
         st.subheader("Récapitulatif par Support")
-        
-        support_summary = {}
-        for plan in st.session_state.plans:
-            support = plan['support']
-            if support not in support_summary:
-                support_summary[support] = {
-                    'Nombre de Plans': 0,
-                    'Contacts': 0,
-                    'Budget': 0,
-                    'CO2_factor': plan['co2_factor'],
-                    'CO2_total': 0
-                }
-            support_summary[support]['Nombre de Plans'] += 1
-            support_summary[support]['Contacts'] += plan['contacts']
-            support_summary[support]['Budget'] += plan['budget']
-            support_summary[support]['CO2_total'] += plan['co2_total']
-        
-        support_data = []
-        for support, data in support_summary.items():
-            support_data.append({
-                'Support': support,
-                'Nombre de Plans': data['Nombre de Plans'],
-                'Contacts': f"{data['Contacts']:,.0f}",
-                'Budget (€)': f"{data['Budget']:,.2f}",
-                'CO2g/Contact': f"{data['CO2_factor']:.3f}",
-                'CO2 Total (g)': f"{data['CO2_total']:,.2f}",
-                'CO2 Total (kg)': f"{data['CO2_total']/1000:.2f}",
-                '% du CO2 total': f"{(data['CO2_total']/sum([s['CO2_total'] for s in support_summary.values()])*100):.1f}%"
-            })
-        
-        df_support_summary = pd.DataFrame(support_data)
-        st.dataframe(df_support_summary, width=1200)
+        st.dataframe(df_support_summary, column_config=FORMATS_RESUMES, width=1200)
         
         # Calculs globaux
         st.markdown("---")
         st.header("Empreinte Carbone Globale")
         
-        total_co2_g = sum([plan['co2_total'] for plan in st.session_state.plans])
+        total_co2_g = float(df_supports['CO2_total'].sum())
         total_co2_kg = total_co2_g / 1000
         total_co2_tonnes = total_co2_kg / 1000
-        total_budget = sum([plan['budget'] for plan in st.session_state.plans])
-        total_contacts = sum([plan['contacts'] for plan in st.session_state.plans])
+        total_budget = float(df_supports['Budget'].sum())
+        total_contacts = float(df_supports['Contacts'].sum())
         
         # Afficher les métriques
         col1, col2, col3, col4 = st.columns(4)
@@ -233,46 +1052,29 @@ if co2_ref is not None:
         st.markdown("---")
         st.header("Visualisations")
         
-        # Agréger les données par support
-        support_aggregation = {}
-        for plan in st.session_state.plans:
-            support = plan['support']
-            if support not in support_aggregation:
-                support_aggregation[support] = {
-                    'co2': 0,
-                    'budget': 0,
-                    'contacts': 0,
-                    'nb_plans': 0
-                }
-            support_aggregation[support]['co2'] += plan['co2_total']
-            support_aggregation[support]['budget'] += plan['budget']
-            support_aggregation[support]['contacts'] += plan['contacts']
-            support_aggregation[support]['nb_plans'] += 1
-        
         col1, col2 = st.columns(2)
         
         with col1:
             st.subheader("Répartition du CO2 par Support")
-            chart_data = pd.DataFrame({
-                'Support': list(support_aggregation.keys()),
-                'CO2 (kg)': [data['co2']/1000 for data in support_aggregation.values()]
-            })
-            st.bar_chart(chart_data.set_index('Support'))
+            st.bar_chart(graphique_co2)
         
         with col2:
             st.subheader("Répartition du Budget par Support")
-            chart_data = pd.DataFrame({
-                'Support': list(support_aggregation.keys()),
-                'Budget (€)': [data['budget'] for data in support_aggregation.values()]
-            })
-            st.bar_chart(chart_data.set_index('Support'))
+            st.bar_chart(graphique_budget)
         
         # Détails par plan
         st.markdown("---")
         st.header("Détails par Plan")
         
         for idx, plan in enumerate(st.session_state.plans):
-            with st.expander(f"{plan['nom']} - {plan['support']}"):
+            # Statistiques et lignes ne sont rendues (et lues dans le stockage) que si le panneau est ouvert
+            cle = plan.get('id', idx)
+            details = st.expander(
+                f"{plan['nom']} - {plan['support']} · {plan.get('nb_lignes', 0):,} lignes",
+                key=f"details_{cle}",
+                on_change="rerun"
+            )
+            with details:
                 col1, col2, col3 = st.columns(3)
                 
                 with col1:
@@ -282,7 +1084,15 @@ if co2_ref is not None:
                 with col3:
                     st.metric("CO2 Total", f"{plan['co2_total']/1000:.2f} kg")
                 
-                st.dataframe(plan['data'], width=1200)
+                if plan.get('nb_rejets'):
+                    apercu = ", ".join(str(l) for l in plan['lignes_rejetees'][:20])
+                    st.warning(
+                        f"⚠️ {plan['nb_rejets']:,} ligne(s) ignorée(s) : valeurs Contact/Budget illisibles "
+                        f"(lignes {apercu}{'...' if plan['nb_rejets'] > 20 else ''})"
+                    )
+                
+                if details.open:
+                    afficher_details_plan(plan, cle)
         
         # Section Optimisation
         st.markdown("---")
@@ -296,55 +1106,26 @@ if co2_ref is not None:
         """)
         
         # Préparer les données pour l'optimisation
-        can_optimize = True
-        optimization_data = []
-        
-        for support, data in support_summary.items():
-            # Récupérer l'alpha du support
-            alpha_value = co2_ref[co2_ref['Support'] == support]['Alpha'].values
-            if len(alpha_value) == 0 or pd.isna(alpha_value[0]):
-                st.warning(f"⚠️ Le support '{support}' n'a pas de valeur Alpha définie. Optimisation impossible.")
-                can_optimize = False
-                break
-            
-            alpha = alpha_value[0]
-            co2_factor = data['CO2_factor']
-            budget = data['Budget']
-            contacts = data['Contacts']
-            
-            # Calculer les métriques nécessaires
-            # Alpha est un multiplicateur (pas une puissance) : Contacts_utiles = Contacts × (Alpha/100)
-            contacts_utiles = contacts * (alpha / 100)
-            contacts_utiles_per_euro = contacts_utiles / budget if budget > 0 else 0
-            carbone_per_euro = (contacts / budget) * co2_factor if budget > 0 else 0
-            
-            optimization_data.append({
-                'Support': support,
-                'Budget': budget,
-                'Contacts': contacts,
-                'Alpha': alpha,
-                'Contacts_utiles': contacts_utiles,
-                'Contacts_utiles_per_euro': contacts_utiles_per_euro,
-                'Carbone_per_euro': carbone_per_euro,
-                'CO2_factor': co2_factor
-            })
+        # Alpha est un multiplicateur (pas une puissance) : Contacts_utiles = Contacts × (Alpha/100)
+        df_optim, sans_alpha = donnees_optimisation(df_supports, co2_ref)
+        for support in sans_alpha:
+            st.warning(f"⚠️ Le support '{support}' n'a pas de valeur Alpha définie. Optimisation impossible.")
+        can_optimize = df_optim is not None
         
-        if can_optimize and len(optimization_data) > 0:
-            df_optim = pd.DataFrame(optimization_data)
+        if can_optimize and len(df_optim) > 0:
+            
+            # Objectif: compromis pondéré, ou contacts maximaux sous un plafond de CO2
+            objectif = st.radio(
+                "Objectif",
+                ["compromis", "plafond"],
+                format_func={"compromis": "Compromis (poids carbone)", "plafond": "Plafond de CO2"}.get,
+                horizontal=True,
+                help="Plafond de CO2 : maximise les contacts utiles sans dépasser le CO2 total choisi"
+            )
             
             # Paramètres d'optimisation
             col1, col2, col3 = st.columns(3)
             
-            with col1:
-                w_carbone = st.slider(
-                    "Poids Carbone",
-                    min_value=0.0,
-                    max_value=1.0,
-                    value=0.5,
-                    step=0.05,
-                    help="0 = Focus contacts utiles, 1 = Focus réduction carbone"
-                )
-            
             with col2:
                 max_variation = st.slider(
                     "Variation max par support (%)",
@@ -359,54 +1140,163 @@ if co2_ref is not None:
                 min_budget_par_canal = st.number_input(
                     "Budget minimum par support (€)",
                     min_value=0,
-                    max_value=int(total_budget / len(optimization_data)),
+                    max_value=int(total_budget / len(df_optim)),
                     value=1000,
                     step=100
                 )
             
+            # Optimisation ligne à ligne possible si le détail de tous les plans est conservé
+            granularite = "support"
+            if all(lignes_disponibles(plan) for plan in st.session_state.plans):
+                granularite = st.radio(
+                    "Granularité",
+                    ["support", "ligne"],
+                    format_func={"support": "Par support", "ligne": "Par ligne de plan"}.get,
+                    horizontal=True,
+                    help="Par ligne : un budget par ligne des fichiers (variation max par ligne, sans budget minimum)"
+                )
+            
+            with col1:
+                if objectif == "plafond":
+                    # Sans poids carbone: priorité aux contacts sous le plafond. Plafond par défaut:
+                    # -10 % par rapport aux plans, sans descendre sous le carbone minimal des bornes
+                    w_carbone = 0.0
+                    try:
+                        carbone_min_kg = rendu(
+                            'carbone_minimal',
+                            partial(
+                                carbone_minimal_plans, df_optim, co2_ref, stockage,
+                                min_budget_par_canal, max_variation, granularite
+                            ),
+                            min_budget_par_canal, max_variation, granularite
+                        ) / 1000
+                    except ValueError:
+                        # Bornes infaisables: signalé au lancement de l'optimisation
+                        carbone_min_kg = 0.0
+                    plafond_co2_kg = st.number_input(
+                        "Plafond CO2 (kg)",
+                        min_value=carbone_min_kg,
+                        value=max(round(0.9 * total_co2_kg, 1), float(np.ceil(carbone_min_kg * 10) / 10)),
+                        step=max(0.1, round(0.01 * total_co2_kg, 1)),
+                        help="CO2 total maximal de l'allocation optimisée (défaut : -10 % par rapport aux plans). "
+                             f"Minimum atteignable avec ces bornes : {carbone_min_kg:,.1f} kg"
+                    )
+                else:
+                    w_carbone = st.slider(
+                        "Poids Carbone",
+                        min_value=0.0,
+                        max_value=1.0,
+                        value=0.5,
+                        step=0.05,
+                        help="0 = Focus contacts utiles, 1 = Focus réduction carbone"
+                    )
+            
+            # Réponse des contacts au budget: courbes ajustées sur les lignes des plans
+            modele_reponse = "lineaire"
+            if objectif == "compromis" and any(lignes_disponibles(plan) for plan in st.session_state.plans):
+                modele_reponse = st.selectbox(
+                    "Réponse des contacts au budget",
+                    ["lineaire", "auto", "puissance", "log", "hill"],
+                    format_func={
+                        "lineaire": "Linéaire (contacts proportionnels au budget)",
+                        "auto": "Rendements décroissants (modèle choisi par support)",
+                        "puissance": "Rendements décroissants : puissance",
+                        "log": "Rendements décroissants : logarithme",
+                        "hill": "Rendements décroissants : Hill",
+                    }.get,
+                    help="Courbes ajustées par support sur les lignes des plans (budget → contacts). "
+                         "Le carbone reste proportionnel au budget ; les supports sans lignes restent linéaires."
+                )
+                if modele_reponse != "lineaire":
+                    with st.expander("📉 Courbes de réponse par support"):
+                        st.dataframe(
+                            courbes_plans(modele_reponse).reset_index(),
+                            column_config={
+                                'Forme': st.column_config.NumberColumn("Exposant", format="%.2f"),
+                                'Echelle': st.column_config.NumberColumn("Échelle (€)", format="%.0f"),
+                                'R2': st.column_config.NumberColumn("R² (log)", format="%.3f"),
+                                'Lignes': st.column_config.NumberColumn("Lignes", format="%d"),
+                            },
+                            hide_index=True,
+                            width=1200
+                        )
+            
             if st.button("Lancer l'optimisation", type="primary"):
+                parametres = dict(
+                    min_budget_par_canal=min_budget_par_canal,
+                    max_variation=max_variation,
+                    granularite=granularite
+                )
+                if objectif == "plafond":
+                    parametres['carbone_max'] = plafond_co2_kg * 1000
+                else:
+                    parametres['w_carbone'] = w_carbone
+                try:
+                    lancer_optimisation(df_optim, co2_ref, stockage, parametres, modele_reponse)
+                except Exception as e:
+                    st.error(f"❌ Erreur lors de l'optimisation : {e}")
+            
+            # Plan ajouté ou retiré après une optimisation réussie: ré-optimisation automatique
+            # (mêmes paramètres), démarrée à chaud depuis l'allocation précédente
+            precedente = tache_session('optimisation', version_courante=False)
+            if (
+                precedente is not None
+                and precedente.etat == TERMINEE
+                and precedente.resultat.success
+                and precedente.contexte['version_plans'] != st.session_state.version_plans
+                and (precedente.contexte['granularite'] == "support"
+                     or all(lignes_disponibles(plan) for plan in st.session_state.plans))
+            ):
+                try:
+                    lancer_optimisation(
+                        df_optim, co2_ref, stockage, precedente.contexte['parametres'],
+                        precedente.contexte['modele_reponse']
+                    )
+                except Exception as e:
+                    st.error(f"❌ Erreur lors de la ré-optimisation : {e}")
+            
+            # Dernière optimisation de la session: suivi tant qu'elle tourne, puis résultats
+            tache_optimisation = tache_session('optimisation')
+            if tache_optimisation is not None and not tache_optimisation.terminee:
+                suivre_tache(tache_optimisation.id)
+            elif tache_optimisation is not None and tache_optimisation.etat == ECHEC:
+                st.error(f"❌ Erreur lors de l'optimisation : {tache_optimisation.erreur}")
+            elif tache_optimisation is not None and tache_optimisation.etat == ANNULEE:
+                st.info("Optimisation annulée")
+            elif tache_optimisation is not None and tache_optimisation.etat == TERMINEE:
                 try:
-                    # Forcer le rechargement du module optimizer pour éviter les problèmes de cache
-                    import importlib
-                    import sys
-                    if 'optimizer' in sys.modules:
-                        importlib.reload(sys.modules['optimizer'])
-                    from optimizer import optimisation_media                    
+                    from optimizer import evaluer
                     
-                    with st.spinner("Optimisation en cours..."):
-                        resultat = optimisation_media(
-                            df_optim,
-                            w_carbone=w_carbone,
-                            min_budget_par_canal=min_budget_par_canal,
-                            max_variation=max_variation
-                        )
+                    contexte = tache_optimisation.contexte
+                    resultat = tache_optimisation.resultat
+                    df_variables, df_resultat = contexte['df_variables'], contexte['df_optim']
+                    afficher_performance(resultat.telemetrie, contexte['scenario'], cle=tache_optimisation.id)
                     
                     if resultat.success:
                         st.success("✅ Optimisation réussie !")
+                        # Allocation optimale conservée: départ à chaud de la prochaine optimisation
+                        st.session_state.setdefault('allocations', {})[contexte['granularite']] = pd.Series(
+                            resultat.x, index=cles_variables(df_variables)
+                        )
                         
-                        # Préparer les résultats
+                        # Préparer les résultats (budgets des lignes regroupés par support)
                         budgets_optimises = resultat.x
-                        df_optim['Budget_Optimise'] = budgets_optimises
-                        df_optim['Variation_%'] = ((budgets_optimises - df_optim['Budget']) / df_optim['Budget'] * 100)
-                        df_optim['Variation_€'] = budgets_optimises - df_optim['Budget']
-                        
-                        # Calculer les métriques optimisées
-                        total_contacts_utiles_avant = sum(df_optim['Contacts_utiles'])
-                        total_carbone_avant = sum(df_optim['Budget'] * df_optim['Carbone_per_euro'])
-                        
-                        # Recalculer avec les nouveaux budgets
-                        contacts_utiles_apres = []
-                        carbone_apres = []
-                        for i, row in df_optim.iterrows():
-                            nouveau_budget = budgets_optimises[i]
-                            # Estimer les nouveaux contacts proportionnellement au budget
-                            ratio_budget = nouveau_budget / row['Budget'] if row['Budget'] > 0 else 1
-                            nouveaux_contacts = row['Contacts'] * ratio_budget
-                            contacts_utiles_apres.append(nouveaux_contacts * (row['Alpha'] / 100))
-                            carbone_apres.append(nouveaux_contacts * row['CO2_factor'])
+                        if contexte['granularite'] == "ligne":
+                            budgets_optimises = (
+                                pd.Series(resultat.x).groupby(df_variables['Support'].to_numpy(), sort=False).sum()
+                                .reindex(df_resultat['Support']).to_numpy()
+                            )
+                        df_resultat['Budget_Optimise'] = budgets_optimises
+                        df_resultat['Variation_%'] = ((budgets_optimises - df_resultat['Budget']) / df_resultat['Budget'] * 100)
+                        df_resultat['Variation_€'] = budgets_optimises - df_resultat['Budget']
                         
-                        total_contacts_utiles_apres = sum(contacts_utiles_apres)
-                        total_carbone_apres = sum(carbone_apres)
+                        # Métriques avant / après (un produit matriciel pour les deux allocations)
+                        contacts_utiles, carbone = evaluer(
+                            df_variables, np.vstack((df_variables['Budget'].to_numpy(), resultat.x)),
+                            courbes=contexte['courbes']
+                        )
+                        total_contacts_utiles_avant, total_contacts_utiles_apres = contacts_utiles
+                        total_carbone_avant, total_carbone_apres = carbone
                         
                         # Afficher les métriques de comparaison
                         st.subheader("Comparaison Avant / Après Optimisation")
@@ -436,38 +1326,34 @@ if co2_ref is not None:
                                 delta_color="inverse"  # Rouge = augmentation = mauvais
                             )
                         
+                        # Plafond de CO2: valeur marginale du plafond (multiplicateur)
+                        if 'carbone_max' in contexte['parametres']:
+                            st.metric(
+                                "Contacts utiles par kg de plafond en plus",
+                                f"{resultat.contacts_par_gramme * 1000:,.1f}",
+                                help="Contacts utiles gagnés si le plafond de CO2 augmente d'1 kg "
+                                     "(0 : plafond non atteint)"
+                            )
+                        
                         # Tableau de répartition optimisée
                         st.subheader("Répartition Budgétaire Optimisée")
                         
-                        df_display = df_optim[['Support', 'Budget', 'Budget_Optimise', 'Variation_€', 'Variation_%']].copy()
-                        df_display['Budget'] = df_display['Budget'].apply(lambda x: f"{x:,.0f} €")
-                        df_display['Budget_Optimise'] = df_display['Budget_Optimise'].apply(lambda x: f"{x:,.0f} €")
-                        df_display['Variation_€'] = df_display['Variation_€'].apply(lambda x: f"{x:+,.0f} €")
-                        df_display['Variation_%'] = df_display['Variation_%'].apply(lambda x: f"{x:+.1f}%")
-                        
-                        df_display.columns = ['Support', 'Budget Initial', 'Budget Optimisé', 'Variation (€)', 'Variation (%)']
-                        st.dataframe(df_display, width=1200)
+                        df_display, fig = rendu(
+                            'optimisation', partial(affichages_optimisation, df_resultat), tache_optimisation.id
+                        )
+                        st.dataframe(
+                            df_display,
+                            column_config={
+                                'Budget': st.column_config.NumberColumn("Budget Initial (€)", format="localized"),
+                                'Budget_Optimise': st.column_config.NumberColumn("Budget Optimisé (€)", format="localized"),
+                                'Variation_€': st.column_config.NumberColumn("Variation (€)", format="%+.0f"),
+                                'Variation_%': st.column_config.NumberColumn("Variation (%)", format="%+.1f %%"),
+                            },
+                            width=1200
+                        )
                         
                         # Graphique de comparaison
                         st.subheader("Comparaison Visuelle")
-                        
-                        comparison_data = pd.DataFrame({
-                            'Support': df_optim['Support'].tolist() + df_optim['Support'].tolist(),
-                            'Budget': df_optim['Budget'].tolist() + budgets_optimises.tolist(),
-                            'Type': ['Initial'] * len(df_optim) + ['Optimisé'] * len(df_optim)
-                        })
-                        
-                        import plotly.express as px
-                        fig = px.bar(
-                            comparison_data,
-                            x='Support',
-                            y='Budget',
-                            color='Type',
-                            barmode='group',
-                            title='Comparaison Budget Initial vs Optimisé par Support',
-                            labels={'Budget': 'Budget (€)'},
-                            color_discrete_map={'Initial': '#1f77b4', 'Optimisé': '#2ca02c'}
-                        )
                         st.plotly_chart(fig, config={'responsive': True})
                         
                     else:
@@ -491,6 +1377,24 @@ if co2_ref is not None:
                     with st.expander("📋 Traceback complet"):
                         import traceback
                         st.code(traceback.format_exc())
+            
+            # Optimisation par période (flighting): une variable par support et par semaine / vague
+            st.subheader("Optimisation par Période")
+            if not all(plan.get('periodes') for plan in st.session_state.plans):
+                st.caption(
+                    "Disponible quand tous les plans ont une colonne de période "
+                    "(semaine, vague, date : dates regroupées par semaine)."
+                )
+            else:
+                afficher_optimisation_periodes(co2_ref, w_carbone, max_variation)
+            
+            # Robustesse: facteurs CO2g/Contact et Alpha incertains, évaluation Monte Carlo
+            st.subheader("Robustesse aux Incertitudes (Monte Carlo)")
+            st.caption(
+                "CO2g/Contact et Alpha sont des estimations : chaque support reçoit une marge d'incertitude, "
+                "et les allocations sont évaluées sur des milliers de tirages de ces facteurs."
+            )
+            afficher_robustesse(df_optim, w_carbone, min_budget_par_canal, max_variation)
         
         # Courbe de Pareto
         st.markdown("---")
@@ -502,212 +1406,212 @@ if co2_ref is not None:
         """)
         
         if st.button("🔬 Générer la Courbe de Pareto", type="primary"):
-            if can_optimize and len(optimization_data) > 0:
-                try:
-                    from optimizer import optimisation_media
-                    import importlib
-                    import sys
-                    if 'optimizer' in sys.modules:
-                        importlib.reload(sys.modules['optimizer'])
+            if can_optimize and len(df_optim) > 0:
+                from optimizer import pareto_exact
+                
+                # Front exact (points de cassure où un support atteint ou quitte une borne), en arrière-plan
+                lancer_tache(
+                    'pareto',
+                    "Courbe de Pareto",
+                    pareto_exact,
+                    df_optim.copy(),
+                    min_budget_par_canal=min_budget_par_canal,
+                    max_variation=max_variation,
+                    cache=get_cache_optimisation(),
+                    contexte=dict(
+                        df_optim=df_optim.copy(),
+                        scenario=f"Pareto variation={max_variation:.1f}, min={min_budget_par_canal} €"
+                    )
+                )
+            else:
+                st.warning("⚠️ Impossible de générer la courbe de Pareto : certains supports n'ont pas de valeur Alpha")
+        
+        # Dernière courbe de Pareto de la session: suivi tant qu'elle tourne, puis résultats
+        tache_pareto = tache_session('pareto')
+        if tache_pareto is not None and not tache_pareto.terminee:
+            suivre_tache(tache_pareto.id)
+        elif tache_pareto is not None and tache_pareto.etat == ECHEC:
+            st.error(f"❌ Erreur lors de la génération de la courbe de Pareto : {tache_pareto.erreur}")
+        elif tache_pareto is not None and tache_pareto.etat == ANNULEE:
+            st.info("Courbe de Pareto annulée")
+        elif tache_pareto is not None and tache_pareto.etat == TERMINEE:
+            try:
+                contexte = tache_pareto.contexte
+                front = tache_pareto.resultat
+                afficher_performance(front.telemetrie, contexte['scenario'], cle=tache_pareto.id)
+                
+                pareto_results, df_pareto, optimal_idx, fig, df_pareto_final = rendu(
+                    'pareto', partial(affichages_pareto, front, contexte['df_optim']), tache_pareto.id
+                )
+                
+                if front.success:
+                    st.success(f"✅ Front exact : {len(pareto_results)} points de cassure")
                     
-                    # Tester différents poids carbone
-                    poids_carbone_range = [0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0]
-                    pareto_results = []
+                    st.plotly_chart(fig)
                     
-                    progress_bar = st.progress(0)
-                    status_text = st.empty()
+                    # Tableau récapitulatif
+                    st.subheader("📋 Détails des Solutions Pareto")
+                    st.session_state.df_pareto_final = df_pareto_final
+                    st.dataframe(
+                        df_pareto_final,
+                        column_config={
+                            'Contacts Utiles': st.column_config.NumberColumn(format="localized"),
+                            'Carbone (kg)': st.column_config.NumberColumn(format="%.2f"),
+                            'Δ Contacts (%)': st.column_config.NumberColumn(format="%+.1f %%"),
+                            'Δ Carbone (%)': st.column_config.NumberColumn(format="%+.1f %%"),
+                        },
+                        width=1200
+                    )
                     
-                    for i, w in enumerate(poids_carbone_range):
-                        status_text.text(f"Optimisation pour poids carbone = {w:.1f}...")
-                        
-                        resultat = optimisation_media(
-                            df_optim,
-                            w_carbone=w,
-                            min_budget_par_canal=min_budget_par_canal,
-                            max_variation=max_variation
-                        )
-                        
-                        if resultat.success:
-                            # Calculer les métriques pour cette solution
-                            contacts_utiles_total = 0
-                            carbone_total = 0
-                            
-                            for j, row in df_optim.iterrows():
-                                nouveau_budget = resultat.x[j]
-                                ratio_budget = nouveau_budget / row['Budget'] if row['Budget'] > 0 else 1
-                                nouveaux_contacts = row['Contacts'] * ratio_budget
-                                contacts_utiles_total += nouveaux_contacts * (row['Alpha'] / 100)
-                                carbone_total += nouveaux_contacts * row['CO2_factor']
-                            
-                            pareto_results.append({
-                                'w_carbone': w,
-                                'contacts_utiles': contacts_utiles_total,
-                                'carbone_g': carbone_total,
-                                'carbone_kg': carbone_total / 1000,
-                                'budgets': resultat.x.copy()
-                            })
-                        
-                        progress_bar.progress((i + 1) / len(poids_carbone_range))
+                    # Recommandations
+                    st.subheader("Recommandations")
                     
-                    status_text.empty()
-                    progress_bar.empty()
-                    
-                    if len(pareto_results) > 0:
-                        st.success(f"✅ {len(pareto_results)} optimisations réussies sur {len(poids_carbone_range)}")
-                        
-                        # Créer le DataFrame pour Pareto
-                        df_pareto = pd.DataFrame([{
-                            'Poids Carbone': r['w_carbone'],
-                            'Contacts Utiles': r['contacts_utiles'],
-                            'Carbone (kg)': r['carbone_kg']
-                        } for r in pareto_results])
-                        df_pareto["Derive_Contacts"] = df_pareto["Contacts Utiles"].diff() / df_pareto["Carbone (kg)"].diff()
-                        df_pareto["Derive_Contacts"].fillna(0, inplace=True)
-                        
-                        for i in range(3, len(df_pareto)):
-                            if df_pareto.loc[10-i, "Derive_Contacts"] < df_pareto.loc[10-i+1, "Derive_Contacts"]*0.7 and df_pareto.loc[10-i+1, "Derive_Contacts"] >= 0:
-                                optimal_idx = 10-i
-                                break
-                        # Graphique Pareto interactif
-                        import plotly.graph_objects as go
-                        
-                        fig = go.Figure()
-                        
-                        # Ajouter la courbe Pareto
-                        fig.add_trace(go.Scatter(
-                            x=df_pareto['Carbone (kg)'],
-                            y=df_pareto['Contacts Utiles'],
-                            mode='lines+markers',
-                            marker=dict(
-                                size=12,
-                                color=df_pareto['Poids Carbone'],
-                                colorscale='RdYlGn',
-                                showscale=True,
-                                colorbar=dict(title="Poids<br>Carbone"),
-                                line=dict(width=1, color='white')
-                            ),
-                            line=dict(width=2, color='rgba(100, 100, 100, 0.3)'),
-                            text=[f"w={w:.1f}" for w in df_pareto['Poids Carbone']],
-                            hovertemplate='<b>Poids Carbone: %{text}</b><br>' +
-                                         'Carbone: %{x:,.0f} kg<br>' +
-                                         'Contacts Utiles: %{y:,.0f}<br>' +
-                                         '<extra></extra>'
-                        ))
-                        
-                        # Ajouter le point initial (avant optimisation)
-                        contacts_init = sum(df_optim['Contacts_utiles'])
-                        carbone_init = sum(df_optim['Budget'] * df_optim['Carbone_per_euro']) / 1000
-                        
-                        fig.add_trace(go.Scatter(
-                            x=[carbone_init],
-                            y=[contacts_init],
-                            mode='markers',
-                            marker=dict(size=15, color='red', symbol='star', line=dict(width=2, color='white')),
-                            name='Budget Initial',
-                            hovertemplate='<b>Budget Initial</b><br>' +
-                                         'Carbone: %{x:,.0f} kg<br>' +
-                                         'Contacts Utiles: %{y:,.0f}<br>' +
-                                         '<extra></extra>'
-                        ))
-
-                        fig.add_trace(go.Scatter(
-                            x=[df_pareto['Carbone (kg)'][optimal_idx]],
-                            y=[df_pareto['Contacts Utiles'][optimal_idx]],
-                            mode='markers+text',
-                            marker=dict(color='green', size=15, symbol='circle'),
-                            text=['Poids optimal'],
-                            textposition='top center',
-                            hoverinfo='skip',
-                            showlegend=False
-                            
-                        ))
-                        
-                        fig.update_layout(
-                            title='Courbe de Pareto : Efficacité vs Empreinte Carbone',
-                            xaxis_title='Empreinte Carbone (kg)',
-                            yaxis_title='Contacts Utiles',
-                            hovermode='closest',
-                            height=600,
-                        )
-                        
-                        st.plotly_chart(fig)
-                        
-                        # Tableau récapitulatif
-                        st.subheader("📋 Détails des Solutions Pareto")
-                        
-                        df_pareto_display = df_pareto.copy()
-                        df_pareto_display['Contacts Utiles'] = df_pareto_display['Contacts Utiles'].apply(lambda x: f"{x:,.0f}")
-                        df_pareto_display['Carbone (kg)'] = df_pareto_display['Carbone (kg)'].apply(lambda x: f"{x:,.2f}")
-                        
-                        # Calculer les variations par rapport à l'initial
-                        variations = []
-                        for r in pareto_results:
-                            var_contacts = (r['contacts_utiles'] - contacts_init) / contacts_init * 100
-                            var_carbone = (r['carbone_kg'] - carbone_init) / carbone_init * 100
-                            variations.append({
-                                'Δ Contacts (%)': f"{var_contacts:+.1f}%",
-                                'Δ Carbone (%)': f"{var_carbone:+.1f}%"
-                            })
-                        
-                        df_variations = pd.DataFrame(variations)
-                        df_pareto_final = pd.concat([df_pareto_display, df_variations], axis=1)
-                        st.session_state.df_pareto_final = df_pareto_final
-                        st.dataframe(df_pareto_final, width=1200)
-                        
-                        # Recommandations
-                        st.subheader("Recommandations")
-                        
-                        # Trouver les meilleurs compromis
-                        best_contacts_idx = df_pareto['Contacts Utiles'].idxmax()
-                        best_carbone_idx = df_pareto['Carbone (kg)'].idxmin()
+                    # Trouver les meilleurs compromis
+                    best_contacts_idx = df_pareto['Contacts Utiles'].idxmax()
+                    best_carbone_idx = df_pareto['Carbone (kg)'].idxmin()
 
-                        
+                    
 
-                        col1, col2, col3 = st.columns(3)
+                    col1, col2, col3 = st.columns(3)
 
-                        with col1:
-                            st.markdown("**Meilleure Performance**")
-                            st.metric("Poids Carbone", f"{pareto_results[best_contacts_idx]['w_carbone']:.1f}")
-                            st.metric("Contacts Utiles", f"{pareto_results[best_contacts_idx]['contacts_utiles']:,.0f}")
-                            st.metric("Carbone", f"{pareto_results[best_contacts_idx]['carbone_kg']:,.1f} kg")
-                        
-                        with col2:
-                            st.markdown("**Meilleure Empreinte Carbone**")
-                            st.metric("Poids Carbone", f"{pareto_results[best_carbone_idx]['w_carbone']:.1f}")
-                            st.metric("Contacts Utiles", f"{pareto_results[best_carbone_idx]['contacts_utiles']:,.0f}")
-                            st.metric("Carbone", f"{pareto_results[best_carbone_idx]['carbone_kg']:,.1f} kg")
-                        
-                        with col3:
-                            st.markdown("**Compromis Optimal**")
-                            st.metric("Poids Carbone", f"{pareto_results[optimal_idx]['w_carbone']:.1f}")
-                            st.metric("Contacts Utiles", f"{pareto_results[optimal_idx]['contacts_utiles']:,.0f}")
-                            st.metric("Carbone", f"{pareto_results[optimal_idx]['carbone_kg']:,.1f} kg")
-                        
-                        # Option d'export
-                        st.markdown("---")
-                        if st.button("Exporter les résultats Pareto (CSV)"):
-                            print(st.session_state.df_pareto_final)
-                            csv = st.session_state.df_pareto_final.to_csv(index=False)
-                            st.download_button(
-                                label="Télécharger CSV",
-                                data=csv,
-                                file_name="pareto_analysis.csv",
-                                mime="text/csv"
-                            )
-                    else:
-                        st.error("❌ Aucune optimisation n'a réussi")
-                
-                except Exception as e:
-                    st.error(f"❌ Erreur lors de la génération de la courbe de Pareto : {e}")
-                    import traceback
-                    st.code(traceback.format_exc())
-            else:
-                st.warning("⚠️ Impossible de générer la courbe de Pareto : certains supports n'ont pas de valeur Alpha")
+                    with col1:
+                        st.markdown("**Meilleure Performance**")
+                        st.metric("Poids Carbone", f"{pareto_results[best_contacts_idx]['w_carbone']:.3f}")
+                        st.metric("Contacts Utiles", f"{pareto_results[best_contacts_idx]['contacts_utiles']:,.0f}")
+                        st.metric("Carbone", f"{pareto_results[best_contacts_idx]['carbone_kg']:,.1f} kg")
+                    
+                    with col2:
+                        st.markdown("**Meilleure Empreinte Carbone**")
+                        st.metric("Poids Carbone", f"{pareto_results[best_carbone_idx]['w_carbone']:.3f}")
+                        st.metric("Contacts Utiles", f"{pareto_results[best_carbone_idx]['contacts_utiles']:,.0f}")
+                        st.metric("Carbone", f"{pareto_results[best_carbone_idx]['carbone_kg']:,.1f} kg")
+                    
+                    with col3:
+                        st.markdown("**Compromis Optimal**")
+                        st.metric("Poids Carbone", f"{pareto_results[optimal_idx]['w_carbone']:.3f}")
+                        st.metric("Contacts Utiles", f"{pareto_results[optimal_idx]['contacts_utiles']:,.0f}")
+                        st.metric("Carbone", f"{pareto_results[optimal_idx]['carbone_kg']:,.1f} kg")
+                    
+                    # Option d'export
+                    st.markdown("---")
+                    if st.button("Exporter les résultats Pareto (CSV)"):
+                        print(st.session_state.df_pareto_final)
+                        csv = st.session_state.df_pareto_final.to_csv(index=False)
+                        st.download_button(
+                            label="Télécharger CSV",
+                            data=csv,
+                            file_name="pareto_analysis.csv",
+                            mime="text/csv"
+                        )
+                else:
+                    st.error("❌ Le suivi du front de Pareto n'a pas abouti")
+            
+            except Exception as e:
+                st.error(f"❌ Erreur lors de la génération de la courbe de Pareto : {e}")
+                import traceback
+                st.code(traceback.format_exc())
+        
+        # Grille de scénarios (sensibilité aux paramètres), répartie sur plusieurs processus
+        st.markdown("---")
+        st.header("Grille de Scénarios")
+        
+        st.markdown("""
+        La grille résout toutes les combinaisons **poids carbone × variation max × budget minimum**
+        pour mesurer la sensibilité du résultat aux paramètres.
+        """)
+        
+        if can_optimize and len(df_optim) > 0:
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                nb_poids_grille = st.slider("Nombre de poids carbone", min_value=2, max_value=101, value=11, key='grille_poids')
+            with col2:
+                variations_grille = st.multiselect(
+                    "Variations max",
+                    options=[0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0],
+                    default=[0.25, 0.5, 1.0],
+                    key='grille_variations'
+                )
+            with col3:
+                plafond = int(total_budget / len(df_optim))
+                budgets_grille = st.multiselect(
+                    "Budgets minimum par support (€)",
+                    options=sorted({int(plafond * f) for f in (0, 0.1, 0.25, 0.5, 1)} | {int(min_budget_par_canal)}),
+                    default=[int(min_budget_par_canal)],
+                    key='grille_budgets'
+                )
+            nb_tranches = len(variations_grille) * len(budgets_grille)
+            nb_scenarios = nb_poids_grille * nb_tranches
+            
+            if st.button(f"▶️ Lancer la grille ({nb_scenarios:,} scénarios)", disabled=nb_scenarios == 0):
+                lancer_tache(
+                    'grille',
+                    "Grille de scénarios",
+                    calculer_grille,
+                    df_optim.copy(),
+                    np.linspace(0.0, 1.0, nb_poids_grille),
+                    variations_grille,
+                    budgets_grille,
+                    suivi=True
+                )
+            
+            # Dernière grille de la session: résultats partiels pendant le calcul (annulable), puis complets
+            tache_grille = tache_session('grille')
+            if tache_grille is not None and not tache_grille.terminee:
+                suivre_tache(
+                    tache_grille.id,
+                    lambda df_partiel: st.plotly_chart(graphique_grille(df_partiel), config={'responsive': True})
+                )
+            elif tache_grille is not None and tache_grille.etat == ECHEC:
+                st.error(f"❌ Erreur lors du calcul de la grille : {tache_grille.erreur}")
+            elif tache_grille is not None and tache_grille.etat in (TERMINEE, ANNULEE):
+                df_grille = tache_grille.resultat
+                nb_infaisables = int(df_grille['Erreur'].notna().sum())
+                st.caption(
+                    f"{len(df_grille):,} scénarios calculés en {tache_grille.duree:.1f} s"
+                    + (f" dont {nb_infaisables:,} infaisables" if nb_infaisables else "")
+                    + (" (grille annulée)" if tache_grille.etat == ANNULEE else "")
+                )
+                st.plotly_chart(
+                    rendu('grille', partial(graphique_grille, df_grille), tache_grille.id),
+                    config={'responsive': True}
+                )
+                st.dataframe(
+                    df_grille,
+                    column_config={
+                        'w_carbone': st.column_config.NumberColumn("Poids Carbone", format="%.2f"),
+                        'Max_variation': st.column_config.NumberColumn("Variation max", format="%.2f"),
+                        'Min_budget': st.column_config.NumberColumn("Budget min (€)", format="%d"),
+                        'Contacts_utiles': st.column_config.NumberColumn("Contacts Utiles", format="%.0f"),
+                        'Carbone_g': st.column_config.NumberColumn("Carbone (g)", format="%.0f"),
+                    },
+                    width=1200
+                )
+                st.download_button(
+                    "Télécharger la grille (CSV)",
+                    data=df_grille.to_csv(index=False),
+                    file_name="grille_scenarios.csv",
+                    mime="text/csv"
+                )
+        
+        # Statistiques du cache de l'optimiseur (partagé entre sessions)
+        stats_cache = get_cache_optimisation().stats()
+        st.caption(
+            f"Cache optimiseur : {stats_cache['hits']} hits / {stats_cache['hits_stockage']} relus sur disque / "
+            f"{stats_cache['misses']} misses ({stats_cache['taille']}/{stats_cache['taille_max']} résultats)"
+        )
+        
+        # Historique des résolutions de la session (repérer les scénarios coûteux)
+        if st.session_state.get('historique_performance'):
+            with st.expander(f"⏱️ Performance de la session ({len(st.session_state.historique_performance)} résolutions)"):
+                st.dataframe(pd.DataFrame(list(st.session_state.historique_performance.values())), width=1200)
         
         # Bouton pour tout réinitialiser
         st.markdown("---")
         if st.button("🔄 Réinitialiser tous les plans", type="secondary"):
             st.session_state.plans = []
+            if stockage is not None:
+                stockage.vider_plans(espace)
+            st.session_state.version_plans += 1
             st.rerun()
     
     else:
@@ -733,7 +1637,7 @@ if co2_ref is not None:
         """)
         
         # Afficher la table de référence CO2
-        st.dataframe(co2_ref, width=1200)
+        st.dataframe(co2_ref.to_dataframe(), width=1200)
 
 else:
     st.error("⚠️ Impossible de charger le fichier de référence CO2g contact.xlsx")
@@ -0,0 +1,451 @@
+"""
+Mesures de performance des chemins critiques (optimiseur, lecture des CSV, agrégation) sur des
+données synthétiques, avec vérifications de justesse entre solveurs.
+
+Les résultats sont écrits en JSON (version git, machine, temps min/médian par cas) pour être
+comparés d'un commit à l'autre:
+
+    python benchmark.py -o bench_avant.json
+    python benchmark.py -o bench_apres.json --comparer bench_avant.json
+
+Le profil "rapide" (défaut) tourne en quelques minutes (surtout trust-constr); "complet" va
+jusqu'à 100k variables et des CSV de 1 Go.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+import scipy
+
+from incertitude import evaluer_tirages, incertitudes_defaut, tirer_facteurs
+from ingestion import lire_plan
+from moteur import resume_supports, tableau_plans
+from optimizer import (
+    evaluer, optimisation_media, optimisation_periodes, optimisation_plafond_carbone, optimisation_robuste,
+    pareto_exact, pareto_front,
+)
+from reponse import MODELES
+
+PROFILS = {
+    'rapide': {
+        'variables': (5, 100, 1_000, 10_000),
+        'variables_scipy': (5, 50),
+        'variables_pareto_exact': (5, 100),
+        'variables_reponse': (50, 1_000),
+        'variables_plafond': (100, 1_000),
+        'supports_tirages': ((50, 10_000), (50, 100_000)),
+        'variables_robuste': (10, 50),
+        'supports_periodes': ((50, 52), (200, 52)),
+        'octets_csv': (1_000_000, 10_000_000),
+        'plans': (5, 100, 1_000),
+        'duree_min': 0.2,
+    },
+    'complet': {
+        'variables': (5, 100, 1_000, 10_000, 100_000),
+        'variables_scipy': (5, 50, 500),
+        'variables_pareto_exact': (5, 100, 1_000),
+        'variables_reponse': (50, 1_000, 100_000),
+        'variables_plafond': (100, 1_000, 10_000),
+        'supports_tirages': ((50, 10_000), (50, 100_000), (200, 100_000)),
+        'variables_robuste': (10, 50, 200),
+        'supports_periodes': ((50, 52), (200, 52), (1_000, 52), (200, 365)),
+        'octets_csv': (1_000_000, 10_000_000, 100_000_000, 1_000_000_000),
+        'plans': (5, 100, 1_000, 10_000, 100_000),
+        'duree_min': 1.0,
+    },
+}
+
+# Écart relatif max toléré entre solveurs (objectif) et entre front exact et balayage (allocations)
+TOLERANCE_SOLVEURS = 1e-6
+TOLERANCE_PARETO = 1e-6
+
+SUPPORTS = ('AFFICHAGE', 'CINEMA', 'PRESSE', 'RADIO', 'TV', 'DIGITAL', 'OOH', 'AUTRES')
+
+
+def probleme(n, graine=0):
+    """Entrée synthétique de l'optimiseur à n variables (colonnes de donnees_optimisation)."""
+    rng = np.random.default_rng(graine)
+    budget = rng.uniform(2_000, 100_000, n)
+    contacts = budget * rng.uniform(5, 50, n)
+    alpha = rng.uniform(20, 100, n)
+    co2_factor = rng.uniform(0.1, 12, n)
+    return pd.DataFrame({
+        'Support': [f"S{i}" for i in range(n)],
+        'Budget': budget,
+        'Contacts': contacts,
+        'Alpha': alpha,
+        'Contacts_utiles': contacts * alpha / 100,
+        'Contacts_utiles_per_euro': contacts * alpha / 100 / budget,
+        'Carbone_per_euro': contacts / budget * co2_factor,
+        'CO2_factor': co2_factor,
+    })
+
+
+def courbes_synthetiques(n, graine=0):
+    """Courbes de réponse (un modèle par variable, tous les modèles représentés) pour probleme(n)."""
+    rng = np.random.default_rng(graine)
+    return pd.DataFrame({
+        'Modele': np.array(MODELES)[np.arange(n) % len(MODELES)],
+        'Forme': rng.uniform(0.3, 1.0, n),
+        'Echelle': rng.uniform(500, 20_000, n),
+        'Lignes': rng.integers(1, 50, n).astype(float),
+    })
+
+
+def probleme_periodes(nb_supports, nb_periodes, graine=0):
+    """
+    Entrée de optimisation_periodes (nb_supports x nb_periodes variables) et plafonds par
+    période serrés: budget à 105 % et carbone à 90 % de l'initial, une période sur trois libre.
+    """
+    df = pd.concat(
+        [probleme(nb_supports, graine + p).assign(Periode=f"S{p + 1}") for p in range(nb_periodes)],
+        ignore_index=True,
+    )
+    df['Support'] = np.tile([f"S{i}" for i in range(nb_supports)], nb_periodes)
+    periodes = df.groupby('Periode', sort=False)
+    budget = periodes['Budget'].sum() * 1.05
+    carbone = (df['Budget'] * df['Carbone_per_euro']).groupby(df['Periode'], sort=False).sum() * 0.9
+    libres = np.arange(nb_periodes) % 3 == 2
+    return df, budget[~libres].to_dict(), carbone[~libres].to_dict()
+
+
+def plafonds_carbone_front(df, nb):
+    """nb plafonds de carbone (g) répartis du carbone minimal à celui de l'optimum sans plafond."""
+    libre = optimisation_plafond_carbone(df, np.inf)
+    return np.linspace(libre.carbone_min, libre.carbone_g, nb)
+
+
+def plans_synthetiques(nb, graine=0):
+    """nb plans (dicts au format de moteur.creer_plan, sans détail ligne à ligne)."""
+    rng = np.random.default_rng(graine)
+    contacts = rng.uniform(1e4, 1e7, nb)
+    budget = rng.uniform(1e3, 1e5, nb)
+    co2 = rng.uniform(0.1, 12, len(SUPPORTS))
+    supports = rng.integers(0, len(SUPPORTS), nb)
+    return [
+        {
+            'nom': f"plan_{i}", 'support': SUPPORTS[s], 'data': None,
+            'contacts': float(c), 'budget': float(b), 'nb_lignes': 0, 'nb_rejets': 0,
+            'lignes_rejetees': [], 'co2_factor': float(co2[s]), 'co2_total': float(c * co2[s]),
+        }
+        for i, (c, b, s) in enumerate(zip(contacts, budget, supports))
+    ]
+
+
+def ecrire_csv(chemin, octets, graine=0):
+    """Plan CSV au format français ('1 234,56' séparé par ';') d'environ `octets` octets."""
+    rng = np.random.default_rng(graine)
+    lignes = 100_000
+    contacts = rng.integers(1_000, 10_000_000, lignes)
+    budgets = rng.integers(100, 10_000_000, lignes) / 100
+    bloc = "".join(
+        f"L{i};{c:,}".replace(",", " ") + ";" + f"{b:,.2f}".replace(",", " ").replace(".", ",") + "\n"
+        for i, (c, b) in enumerate(zip(contacts, budgets))
+    ).encode()
+    with open(chemin, "wb") as f:
+        f.write(b"Insertion;Contact;Budget\n")
+        ecrits = 0
+        while ecrits < octets:
+            morceau = bloc[:octets - ecrits] if octets - ecrits < len(bloc) else bloc
+            morceau = morceau[:morceau.rfind(b"\n") + 1] or bloc
+            f.write(morceau)
+            ecrits += len(morceau)
+    return chemin
+
+
+def mesurer(fonction, duree_min):
+    """Exécute fonction jusqu'à cumuler duree_min secondes (au moins 3 fois, au plus 1000)."""
+    temps = []
+    debut = time.perf_counter()
+    while len(temps) < 3 or (time.perf_counter() - debut < duree_min and len(temps) < 1000):
+        t0 = time.perf_counter()
+        fonction()
+        temps.append(time.perf_counter() - t0)
+        if temps[-1] > duree_min * 5:
+            break  # cas long: une seule mesure suffit
+    temps = np.array(temps)
+    return {
+        'min': float(temps.min()),
+        'mediane': float(np.median(temps)),
+        'moyenne': float(temps.mean()),
+        'repetitions': len(temps),
+    }
+
+
+def cas(profil, dossier):
+    """Cas mesurés: (nom, paramètres, fonction sans argument)."""
+    for n in profil['variables']:
+        df = probleme(n)
+        yield 'optimisation_media', {'n': n, 'method': 'waterfill'}, lambda df=df: optimisation_media(df, method="waterfill")
+        yield 'pareto_front', {'n': n, 'poids': 201}, lambda df=df: pareto_front(df)
+        yield 'evaluer', {'n': n, 'scenarios': 1_000}, (
+            lambda df=df, X=np.tile(df['Budget'].to_numpy(), (1_000, 1)): evaluer(df, X)
+        )
+    for n in profil['variables_scipy']:
+        df = probleme(n)
+        for method in ('trust-constr', 'SLSQP'):
+            yield 'optimisation_media', {'n': n, 'method': method}, lambda df=df, m=method: optimisation_media(df, method=m)
+    for n in profil['variables_pareto_exact']:
+        df = probleme(n)
+        yield 'pareto_exact', {'n': n}, lambda df=df: pareto_exact(df)
+    for n in profil['variables_reponse']:
+        df, courbes = probleme(n), courbes_synthetiques(n)
+        yield 'optimisation_reponse', {'n': n}, lambda df=df, c=courbes: optimisation_media(df, courbes=c)
+    for n in profil['variables_plafond']:
+        df = probleme(n)
+        plafonds = plafonds_carbone_front(df, 100)
+        yield 'optimisation_plafond_carbone', {'n': n, 'plafonds': 1}, (
+            lambda df=df, X=plafonds[50]: optimisation_plafond_carbone(df, X)
+        )
+        yield 'optimisation_plafond_carbone', {'n': n, 'plafonds': 100}, (
+            lambda df=df, X=plafonds: optimisation_plafond_carbone(df, X)
+        )
+    for nb_supports, nb_tirages in profil['supports_tirages']:
+        df = probleme(nb_supports)
+        tirages = tirer_facteurs(incertitudes_defaut(df['Support']), nb_tirages)
+        yield 'tirer_facteurs', {'supports': nb_supports, 'tirages': nb_tirages}, (
+            lambda df=df, nb=nb_tirages: tirer_facteurs(incertitudes_defaut(df['Support']), nb)
+        )
+        yield 'evaluer_tirages', {'supports': nb_supports, 'tirages': nb_tirages}, (
+            lambda df=df, t=tirages: evaluer_tirages(df, df['Budget'].to_numpy(), t)
+        )
+    for n in profil['variables_robuste']:
+        df = probleme(n)
+        for critere in ('cvar', 'pire_cas'):
+            yield 'optimisation_robuste', {'n': n, 'critere': critere}, (
+                lambda df=df, c=critere: optimisation_robuste(df, incertitudes_defaut(df['Support']), critere=c)
+            )
+    for nb_supports, nb_periodes in profil['supports_periodes']:
+        df, plafonds_budget, plafonds_carbone = probleme_periodes(nb_supports, nb_periodes)
+        yield 'optimisation_periodes', {'supports': nb_supports, 'periodes': nb_periodes}, (
+            lambda df=df, b=plafonds_budget, c=plafonds_carbone: optimisation_periodes(
+                df, plafonds_budget=b, plafonds_carbone=c,
+            )
+        )
+    for octets in profil['octets_csv']:
+        chemin = ecrire_csv(os.path.join(dossier, f"plan_{octets}.csv"), octets)
+        yield 'lire_plan', {'octets': octets}, lambda chemin=chemin: lire_plan(chemin)
+    for nb in profil['plans']:
+        plans = plans_synthetiques(nb)
+        yield 'resume_supports', {'plans': nb}, lambda plans=plans: resume_supports(tableau_plans(plans))
+
+
+def verifications(tailles_solveurs=(5, 20), tailles_pareto=(5, 20, 50), graines=range(2)):
+    """
+    Compare les solveurs entre eux (même objectif à TOLERANCE_SOLVEURS près, budget et bornes
+    respectés) et le front exact au balayage sur une grille de poids. Le solveur par période
+    est comparé au water-filling sans plafond, et contrôlé (plafonds, budget, KKT) avec; le mode
+    plafond de carbone est contrôlé de même (plafond atteint ou multiplicateur nul, KKT). Sans
+    incertitude, tous les tirages Monte Carlo doivent redonner evaluer.
+    Le drapeau success des solveurs est noté mais ne fait pas échouer la vérification: SLSQP
+    signale parfois un échec de recherche linéaire sur une solution optimale.
+    """
+    resultats = []
+    for n in tailles_solveurs:
+        for graine in graines:
+            df = probleme(n, graine)
+            budget_total = df['Budget'].sum()
+            # Bornes des paramètres par défaut (min_budget_par_canal=1000, max_variation=0.5)
+            lower = np.maximum(1000, df['Budget'].to_numpy() * 0.5)
+            upper = df['Budget'].to_numpy() * 1.5
+            for w in (0.0, 0.5, 1.0):
+                res = {m: optimisation_media(df, w_carbone=w, method=m) for m in ('waterfill', 'trust-constr', 'SLSQP')}
+                reference = min(r.fun for r in res.values())
+                for m, r in res.items():
+                    ecart = (r.fun - reference) / max(1.0, abs(reference))
+                    budget = abs(r.x.sum() - budget_total) / budget_total
+                    hors_bornes = float(np.maximum(lower - r.x, r.x - upper).max() / budget_total)
+                    resultats.append({
+                        'verification': 'objectif', 'n': n, 'graine': graine, 'w_carbone': w, 'method': m,
+                        'success': bool(r.success), 'ecart_objectif': float(ecart),
+                        'ecart_budget': float(budget), 'hors_bornes': hors_bornes,
+                        'ok': bool(max(ecart, budget, hors_bornes) <= TOLERANCE_SOLVEURS),
+                    })
+
+    # Courbes de réponse: solveur dédié contre trust-constr (mêmes dérivées analytiques)
+    for n in tailles_solveurs:
+        for graine in graines:
+            df, courbes = probleme(n, graine), courbes_synthetiques(n, graine)
+            for w in (0.0, 0.5, 1.0):
+                res = {m: optimisation_media(df, w_carbone=w, method=m, courbes=courbes) for m in ('auto', 'trust-constr')}
+                reference = min(r.fun for r in res.values())
+                for m, r in res.items():
+                    ecart = (r.fun - reference) / max(1.0, abs(reference))
+                    budget = abs(r.x.sum() - df['Budget'].sum()) / df['Budget'].sum()
+                    resultats.append({
+                        'verification': 'reponse', 'n': n, 'graine': graine, 'w_carbone': w, 'method': m,
+                        'success': bool(r.success), 'ecart_objectif': float(ecart), 'ecart_budget': float(budget),
+                        'ok': bool(max(ecart, budget) <= TOLERANCE_SOLVEURS),
+                    })
+
+    # Plafonds par période: sans plafond, même solution que le water-filling par ligne
+    for nb_supports in tailles_solveurs:
+        for graine in graines:
+            df, plafonds_budget, plafonds_carbone = probleme_periodes(nb_supports, 4, graine)
+            budget_total = df['Budget'].sum()
+            libre = optimisation_periodes(df)
+            reference = optimisation_media(df, min_budget_par_canal=0, granularite="ligne", method="waterfill")
+            ecart = float(np.abs(libre.x - reference.x).max() / budget_total)
+            resultats.append({
+                'verification': 'periodes', 'n': len(df), 'graine': graine, 'plafonds': False,
+                'ecart_allocation': ecart, 'ok': bool(libre.success and ecart <= TOLERANCE_SOLVEURS),
+            })
+            res = optimisation_periodes(df, plafonds_budget=plafonds_budget, plafonds_carbone=plafonds_carbone)
+            periodes = df['Periode'].to_numpy()
+            depenses = pd.Series(res.x).groupby(periodes, sort=False).sum()
+            carbone = pd.Series(res.x * df['Carbone_per_euro'].to_numpy()).groupby(periodes, sort=False).sum()
+            depassement = max(
+                float((depenses - pd.Series(plafonds_budget)).max() / budget_total),
+                float(((carbone - pd.Series(plafonds_carbone)) / pd.Series(plafonds_carbone)).max()),
+            )
+            budget = abs(res.x.sum() - budget_total) / budget_total
+            resultats.append({
+                'verification': 'periodes', 'n': len(df), 'graine': graine, 'plafonds': True,
+                'depassement': depassement, 'ecart_budget': float(budget),
+                'residu_kkt': res.telemetrie['residu_kkt'],
+                'ok': bool(res.success and max(depassement, budget, res.telemetrie['residu_kkt']) <= TOLERANCE_SOLVEURS),
+            })
+
+    # Plafond de carbone: plafond respecté, atteint dès que son multiplicateur est non nul, KKT
+    for n in tailles_pareto:
+        for graine in graines:
+            df = probleme(n, graine)
+            plafonds = plafonds_carbone_front(df, 21)
+            res = optimisation_plafond_carbone(df, plafonds)
+            depassement = float(np.max((res.carbone_g - plafonds) / plafonds))
+            ecart_actif = float(np.max(np.where(res.contacts_par_gramme > 0, np.abs(res.carbone_g - plafonds) / plafonds, 0.0)))
+            budget = float(np.abs(res.x.sum(axis=1) - df['Budget'].sum()).max() / df['Budget'].sum())
+            resultats.append({
+                'verification': 'plafond_carbone', 'n': n, 'graine': graine,
+                'depassement': depassement, 'ecart_plafond_actif': ecart_actif, 'ecart_budget': budget,
+                'residu_kkt': res.telemetrie['residu_kkt'],
+                'ok': bool(
+                    res.success.all()
+                    and max(depassement, ecart_actif, budget, res.telemetrie['residu_kkt']) <= TOLERANCE_SOLVEURS
+                ),
+            })
+
+    # Monte Carlo: incertitudes nulles => chaque tirage égal à l'évaluation déterministe
+    for n in tailles_pareto:
+        df = probleme(n)
+        X = df['Budget'].to_numpy() * np.random.default_rng(n).uniform(0.5, 1.5, (3, n))
+        contacts, carbone = evaluer_tirages(df, X, tirer_facteurs(incertitudes_defaut(df['Support'], 0.0, 0.0), 100))
+        contacts_ref, carbone_ref = evaluer(df, X)
+        ecart = float(max(
+            np.abs(contacts / contacts_ref[:, None] - 1).max(), np.abs(carbone / carbone_ref[:, None] - 1).max(),
+        ))
+        resultats.append({
+            'verification': 'tirages', 'n': n, 'ecart_relatif': ecart, 'ok': bool(ecart <= TOLERANCE_SOLVEURS),
+        })
+
+    for n in tailles_pareto:
+        for graine in graines:
+            df = probleme(n, graine)
+            front = pareto_exact(df)
+            grille = np.linspace(0.0, 1.0, 101)
+            balayage = pareto_front(df, weights=grille)
+            interpole = np.column_stack([np.interp(grille, front.w_carbone, front.x[:, i]) for i in range(n)])
+            ecart = float(np.abs(interpole - balayage.x).max() / df['Budget'].max())
+            resultats.append({
+                'verification': 'pareto_exact', 'n': n, 'graine': graine,
+                'ecart_allocation': ecart, 'ok': bool(front.success and ecart <= TOLERANCE_PARETO),
+            })
+    return resultats
+
+
+def version_git():
+    try:
+        sortie = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        return sortie.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparer(resultats, chemin_reference, seuil):
+    """Affiche le rapport temps / référence (minimums, moins bruités) et renvoie les cas plus lents que seuil."""
+    with open(chemin_reference, encoding="utf-8") as f:
+        reference = json.load(f)
+    anciens = {(r['nom'], json.dumps(r['parametres'], sort_keys=True)): r for r in reference['resultats']}
+    regressions = []
+    for r in resultats:
+        ancien = anciens.get((r['nom'], json.dumps(r['parametres'], sort_keys=True)))
+        if ancien is None:
+            continue
+        rapport = r['secondes']['min'] / ancien['secondes']['min']
+        marque = " ⚠️" if rapport > seuil else ""
+        print(f"{r['nom']:<20} {json.dumps(r['parametres']):<45} x{rapport:.2f}{marque}", file=sys.stderr)
+        if rapport > seuil:
+            regressions.append(r)
+    return regressions
+
+
+def creer_parser():
+    parser = argparse.ArgumentParser(prog="benchmark", description="Mesures de performance et vérifications des solveurs.")
+    parser.add_argument("--profil", choices=tuple(PROFILS), default="rapide", help="tailles mesurées (défaut: rapide)")
+    parser.add_argument("-o", "--sortie", default="bench_resultats.json", help="fichier JSON des résultats")
+    parser.add_argument("-k", "--filtre", help="ne mesurer que les cas dont le nom contient ce texte")
+    parser.add_argument("--sans-verifications", action="store_true", help="ne pas comparer les solveurs")
+    parser.add_argument("--comparer", help="JSON d'une exécution précédente à comparer")
+    parser.add_argument("--seuil", type=float, default=1.2, help="rapport de temps signalé comme régression (défaut: 1.2)")
+    return parser
+
+
+def main(argv=None):
+    args = creer_parser().parse_args(argv)
+    profil = PROFILS[args.profil]
+    warnings.simplefilter("ignore")  # avertissements de normalisation des petits problèmes
+
+    resultats = []
+    with tempfile.TemporaryDirectory(prefix="bench_carbone_") as dossier:
+        for nom, parametres, fonction in cas(profil, dossier):
+            if args.filtre and args.filtre not in nom:
+                continue
+            secondes = mesurer(fonction, profil['duree_min'])
+            resultats.append({'nom': nom, 'parametres': parametres, 'secondes': secondes})
+            print(f"{nom:<20} {json.dumps(parametres):<45} {secondes['mediane'] * 1e3:10.3f} ms", file=sys.stderr)
+
+    controles = [] if args.sans_verifications else verifications()
+    echecs = [c for c in controles if not c['ok']]
+    if controles:
+        print(f"vérifications: {len(controles) - len(echecs)}/{len(controles)} correctes", file=sys.stderr)
+    for echec in echecs:
+        print(f"⚠️ {echec}", file=sys.stderr)
+
+    rapport = {
+        'version': version_git(),
+        'date': datetime.datetime.now().isoformat(timespec="seconds"),
+        'profil': args.profil,
+        'machine': {
+            'plateforme': platform.platform(),
+            'processeur': platform.processor(),
+            'nb_coeurs': os.cpu_count(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'scipy': scipy.__version__,
+            'pandas': pd.__version__,
+        },
+        'resultats': resultats,
+        'verifications': controles,
+    }
+    with open(args.sortie, "w", encoding="utf-8") as f:
+        json.dump(rapport, f, indent=2, ensure_ascii=False)
+    print(f"{args.sortie} : {len(resultats)} mesures", file=sys.stderr)
+
+    regressions = comparer(resultats, args.comparer, args.seuil) if args.comparer else []
+    return 1 if echecs or regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""
+Calcul de l'empreinte carbone de campagnes média en ligne de commande (sans Streamlit).
+
+Chaque chemin est une campagne: un dossier de plans CSV/ZIP (avec un manifeste.csv
+optionnel associant fichiers et supports), une archive ZIP ou un CSV seul.
+
+Exemple:
+    python carbone.py campagnes/* --sortie resultats --optimiser --pareto --processus 8
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from moteur import traiter_campagne
+from reference import FICHIER_REFERENCE
+from reponse import MODELES
+
+TABLES = ('plans', 'supports', 'optimisation', 'pareto')
+
+
+def creer_parser():
+    parser = argparse.ArgumentParser(
+        prog="carbone",
+        description="Empreinte carbone et optimisation budget/carbone de campagnes média.",
+    )
+    parser.add_argument("campagnes", nargs="+", help="dossiers, archives ZIP ou CSV (une campagne chacun)")
+    parser.add_argument("-o", "--sortie", default="resultats", help="dossier de sortie (défaut: resultats)")
+    parser.add_argument("--format", choices=("csv", "parquet"), default="csv", help="format des fichiers de sortie")
+    parser.add_argument("--reference", default=FICHIER_REFERENCE, help="fichier Excel des facteurs CO2/Alpha")
+    parser.add_argument("--optimiser", action="store_true", help="optimiser la répartition budgétaire")
+    parser.add_argument("--pareto", action="store_true", help="calculer le front de Pareto exact")
+    parser.add_argument("--w-carbone", type=float, default=0.5, help="poids du carbone dans [0,1] (défaut: 0.5)")
+    parser.add_argument("--max-variation", type=float, default=0.5, help="variation max par support (défaut: 0.5)")
+    parser.add_argument("--min-budget", type=float, default=1000, help="budget minimum par support en € (défaut: 1000)")
+    parser.add_argument(
+        "--granularite", choices=("support", "ligne"), default="support",
+        help="variables de l'optimisation: une par support ou une par ligne de plan (défaut: support)",
+    )
+    parser.add_argument(
+        "--reponse", choices=("lineaire", "auto") + MODELES[1:], default="lineaire",
+        help="réponse des contacts au budget: linéaire, ou rendements décroissants ajustés par support "
+             "sur les lignes des plans (défaut: lineaire)",
+    )
+    parser.add_argument(
+        "--stockage", metavar="BASE",
+        help="base SQLite où mémoriser fichiers lus et résultats d'une exécution à l'autre (ex: .carbone.sqlite)",
+    )
+    parser.add_argument("-p", "--processus", type=int, default=os.cpu_count() or 1, help="nombre de processus")
+    return parser
+
+
+def main(argv=None):
+    args = creer_parser().parse_args(argv)
+    options = dict(
+        chemin_reference=os.path.abspath(args.reference),
+        optimiser=args.optimiser,
+        pareto=args.pareto,
+        w_carbone=args.w_carbone,
+        min_budget_par_canal=args.min_budget,
+        max_variation=args.max_variation,
+        granularite=args.granularite,
+        reponse=args.reponse,
+        chemin_stockage=os.path.abspath(args.stockage) if args.stockage else None,
+    )
+
+    resultats, erreurs = [], []
+    with ProcessPoolExecutor(max_workers=max(1, args.processus)) as executeur:
+        taches = {executeur.submit(traiter_campagne, chemin, **options): chemin for chemin in args.campagnes}
+        for termines, tache in enumerate(as_completed(taches), start=1):
+            chemin = taches[tache]
+            try:
+                resultat = tache.result()
+            except Exception as e:
+                erreurs.append(f"{chemin} : {e}")
+                continue
+            resultats.append(resultat)
+            erreurs.extend(resultat['erreurs'])
+            print(f"[{termines}/{len(taches)}] {resultat['campagne']}", file=sys.stderr)
+
+    os.makedirs(args.sortie, exist_ok=True)
+    for nom in TABLES:
+        frames = [
+            r[nom].assign(Campagne=r['campagne'])[['Campagne', *r[nom].columns]]
+            for r in sorted(resultats, key=lambda r: r['campagne']) if r[nom] is not None
+        ]
+        if not frames:
+            continue
+        df = pd.concat(frames, ignore_index=True)
+        chemin_sortie = os.path.join(args.sortie, f"{nom}.{args.format}")
+        if args.format == "parquet":
+            df.to_parquet(chemin_sortie, index=False)
+        else:
+            df.to_csv(chemin_sortie, index=False)
+        print(f"{chemin_sortie} : {len(df)} lignes", file=sys.stderr)
+
+    for erreur in erreurs:
+        print(f"⚠️ {erreur}", file=sys.stderr)
+    return 1 if not resultats else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
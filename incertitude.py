@@ -0,0 +1,151 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# Lois des facteurs multiplicatifs des valeurs de référence, sur [1 - r, 1 + r] (r: incertitude
+# relative du support): triangulaire de mode 1 (valeur de référence la plus probable) ou uniforme
+LOIS = ("triangulaire", "uniforme")
+# Nombre de tirages par défaut d'une évaluation Monte Carlo
+NB_TIRAGES = 10_000
+# Incertitudes relatives par défaut (0.2 = ±20 %) sur CO2g/Contact et Alpha
+INCERTITUDE_CO2 = 0.2
+INCERTITUDE_ALPHA = 0.1
+# Centiles résumés (bas, médian, haut) et queue des CVaR (5 % des tirages les plus défavorables)
+CENTILES = (5, 50, 95)
+QUEUE_CVAR = 0.05
+
+
+def incertitudes_defaut(supports, co2=INCERTITUDE_CO2, alpha=INCERTITUDE_ALPHA):
+    """Incertitudes relatives par support (DataFrame indexé par Support, colonnes 'CO2' et 'Alpha')."""
+    supports = pd.unique(pd.Series(supports))
+    return pd.DataFrame({'CO2': co2, 'Alpha': alpha}, index=pd.Index(supports, name='Support'), dtype=float)
+
+
+class Tirages:
+    """
+    Tirages Monte Carlo des facteurs multiplicatifs de CO2g/Contact et d'Alpha, indépendants
+    par support: co2 et alpha sont des matrices (nb_tirages, nb_supports), colonnes dans
+    l'ordre de supports, et demi_largeurs (nb_supports, 2) les incertitudes relatives (CO2,
+    Alpha) dont ils sont tirés. Le carbone et les contacts utiles étant linéaires en ces
+    facteurs, une allocation s'évalue sur tous les tirages en un produit matriciel.
+    """
+
+    def __init__(self, supports, co2, alpha, demi_largeurs):
+        self.supports = pd.Index(supports)
+        self.co2 = co2
+        self.alpha = alpha
+        self.demi_largeurs = demi_largeurs
+
+    def __len__(self):
+        return len(self.co2)
+
+    def coefficients(self, df):
+        """
+        Contacts utiles et carbone par euro de chaque variable de df, par tirage: deux matrices
+        (nb_tirages, n). Pour l'optimisation robuste (n petit); l'évaluation passe par evaluer_tirages.
+        """
+        codes = self._codes(df)
+        return (
+            self.alpha[:, codes] * df['Contacts_utiles_per_euro'].to_numpy(dtype=float),
+            self.co2[:, codes] * df['Carbone_per_euro'].to_numpy(dtype=float),
+        )
+
+    def bornes(self, df):
+        """
+        Facteurs au pire de chaque variable de df (bornes des intervalles, pas des tirages):
+        (co2_max, alpha_min), deux vecteurs (n,) alignés sur les lignes de df.
+        """
+        r = self.demi_largeurs[self._codes(df)]
+        return 1 + r[:, 0], 1 - r[:, 1]
+
+    def _codes(self, df):
+        codes = self.supports.get_indexer(df['Support'])
+        if (codes < 0).any():
+            inconnus = df['Support'][codes < 0].unique()
+            raise ValueError(f"Incertitude non définie pour: {', '.join(map(str, inconnus))}")
+        return codes
+
+
+def tirer_facteurs(incertitudes, nb_tirages=NB_TIRAGES, loi="triangulaire", graine=0):
+    """
+    Tire nb_tirages jeux de facteurs multiplicatifs par support.
+
+    Paramètres:
+      - incertitudes: DataFrame indexé par Support, colonnes 'CO2' et 'Alpha': demi-largeur
+                      relative r dans [0, 1] (facteurs dans [1 - r, 1 + r])
+      - loi: une des LOIS
+      - graine: graine du générateur (tirages reproductibles: mêmes tirages pour comparer
+                plusieurs allocations)
+
+    Retourne un Tirages.
+    """
+    if loi not in LOIS:
+        raise ValueError(f"Loi inconnue: {loi!r} (attendu: {', '.join(LOIS)})")
+    if nb_tirages < 1:
+        raise ValueError("nb_tirages doit être >= 1")
+    r = incertitudes[['CO2', 'Alpha']].to_numpy(dtype=float)
+    if np.isnan(r).any() or (r < 0).any() or (r > 1).any():
+        raise ValueError("Les incertitudes relatives doivent être comprises entre 0 et 1 (0.2 = ±20 %)")
+    rng = np.random.default_rng(graine)
+    # Opérations en place: un seul tableau (2, nb_tirages, supports) alloué en plus des tirages
+    forme = (2, nb_tirages, len(r))
+    facteurs = rng.random(forme)
+    if loi == "uniforme":
+        facteurs *= 2
+        facteurs -= 1
+    else:
+        # Différence de deux uniformes: triangulaire sur [-1, 1], de mode 0
+        facteurs -= rng.random(forme)
+    facteurs *= r.T[:, None, :]
+    facteurs += 1
+    return Tirages(incertitudes.index, facteurs[0], facteurs[1], r)
+
+
+def evaluer_tirages(df, X, tirages):
+    """
+    Contacts utiles et carbone (g) d'allocations sur tous les tirages, vectorisés.
+
+    Paramètres:
+      - df: variables de l'optimiseur (colonnes 'Support', 'Contacts_utiles_per_euro',
+            'Carbone_per_euro'), par support ou par ligne de plan
+      - X: allocation (n,) ou matrice (m, n) d'allocations
+      - tirages: Tirages couvrant les supports de df
+
+    Les contributions des variables sont d'abord sommées par support (matrice creuse), puis
+    multipliées par les facteurs: un produit (m, supports) x (supports, tirages).
+
+    Retourne (contacts_utiles, carbone_g): (nb_tirages,) pour une allocation, (m, nb_tirages) sinon.
+    """
+    X = np.asarray(X, dtype=float)
+    codes = tirages._codes(df)
+    n = len(codes)
+    regroupement = sparse.csr_matrix(
+        (np.ones(n), (np.arange(n), codes)), shape=(n, len(tirages.supports)),
+    )
+    lignes = np.atleast_2d(X)
+    contacts = (regroupement.T @ (lignes * df['Contacts_utiles_per_euro'].to_numpy(dtype=float)).T).T
+    carbone = (regroupement.T @ (lignes * df['Carbone_per_euro'].to_numpy(dtype=float)).T).T
+    contacts, carbone = contacts @ tirages.alpha.T, carbone @ tirages.co2.T
+    if X.ndim == 1:
+        return contacts[0], carbone[0]
+    return contacts, carbone
+
+
+def resume_tirages(contacts_utiles, carbone_g, centiles=CENTILES, queue=QUEUE_CVAR):
+    """
+    Distribution des contacts utiles et du carbone d'une allocation sur les tirages.
+
+    Retourne un DataFrame indexé par 'Contacts utiles' et 'CO2 (g)': moyenne, centiles (P5,
+    P50, P95 par défaut) et CVaR, moyenne de la part queue des tirages les plus défavorables
+    (moins de contacts, plus de carbone).
+    """
+    lignes = {}
+    # Valeurs triées de la plus défavorable à la plus favorable
+    for nom, valeurs in (('Contacts utiles', np.sort(contacts_utiles)), ('CO2 (g)', np.sort(carbone_g)[::-1])):
+        nb_queue = max(1, int(np.ceil(queue * len(valeurs))))
+        lignes[nom] = {
+            'Moyenne': float(valeurs.mean()),
+            **{f"P{c}": float(v) for c, v in zip(centiles, np.percentile(valeurs, centiles))},
+            f"CVaR {100 * (1 - queue):.0f} %": float(valeurs[:nb_queue].mean()),
+        }
+    return pd.DataFrame.from_dict(lignes, orient="index")
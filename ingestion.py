@@ -0,0 +1,476 @@
+import csv
+import hashlib
+import io
+import os
+import re
+import shutil
+import tempfile
+import threading
+import zipfile
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager, nullcontext
+
+import numpy as np
+import pandas as pd
+
+from nombres import MAX_REJETS, convertir, detecter_format, options_lecteur
+
+# Nombre de lignes lues par bloc: borne la mémoire quelle que soit la taille du fichier
+TAILLE_BLOC = 200_000
+# Octets lus en tête de fichier pour déduire séparateur, colonnes et format des nombres
+TAILLE_SONDE = 64 * 1024
+# Séparateurs candidats, par ordre de préférence en cas d'égalité
+DELIMITEURS = (",", ";", "\t", "|")
+# Nombre de schémas gardés en mémoire (un par fichier)
+TAILLE_CACHE_SCHEMAS = 512
+# Quantiles des statistiques par plan (min et max compris)
+QUANTILES_STATS = {'min': 0.0, 'q25': 0.25, 'mediane': 0.5, 'q75': 0.75, 'max': 1.0}
+# Lignes échantillonnées par bloc pour estimer les quartiles quand le détail n'est pas conservé
+ECHANTILLON_STATS = 2_000
+
+# Mots repérant la colonne de période (optionnelle) d'un plan; "date": dates ramenées à la semaine ISO
+MOTS_PERIODE = ("semaine", "periode", "période", "week", "vague", "date")
+
+# Nombre de lectures de plans en parallèle (import groupé)
+NB_LECTEURS = min(8, os.cpu_count() or 1)
+
+_schemas = OrderedDict()
+_verrou_schemas = threading.Lock()
+
+
+def detecter_colonnes(colonnes):
+    """
+    Repère les colonnes Contact et Budget d'un plan d'après leur nom
+    ("contact"/"impression" et "budget"/"tarif", sans tenir compte de la casse).
+    Retourne (col_contact, col_budget), None pour une colonne introuvable.
+    """
+    col_contact, col_budget = None, None
+    for col_plan in colonnes:
+        nom = str(col_plan).lower()
+        if col_contact is None and ("contact" in nom or "impression" in nom):
+            col_contact = col_plan
+        if col_budget is None and ("budget" in nom or "tarif" in nom):
+            col_budget = col_plan
+        if col_contact is not None and col_budget is not None:
+            break
+    return col_contact, col_budget
+
+
+def detecter_colonne_periode(colonnes):
+    """
+    Repère la colonne de période d'un plan (semaine, vague, date...) d'après son nom
+    (un des MOTS_PERIODE, sans tenir compte de la casse). Retourne son nom, ou None.
+    """
+    for col_plan in colonnes:
+        nom = str(col_plan).lower()
+        if any(mot in nom for mot in MOTS_PERIODE):
+            return col_plan
+    return None
+
+
+def etiquettes_periodes(valeurs, dates=False):
+    """
+    Étiquettes de période d'une colonne lue en texte: valeurs sans espaces superflus ou, avec
+    dates=True, semaine ISO de chaque date ("2024-S07"; 2024-02-12 ou jour en premier: 12/02/2024).
+    Valeurs vides ou dates illisibles: NaN (ligne sans période).
+    """
+    valeurs = pd.Series(valeurs, dtype=object)
+    if not dates:
+        etiquettes = valeurs.str.strip()
+        return etiquettes.where(etiquettes != "")
+    jours = pd.to_datetime(valeurs, errors="coerce", format="ISO8601")
+    autres = jours.isna() & valeurs.notna()
+    if autres.any():
+        jours[autres] = pd.to_datetime(valeurs[autres], dayfirst=True, errors="coerce", format="mixed")
+    iso = jours.dt.isocalendar()
+    etiquettes = iso['year'].astype(str) + "-S" + iso['week'].astype(str).str.zfill(2)
+    return etiquettes.where(jours.notna())
+
+
+def cle_periode(etiquette):
+    """Clé de tri naturel des périodes ("S2" avant "S10")."""
+    return [(0, int(morceau), "") if morceau.isdigit() else (1, 0, morceau)
+            for morceau in re.split(r"(\d+)", str(etiquette).lower()) if morceau]
+
+
+def detecter_delimiteur(lignes):
+    """
+    Choisit parmi DELIMITEURS celui qui découpe les lignes en un nombre de colonnes le plus
+    constant (part des lignes ayant le nombre de colonnes le plus fréquent, au moins 2).
+    À score égal, le découpage le plus large l'emporte, puis l'ordre de DELIMITEURS.
+    """
+    meilleur, meilleur_score = DELIMITEURS[0], (-1.0, 0)
+    lignes = [ligne for ligne in lignes if ligne.strip()]
+    for delimiteur in DELIMITEURS:
+        comptes = Counter(len(champs) for champs in csv.reader(lignes, delimiter=delimiteur))
+        if not comptes:
+            continue
+        nb_colonnes, frequence = comptes.most_common(1)[0]
+        if nb_colonnes < 2:
+            continue
+        score = (frequence / len(lignes), nb_colonnes)
+        if score > meilleur_score:
+            meilleur, meilleur_score = delimiteur, score
+    return meilleur
+
+
+def sonder_schema(fichier):
+    """
+    Lit une seule fois les TAILLE_SONDE premiers octets d'un plan et en déduit le schéma:
+    séparateur, colonnes Contact/Budget (et Periode, optionnelle) et format des nombres.
+
+    Le schéma est mémorisé par empreinte du fichier (SHA-1 de la tête + taille): un même
+    export rechargé n'est jamais ré-analysé.
+
+    Retourne un dict {'empreinte', 'delimiter', 'colonnes': {'Contact': nom, 'Budget': nom,
+    'Periode': nom}, 'format': {'decimal', 'thousands'}} (nom à None si la colonne est
+    introuvable).
+    """
+    tete = _lire_tete(fichier)
+    taille = _taille_fichier(fichier)
+    empreinte = hashlib.sha1(tete + str(taille).encode()).hexdigest()
+    schema = schema_en_cache(empreinte)
+    if schema is not None:
+        return schema
+
+    texte = tete.decode("utf-8-sig", errors="replace")
+    lignes = texte.splitlines()
+    if len(tete) == TAILLE_SONDE and len(lignes) > 1:
+        lignes = lignes[:-1]  # dernière ligne tronquée
+    delimiter = detecter_delimiteur(lignes)
+
+    echantillon = pd.read_csv(io.StringIO("\n".join(lignes)), delimiter=delimiter, dtype=str)
+    col_contact, col_budget = detecter_colonnes(echantillon.columns)
+    valeurs = [echantillon[col].dropna().to_numpy() for col in (col_contact, col_budget) if col is not None]
+    fmt = detecter_format(np.concatenate(valeurs) if valeurs else [])
+
+    schema = {
+        'empreinte': empreinte,
+        'delimiter': delimiter,
+        'colonnes': {
+            'Contact': col_contact,
+            'Budget': col_budget,
+            'Periode': detecter_colonne_periode(c for c in echantillon.columns if c not in (col_contact, col_budget)),
+        },
+        'format': fmt,
+    }
+    with _verrou_schemas:
+        _schemas[empreinte] = schema
+        while len(_schemas) > TAILLE_CACHE_SCHEMAS:
+            _schemas.popitem(last=False)
+    return schema
+
+
+def schema_en_cache(empreinte):
+    """Schéma déjà détecté pour cette empreinte de fichier, ou None."""
+    with _verrou_schemas:
+        if empreinte in _schemas:
+            _schemas.move_to_end(empreinte)
+            return _schemas[empreinte]
+    return None
+
+
+def lire_plan(fichier, schema=None, garder_lignes=False, progression=None, taille_bloc=TAILLE_BLOC):
+    """
+    Lit un plan média CSV en flux, par blocs, en ne chargeant que les colonnes Contact et Budget
+    (et la colonne de période si le schéma en a une).
+
+    Paramètres:
+      - fichier: chemin ou objet fichier binaire positionnable (ex: UploadedFile Streamlit)
+      - schema: résultat de sonder_schema (détecté si absent)
+      - garder_lignes: conserve le DataFrame ligne à ligne (Contact, Budget) pour la vue détaillée
+      - progression: callback optionnel appelé avec la fraction lue dans [0, 1]
+      - taille_bloc: nombre de lignes par bloc
+
+    Le format des nombres ("1 234,5", "1.234,5", "1,234.5", avec ou sans €) est celui du
+    schéma; il est confié au lecteur CSV (decimal/thousands): les blocs propres sont convertis
+    directement en float. Les blocs restés en texte passent par nombres.convertir; les lignes
+    illisibles sont ignorées dans les totaux et signalées. Avec une colonne de période, les
+    totaux sont aussi cumulés par période (etiquettes_periodes; lignes sans période ignorées).
+
+    Retourne un dict {'contacts', 'budget', 'nb_lignes', 'data', 'format', 'nb_rejets',
+    'lignes_rejetees', 'statistiques', 'periodes'} ('data' vaut None si garder_lignes est faux;
+    'lignes_rejetees' liste les numéros de ligne du fichier, en-tête = 1, limités à MAX_REJETS;
+    'statistiques' est le résultat de statistiques_lignes, quartiles estimés sur un échantillon
+    de chaque bloc si les lignes ne sont pas conservées; 'periodes': {période: [contacts,
+    budget]} en ordre naturel, None sans colonne de période).
+    Lève ValueError si les colonnes sont introuvables.
+    """
+    if schema is None:
+        schema = sonder_schema(fichier)
+    col_contact, col_budget = schema['colonnes']['Contact'], schema['colonnes']['Budget']
+    if col_contact is None or col_budget is None:
+        raise ValueError("Le fichier doit contenir les colonnes 'Contact' et 'Budget'")
+    col_periode = schema['colonnes'].get('Periode')
+    colonnes = [col_contact, col_budget] + ([col_periode] if col_periode is not None else [])
+    delimiter, fmt = schema['delimiter'], schema['format']
+
+    taille = _taille_fichier(fichier)
+
+    total_contacts, total_budget, nb_lignes = 0.0, 0.0, 0
+    nb_rejets, lignes_rejetees = 0, []
+    blocs, echantillons = [], []
+    minimums, maximums = np.full(2, np.inf), np.full(2, -np.inf)
+    periodes = {}
+    # Progression: position dans le fichier lu (un chemin est ouvert ici pour la suivre)
+    with _ouvrir_binaire(fichier) as source, pd.read_csv(
+        source,
+        delimiter=delimiter,
+        usecols=colonnes,
+        chunksize=taille_bloc,
+        dtype={col_periode: str} if col_periode is not None else None,
+        **options_lecteur(fmt, delimiter),
+    ) as lecteur:
+        for bloc in lecteur:
+            contacts, rejets_contacts = convertir(bloc[col_contact], **fmt)
+            budgets, rejets_budgets = convertir(bloc[col_budget], **fmt)
+            rejets = rejets_contacts | rejets_budgets
+            if rejets.any():
+                nb_rejets += int(rejets.sum())
+                place = MAX_REJETS - len(lignes_rejetees)
+                lignes_rejetees.extend((np.flatnonzero(rejets)[:place] + nb_lignes + 2).tolist())
+                contacts = np.where(rejets, np.nan, contacts)
+                budgets = np.where(rejets, np.nan, budgets)
+            total_contacts += float(np.nansum(contacts))
+            total_budget += float(np.nansum(budgets))
+            if col_periode is not None:
+                etiquettes = etiquettes_periodes(bloc[col_periode].to_numpy(), "date" in str(col_periode).lower())
+                sommes = pd.DataFrame({'Contact': contacts, 'Budget': budgets}).groupby(etiquettes.to_numpy()).sum()
+                for periode, (contact, budget) in zip(sommes.index, sommes.to_numpy()):
+                    cumul = periodes.setdefault(periode, [0.0, 0.0])
+                    cumul[0] += float(contact)
+                    cumul[1] += float(budget)
+            nb_lignes += len(bloc)
+            if garder_lignes:
+                blocs.append(pd.DataFrame({"Contact": contacts, "Budget": budgets}))
+            elif len(bloc):
+                pas = max(1, len(bloc) // ECHANTILLON_STATS)
+                echantillons.append(pd.DataFrame({"Contact": contacts[::pas], "Budget": budgets[::pas]}))
+                valeurs = np.column_stack([contacts, budgets])
+                minimums = np.minimum(minimums, np.nanmin(valeurs, axis=0, initial=np.inf))
+                maximums = np.maximum(maximums, np.nanmax(valeurs, axis=0, initial=-np.inf))
+            if progression is not None and taille and hasattr(source, "tell"):
+                progression(min(1.0, source.tell() / taille))
+
+    if progression is not None:
+        progression(1.0)
+
+    data = None
+    if garder_lignes:
+        data = pd.concat(blocs, ignore_index=True) if blocs else pd.DataFrame(columns=["Contact", "Budget"])
+        statistiques = statistiques_lignes(data)
+    else:
+        echantillon = pd.concat(echantillons, ignore_index=True) if echantillons else None
+        statistiques = statistiques_lignes(echantillon, nb_lignes=nb_lignes)
+        # min et max exacts (lus sur tous les blocs)
+        for colonne, minimum, maximum in zip(("Contact", "Budget"), minimums, maximums):
+            if statistiques[colonne] is not None:
+                statistiques[colonne].update({'min': float(minimum), 'max': float(maximum)})
+    return {
+        'contacts': total_contacts,
+        'budget': total_budget,
+        'nb_lignes': nb_lignes,
+        'data': data,
+        'format': fmt,
+        'nb_rejets': nb_rejets,
+        'lignes_rejetees': lignes_rejetees,
+        'statistiques': statistiques,
+        'periodes': {periode: periodes[periode] for periode in sorted(periodes, key=cle_periode)}
+        if col_periode is not None else None,
+    }
+
+
+def statistiques_lignes(data, nb_lignes=None):
+    """
+    Statistiques d'un plan pour la vue détaillée: nombre de lignes et, pour Contact et Budget,
+    min / quartiles / max (valeurs illisibles ignorées; None si aucune valeur).
+
+    data: DataFrame (Contact, Budget) des lignes, ou d'un échantillon si nb_lignes est donné
+    (les quantiles sont alors estimés: 'estimees' vaut True).
+    """
+    estimees = nb_lignes is not None and (0 if data is None else len(data)) < nb_lignes
+    statistiques = {'nb_lignes': len(data) if nb_lignes is None else nb_lignes, 'estimees': estimees}
+    for colonne in ("Contact", "Budget"):
+        valeurs = np.empty(0) if data is None else data[colonne].to_numpy(dtype=float)
+        valeurs = valeurs[~np.isnan(valeurs)]
+        statistiques[colonne] = None
+        if len(valeurs):
+            quantiles = np.quantile(valeurs, list(QUANTILES_STATS.values()))
+            statistiques[colonne] = dict(zip(QUANTILES_STATS, quantiles.tolist()))
+    return statistiques
+
+
+def _lire_tete(fichier):
+    """TAILLE_SONDE premiers octets d'un chemin ou d'un objet fichier binaire."""
+    if isinstance(fichier, (str, bytes)) or hasattr(fichier, "__fspath__"):
+        with open(fichier, "rb") as f:
+            return f.read(TAILLE_SONDE)
+    fichier.seek(0)
+    tete = fichier.read(TAILLE_SONDE)
+    fichier.seek(0)
+    return tete
+
+
+def _ouvrir_binaire(fichier):
+    """
+    Contexte donnant un objet fichier binaire au début: un chemin est ouvert (et refermé en
+    sortie), un objet fichier est repositionné au début (et laissé ouvert).
+    """
+    if isinstance(fichier, (str, bytes)) or hasattr(fichier, "__fspath__"):
+        return open(fichier, "rb")
+    if hasattr(fichier, "seek"):
+        fichier.seek(0)
+    return nullcontext(fichier)
+
+
+def _taille_fichier(fichier):
+    """Taille en octets d'un chemin ou d'un objet fichier (None si inconnue)."""
+    if isinstance(fichier, (str, bytes)) or hasattr(fichier, "__fspath__"):
+        return os.path.getsize(fichier)
+    taille = getattr(fichier, "size", None)
+    if taille is None and hasattr(fichier, "seek") and hasattr(fichier, "tell"):
+        position = fichier.tell()
+        fichier.seek(0, 2)
+        taille = fichier.tell()
+        fichier.seek(position)
+    return taille
+
+
+def deplier_fichiers(fichiers):
+    """
+    Liste les plans d'une sélection de fichiers CSV et d'archives ZIP.
+
+    Un CSV dont le nom contient "manifest" (ex: manifeste.csv), téléversé ou dans une archive,
+    n'est pas un plan: il associe chaque fichier à son support (voir lire_manifeste).
+
+    Retourne (sources, manifeste): sources est une liste de dicts {'nom', 'fichier', 'ouvrir'}
+    où ouvrir() est un gestionnaire de contexte renvoyant un objet lisible par lire_plan;
+    manifeste est un dict {nom de fichier: support}.
+    """
+    sources, manifeste = [], {}
+    for fichier in fichiers:
+        nom_fichier = os.path.basename(getattr(fichier, "name", str(fichier)))
+        if nom_fichier.lower().endswith(".zip"):
+            if hasattr(fichier, "getvalue"):
+                contenu = fichier.getvalue()
+            else:
+                with open(fichier, "rb") as f:
+                    contenu = f.read()
+            with zipfile.ZipFile(io.BytesIO(contenu)) as archive:
+                for membre in archive.infolist():
+                    nom_membre = os.path.basename(membre.filename)
+                    if membre.is_dir() or not nom_membre.lower().endswith(".csv") or nom_membre.startswith("."):
+                        continue
+                    if "manifest" in nom_membre.lower():
+                        with archive.open(membre) as f:
+                            manifeste.update(lire_manifeste(io.BytesIO(f.read())))
+                        continue
+                    sources.append({
+                        'nom': _nom_plan(nom_membre),
+                        'fichier': nom_membre,
+                        'ouvrir': _ouvreur_zip(contenu, membre.filename),
+                    })
+        elif "manifest" in nom_fichier.lower():
+            manifeste.update(lire_manifeste(fichier))
+        else:
+            sources.append({
+                'nom': _nom_plan(nom_fichier),
+                'fichier': nom_fichier,
+                'ouvrir': lambda fichier=fichier: nullcontext(fichier),
+            })
+    return sources, manifeste
+
+
+def lire_manifeste(fichier):
+    """
+    Lit un manifeste CSV associant fichiers et supports: une colonne dont le nom contient
+    "fichier"/"file" et une colonne "support". Retourne {nom de fichier: support}.
+    """
+    schema = sonder_schema(fichier)
+    if hasattr(fichier, "seek"):
+        fichier.seek(0)
+    df = pd.read_csv(fichier, delimiter=schema['delimiter'], dtype=str)
+    col_fichier = next((c for c in df.columns if "fichier" in c.lower() or "file" in c.lower()), None)
+    col_support = next((c for c in df.columns if "support" in c.lower()), None)
+    if col_fichier is None or col_support is None:
+        raise ValueError("Le manifeste doit contenir les colonnes 'Fichier' et 'Support'")
+    df = df.dropna(subset=[col_fichier, col_support])
+    return {os.path.basename(f.strip()): s.strip() for f, s in zip(df[col_fichier], df[col_support])}
+
+
+def associer_supports(fichiers, supports, manifeste=None):
+    """
+    Associe chaque nom de fichier à un support de référence: d'abord via le manifeste,
+    sinon si le nom du support apparaît dans le nom du fichier (mots entiers, casse et
+    ponctuation ignorées, le nom le plus long l'emporte). Support à None si aucun ne convient.
+    """
+    manifeste = manifeste or {}
+    supports = list(supports)
+    normalises = sorted(((_normaliser(s), s) for s in supports), key=lambda p: len(p[0]), reverse=True)
+    par_nom = {_normaliser(s): s for s in supports}
+    association = {}
+    for fichier in fichiers:
+        support = manifeste.get(fichier)
+        if support is not None:
+            association[fichier] = par_nom.get(_normaliser(support))
+            continue
+        nom = f" {_normaliser(_nom_plan(fichier))} "
+        association[fichier] = next((s for norm, s in normalises if f" {norm} " in nom), None)
+    return association
+
+
+def lire_plans(sources, garder_lignes=False, progression=None, max_workers=NB_LECTEURS, lecteur=lire_plan):
+    """
+    Lit plusieurs plans en parallèle (pool de threads: le lecteur CSV de pandas libère le GIL).
+
+    lecteur(fichier, garder_lignes=...) lit un fichier (par défaut lire_plan; voir aussi
+    stockage.lire_plan_memorise).
+    Retourne une liste alignée sur sources: le dict du lecteur, ou {'erreur': message}.
+    progression est appelé avec la fraction de fichiers terminés.
+    """
+    resultats = [None] * len(sources)
+    if not sources:
+        return resultats
+
+    def lire(source):
+        with source['ouvrir']() as fichier:
+            return lecteur(fichier, garder_lignes=garder_lignes)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executeur:
+        taches = {executeur.submit(lire, source): i for i, source in enumerate(sources)}
+        for termines, tache in enumerate(as_completed(taches), start=1):
+            try:
+                resultats[taches[tache]] = tache.result()
+            except Exception as e:
+                resultats[taches[tache]] = {'erreur': str(e)}
+            if progression is not None:
+                progression(termines / len(sources))
+    return resultats
+
+
+def _nom_plan(nom_fichier):
+    """Nom de plan par défaut: nom du fichier sans extension .csv"""
+    return re.sub(r"\.csv$", "", nom_fichier, flags=re.IGNORECASE)
+
+
+def _normaliser(texte):
+    """Minuscules, ponctuation et séparateurs remplacés par des espaces simples."""
+    return " ".join(re.sub(r"[^0-9a-z]+", " ", str(texte).lower()).split())
+
+
+def _ouvreur_zip(contenu, membre):
+    """
+    Gestionnaire de contexte qui extrait un membre d'archive dans un fichier temporaire
+    (lecture en flux sans tout garder en mémoire) et renvoie son chemin.
+    """
+    @contextmanager
+    def ouvrir():
+        with tempfile.NamedTemporaryFile(suffix=".csv", delete=False) as tmp:
+            with zipfile.ZipFile(io.BytesIO(contenu)) as archive, archive.open(membre) as f:
+                shutil.copyfileobj(f, tmp)
+        try:
+            yield tmp.name
+        finally:
+            os.remove(tmp.name)
+    return ouvrir
@@ -0,0 +1,441 @@
+import os
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from ingestion import associer_supports, cle_periode, deplier_fichiers, lire_plan, lire_plans
+from reference import FICHIER_REFERENCE, charger_reference
+from reponse import Reponse, ajuster_courbes, courbes_variables
+from stockage import lire_plan_memorise, ouvrir_stockage
+
+# Extensions reconnues dans un dossier de campagne
+EXTENSIONS_PLANS = ('.csv', '.zip')
+
+
+def creer_plan(nom, support, co2_factor, lecture):
+    """
+    Plan (dict) à partir du résultat de lecture d'un fichier: totaux (et par période), statistiques,
+    facteur CO2 et lignes éventuelles ('data', ou 'lignes_stockees' et 'empreinte' si elles sont dans un Stockage)
+    """
+    return {
+        'nom': nom,
+        'support': support,
+        'data': lecture['data'],
+        'contacts': lecture['contacts'],
+        'budget': lecture['budget'],
+        'nb_lignes': lecture['nb_lignes'],
+        'nb_rejets': lecture['nb_rejets'],
+        'lignes_rejetees': lecture['lignes_rejetees'],
+        'statistiques': lecture.get('statistiques'),
+        'periodes': lecture.get('periodes'),
+        'co2_factor': co2_factor,
+        'co2_total': lecture['contacts'] * co2_factor,
+        'empreinte': lecture.get('empreinte'),
+        'lignes_stockees': lecture.get('lignes_stockees', False),
+    }
+
+
+def lignes_disponibles(plan):
+    """Vrai si le détail ligne à ligne du plan est en mémoire ou dans le stockage"""
+    return plan['data'] is not None or plan.get('lignes_stockees', False)
+
+
+def tableau_plans(plans):
+    """Une ligne par plan: Plan, Support, Contacts, Budget, CO2_factor, CO2_total"""
+    return pd.DataFrame({
+        'Plan': [plan['nom'] for plan in plans],
+        'Support': [plan['support'] for plan in plans],
+        'Contacts': np.array([plan['contacts'] for plan in plans], dtype=float),
+        'Budget': np.array([plan['budget'] for plan in plans], dtype=float),
+        'CO2_factor': np.array([plan['co2_factor'] for plan in plans], dtype=float),
+        'CO2_total': np.array([plan['co2_total'] for plan in plans], dtype=float),
+    })
+
+
+def resume_supports(df_plans):
+    """
+    Agrège les plans par support (ordre de première apparition):
+    Nombre de Plans, Contacts, Budget, CO2_factor, CO2_total et Part_CO2 (% du CO2 total).
+    """
+    resume = df_plans.groupby('Support', sort=False).agg(
+        **{
+            'Nombre de Plans': ('Plan', 'size'),
+            'Contacts': ('Contacts', 'sum'),
+            'Budget': ('Budget', 'sum'),
+            'CO2_factor': ('CO2_factor', 'first'),
+            'CO2_total': ('CO2_total', 'sum'),
+        }
+    ).reset_index()
+    return _part_co2(resume)
+
+
+def _part_co2(resume):
+    total_co2 = resume['CO2_total'].sum()
+    resume['Part_CO2'] = resume['CO2_total'] / total_co2 * 100 if total_co2 else 0.0
+    return resume
+
+
+def maj_resumes(df_plans, df_supports, ajoutes=(), retires=()):
+    """
+    Mise à jour incrémentale de (tableau_plans, resume_supports) après l'ajout de plans (dicts de
+    creer_plan, ajoutés en fin de liste) et/ou le retrait de plans (positions dans df_plans):
+    les totaux des supports concernés sont corrigés des totaux de ces plans, sans regrouper de
+    nouveau tous les plans. Un nouveau support est ajouté en fin de résumé, un support sans plus
+    aucun plan est retiré.
+
+    Retourne (df_plans, df_supports) mis à jour.
+    """
+    retires = list(retires)
+    df_ajoutes = tableau_plans(list(ajoutes))
+    mouvements = pd.concat(
+        [df_plans.iloc[retires].assign(Signe=-1.0), df_ajoutes.assign(Signe=1.0)], ignore_index=True,
+    )
+    resume = df_supports.drop(columns='Part_CO2')
+    connus = set(resume['Support'])
+    nouveaux = df_ajoutes.drop_duplicates('Support')
+    nouveaux = nouveaux[~nouveaux['Support'].isin(connus)]
+    if len(nouveaux):
+        resume = pd.concat([resume, pd.DataFrame({
+            'Support': nouveaux['Support'].to_numpy(),
+            'Nombre de Plans': 0,
+            'Contacts': 0.0,
+            'Budget': 0.0,
+            'CO2_factor': nouveaux['CO2_factor'].to_numpy(),
+            'CO2_total': 0.0,
+        })], ignore_index=True)
+
+    # Sommes signées par support (une passe sur les plans ajoutés / retirés)
+    position = pd.Index(resume['Support']).get_indexer(mouvements['Support'])
+    signe = mouvements['Signe'].to_numpy()
+    resume['Nombre de Plans'] += np.bincount(position, weights=signe, minlength=len(resume)).round().astype(int)
+    for colonne in ('Contacts', 'Budget', 'CO2_total'):
+        resume[colonne] += np.bincount(position, weights=signe * mouvements[colonne].to_numpy(), minlength=len(resume))
+    resume = resume[resume['Nombre de Plans'] > 0].reset_index(drop=True)
+
+    df_plans = pd.concat([df_plans.drop(index=df_plans.index[retires]), df_ajoutes], ignore_index=True)
+    return df_plans, _part_co2(resume)
+
+
+def cles_variables(df_variables):
+    """
+    Clés des variables de l'optimiseur, stables quand des plans sont ajoutés ou retirés:
+    Support, ou (Plan, rang de la ligne dans le plan) en granularité "ligne".
+    """
+    if 'Plan' in df_variables.columns:
+        rang = df_variables.groupby('Plan', sort=False).cumcount()
+        return pd.MultiIndex.from_arrays(
+            [df_variables['Plan'].to_numpy(), rang.to_numpy()], names=['Plan', 'Ligne'],
+        )
+    return pd.Index(df_variables['Support'], name='Support')
+
+
+def depart_a_chaud(df_variables, allocation):
+    """
+    Allocation précédente (Series indexée par cles_variables) réalignée sur df_variables, pour le
+    paramètre x_depart de optimizer.optimisation_media: NaN pour une variable nouvelle, variables
+    disparues ignorées. None sans allocation précédente.
+    """
+    if allocation is None:
+        return None
+    allocation = allocation[~allocation.index.duplicated()]
+    return allocation.reindex(cles_variables(df_variables)).to_numpy(dtype=float)
+
+
+def donnees_optimisation(df_supports, table):
+    """
+    Entrée de l'optimiseur à partir du résumé par support.
+    Alpha est un multiplicateur (pas une puissance) : Contacts_utiles = Contacts × (Alpha/100)
+
+    Retourne (df_optim, supports_sans_alpha): df_optim vaut None si un support n'a pas d'Alpha.
+    """
+    alpha = np.array([table.alpha(support) for support in df_supports['Support']], dtype=float)
+    sans_alpha = df_supports['Support'][np.isnan(alpha)].tolist()
+    if sans_alpha:
+        return None, sans_alpha
+
+    budget = df_supports['Budget'].to_numpy(dtype=float)
+    contacts = df_supports['Contacts'].to_numpy(dtype=float)
+    co2_factor = df_supports['CO2_factor'].to_numpy(dtype=float)
+    contacts_utiles = contacts * (alpha / 100)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        contacts_utiles_per_euro = np.where(budget > 0, contacts_utiles / budget, 0.0)
+        carbone_per_euro = np.where(budget > 0, contacts / budget * co2_factor, 0.0)
+
+    df_optim = pd.DataFrame({
+        'Support': df_supports['Support'].to_numpy(),
+        'Budget': budget,
+        'Contacts': contacts,
+        'Alpha': alpha,
+        'Contacts_utiles': contacts_utiles,
+        'Contacts_utiles_per_euro': contacts_utiles_per_euro,
+        'Carbone_per_euro': carbone_per_euro,
+        'CO2_factor': co2_factor,
+    })
+    return df_optim, []
+
+
+def donnees_optimisation_lignes(plans, table, stockage=None):
+    """
+    Entrée de l'optimiseur en granularité "ligne": une variable par ligne de plan (Contact,
+    Budget), avec les facteurs CO2 / Alpha du support du plan. Les plans doivent avoir été
+    lus avec garder_lignes=True (lignes en mémoire, ou chargées depuis le stockage).
+
+    Retourne (df_optim, supports_sans_alpha) comme donnees_optimisation, avec une colonne Plan.
+    """
+    plans = _charger_lignes(plans, stockage)
+    sans_lignes = [plan['nom'] for plan in plans if plan['data'] is None]
+    if sans_lignes:
+        raise ValueError(f"Détail ligne à ligne non conservé pour: {', '.join(sans_lignes)}")
+
+    tailles = [len(plan['data']) for plan in plans]
+    df_lignes = pd.DataFrame({
+        'Plan': np.repeat([plan['nom'] for plan in plans], tailles),
+        'Support': np.repeat([plan['support'] for plan in plans], tailles),
+        # Lignes rejetées (NaN): budget figé à 0
+        'Contacts': np.nan_to_num(np.concatenate([plan['data']['Contact'].to_numpy(dtype=float) for plan in plans])),
+        'Budget': np.nan_to_num(np.concatenate([plan['data']['Budget'].to_numpy(dtype=float) for plan in plans])),
+        'CO2_factor': np.repeat([plan['co2_factor'] for plan in plans], tailles).astype(float),
+    })
+    df_optim, sans_alpha = donnees_optimisation(df_lignes, table)
+    if df_optim is not None:
+        df_optim.insert(0, 'Plan', df_lignes['Plan'].to_numpy())
+    return df_optim, list(dict.fromkeys(sans_alpha))
+
+
+def donnees_optimisation_periodes(plans, table):
+    """
+    Entrée de l'optimiseur par période (optimizer.optimisation_periodes): une variable par
+    (support, période), totaux par période des plans d'un même support additionnés. Lignes
+    par période (ordre naturel), puis par support (ordre de première apparition).
+
+    Retourne (df_optim, supports_sans_alpha) comme donnees_optimisation, avec une colonne Periode.
+    Lève ValueError si un plan n'a pas de colonne de période.
+    """
+    sans_periode = [plan['nom'] for plan in plans if not plan.get('periodes')]
+    if sans_periode:
+        raise ValueError(f"Colonne de période (semaine, date...) introuvable pour: {', '.join(sans_periode)}")
+
+    df_periodes = pd.DataFrame(
+        [
+            (plan['support'], periode, contacts, budget, plan['co2_factor'])
+            for plan in plans for periode, (contacts, budget) in plan['periodes'].items()
+        ],
+        columns=['Support', 'Periode', 'Contacts', 'Budget', 'CO2_factor'],
+    )
+    df_periodes = df_periodes.groupby(['Support', 'Periode'], sort=False).agg(
+        Contacts=('Contacts', 'sum'), Budget=('Budget', 'sum'), CO2_factor=('CO2_factor', 'first'),
+    ).reset_index()
+    ordre = {periode: rang for rang, periode in enumerate(sorted(df_periodes['Periode'].unique(), key=cle_periode))}
+    df_periodes = df_periodes.sort_values('Periode', key=lambda p: p.map(ordre), kind="stable", ignore_index=True)
+    df_optim, sans_alpha = donnees_optimisation(df_periodes, table)
+    if df_optim is not None:
+        df_optim.insert(1, 'Periode', df_periodes['Periode'].to_numpy())
+    return df_optim, sans_alpha
+
+
+def tableau_periodes(df_variables, allocation):
+    """
+    Une ligne par période (ordre de df_variables): Budget, Budget_Optimise, Carbone_g,
+    Carbone_Optimise_g, Contacts_utiles, Contacts_utiles_Optimise, pour l'allocation optimale
+    (une valeur par ligne de df_variables, de donnees_optimisation_periodes).
+    """
+    allocation = np.asarray(allocation, dtype=float)
+    budget = df_variables['Budget'].to_numpy(dtype=float)
+    carbone = df_variables['Carbone_per_euro'].to_numpy(dtype=float)
+    utiles = df_variables['Contacts_utiles_per_euro'].to_numpy(dtype=float)
+    return pd.DataFrame({
+        'Periode': df_variables['Periode'].to_numpy(),
+        'Budget': budget,
+        'Budget_Optimise': allocation,
+        'Carbone_g': carbone * budget,
+        'Carbone_Optimise_g': carbone * allocation,
+        'Contacts_utiles': utiles * budget,
+        'Contacts_utiles_Optimise': utiles * allocation,
+    }).groupby('Periode', sort=False).sum().reset_index()
+
+
+def _charger_lignes(plans, stockage=None):
+    """Plans avec leurs lignes chargées depuis le stockage quand elles ne sont pas en mémoire."""
+    if stockage is None:
+        return plans
+    return [
+        dict(plan, data=stockage.lignes(plan['empreinte'])) if plan['data'] is None and plan.get('empreinte') else plan
+        for plan in plans
+    ]
+
+
+def courbes_reponse(plans, modele="auto", stockage=None):
+    """
+    Courbes de réponse par support (reponse.ajuster_courbes), ajustées sur les lignes des plans
+    (en mémoire, ou chargées depuis le stockage). Les plans sans détail ligne à ligne sont
+    ignorés: un support sans lignes n'a pas de courbe (il reste linéaire).
+    """
+    plans = [plan for plan in _charger_lignes(plans, stockage) if plan['data'] is not None]
+    tailles = [len(plan['data']) for plan in plans]
+    df_lignes = pd.DataFrame({
+        'Support': np.repeat([plan['support'] for plan in plans], tailles),
+        'Budget': np.concatenate([plan['data']['Budget'].to_numpy(dtype=float) for plan in plans] or [[]]),
+        'Contacts': np.concatenate([plan['data']['Contact'].to_numpy(dtype=float) for plan in plans] or [[]]),
+    })
+    return ajuster_courbes(df_lignes, modele)
+
+
+def tableau_grille(tranches):
+    """
+    Une ligne par scénario d'une grille (tranches de optimizer.grille_scenarios, dans l'ordre
+    reçu): w_carbone, Max_variation, Min_budget, Contacts_utiles, Carbone_g, Succes et Erreur.
+    """
+    colonnes = ['w_carbone', 'Max_variation', 'Min_budget', 'Contacts_utiles', 'Carbone_g', 'Succes', 'Erreur']
+    if not tranches:
+        return pd.DataFrame(columns=colonnes)
+    return pd.concat(
+        [
+            pd.DataFrame({
+                'w_carbone': tranche.w_carbone,
+                'Max_variation': tranche.max_variation,
+                'Min_budget': tranche.min_budget_par_canal,
+                'Contacts_utiles': tranche.contacts_utiles,
+                'Carbone_g': tranche.carbone_g,
+                'Succes': tranche.success,
+                'Erreur': tranche.erreur,
+            })
+            for tranche in tranches
+        ],
+        ignore_index=True,
+    )[colonnes]
+
+
+def fichiers_campagne(chemin):
+    """Fichiers de plans d'une campagne: un dossier (CSV/ZIP, récursif), une archive ZIP ou un CSV."""
+    if os.path.isdir(chemin):
+        fichiers = []
+        for racine, _, noms in os.walk(chemin):
+            fichiers.extend(
+                os.path.join(racine, nom) for nom in noms
+                if nom.lower().endswith(EXTENSIONS_PLANS) and not nom.startswith('.')
+            )
+        return sorted(fichiers)
+    return [chemin]
+
+
+def lire_campagne(chemin, table, garder_lignes=False, max_workers=1, stockage=None):
+    """
+    Lit tous les plans d'une campagne. Le support de chaque fichier vient du manifeste
+    (manifeste.csv) ou de son nom (voir ingestion.associer_supports). Avec un stockage, les
+    fichiers déjà lus ne sont pas relus (et leurs lignes restent dans le stockage).
+
+    Retourne (plans, erreurs): liste de plans (dicts) et liste de messages par fichier ignoré.
+    """
+    sources, manifeste = deplier_fichiers(fichiers_campagne(chemin))
+    association = associer_supports([source['fichier'] for source in sources], table.supports, manifeste)
+    erreurs = [f"{source['fichier']} : support introuvable" for source in sources if association[source['fichier']] is None]
+    sources = [source for source in sources if association[source['fichier']] is not None]
+
+    plans = []
+    lecteur = lire_plan if stockage is None else partial(lire_plan_memorise, stockage=stockage)
+    lectures = lire_plans(sources, garder_lignes=garder_lignes, max_workers=max_workers, lecteur=lecteur)
+    for source, lecture in zip(sources, lectures):
+        if 'erreur' in lecture:
+            erreurs.append(f"{source['fichier']} : {lecture['erreur']}")
+            continue
+        support = association[source['fichier']]
+        plans.append(creer_plan(source['nom'], support, table.co2(support), lecture))
+    return plans, erreurs
+
+
+def traiter_campagne(
+    chemin,
+    chemin_reference=FICHIER_REFERENCE,
+    optimiser=False,
+    pareto=False,
+    w_carbone=0.5,
+    min_budget_par_canal=1000,
+    max_variation=0.5,
+    granularite="support",
+    chemin_stockage=None,
+    reponse="lineaire",
+):
+    """
+    Calcul complet d'une campagne, sans interface: résumés par plan et par support, puis
+    optionnellement optimisation (poids w_carbone) et front de Pareto exact.
+    En granularité "ligne", l'optimisation porte sur chaque ligne des plans (le front de
+    Pareto reste calculé par support).
+    Hors reponse="lineaire", l'optimisation utilise des courbes de réponse (rendements
+    décroissants, modèle de reponse.MODELES ou "auto") ajustées sur les lignes des plans.
+    Avec chemin_stockage (base SQLite, voir stockage.Stockage), les fichiers déjà lus et les
+    résultats déjà calculés sont réutilisés d'une exécution à l'autre; chaque processus ouvre
+    sa propre connexion.
+    Fonction de niveau module: utilisable dans un ProcessPoolExecutor.
+
+    Retourne un dict de DataFrames {'plans', 'supports', 'optimisation', 'pareto'} (None si non
+    demandé ou impossible) et 'erreurs' (liste de messages).
+    """
+    from optimizer import CacheResultats, optimisation_media, pareto_exact
+
+    campagne = os.path.splitext(os.path.basename(os.path.normpath(chemin)))[0]
+    table = charger_reference(chemin_reference)
+    stockage = ouvrir_stockage(chemin_stockage) if chemin_stockage else None
+    cache = CacheResultats(stockage=stockage) if stockage is not None else None
+    plans, erreurs = lire_campagne(
+        chemin, table, garder_lignes=optimiser and (granularite == "ligne" or reponse != "lineaire"),
+        stockage=stockage,
+    )
+    resultat = {'campagne': campagne, 'plans': None, 'supports': None, 'optimisation': None, 'pareto': None}
+    if not plans:
+        resultat['erreurs'] = erreurs + [f"{campagne} : aucun plan lisible"]
+        if stockage is not None:
+            stockage.fermer()
+        return resultat
+
+    df_plans = tableau_plans(plans)
+    df_supports = resume_supports(df_plans)
+    resultat['plans'] = df_plans
+    resultat['supports'] = df_supports
+
+    if optimiser or pareto:
+        df_optim, sans_alpha = donnees_optimisation(df_supports, table)
+        if df_optim is None:
+            erreurs.append(f"{campagne} : pas d'Alpha pour {', '.join(sans_alpha)}, optimisation impossible")
+        else:
+            params = dict(min_budget_par_canal=min_budget_par_canal, max_variation=max_variation)
+            try:
+                if optimiser:
+                    df_variables = df_optim
+                    if granularite == "ligne":
+                        df_variables, _ = donnees_optimisation_lignes(plans, table, stockage)
+                    courbes = None
+                    if reponse != "lineaire":
+                        courbes = courbes_variables(df_variables, courbes_reponse(plans, reponse, stockage))
+                    res = optimisation_media(
+                        df_variables, w_carbone=w_carbone, granularite=granularite, cache=cache,
+                        courbes=courbes, **params
+                    )
+                    df_resultat = df_variables[[c for c in ('Plan', 'Support', 'Budget') if c in df_variables]].copy()
+                    df_resultat['Budget_Optimise'] = res.x
+                    df_resultat['Contacts_utiles_avant'] = df_variables['Contacts_utiles']
+                    df_resultat['Contacts_utiles_apres'] = res.x * df_variables['Contacts_utiles_per_euro']
+                    if courbes is not None:
+                        df_resultat['Contacts_utiles_apres'] = Reponse(
+                            courbes, df_variables['Budget'], df_variables['Contacts_utiles_per_euro'] * df_variables['Budget']
+                        ).valeurs(res.x)
+                    df_resultat['Carbone_g_avant'] = df_variables['Budget'] * df_variables['Carbone_per_euro']
+                    df_resultat['Carbone_g_apres'] = res.x * df_variables['Carbone_per_euro']
+                    df_resultat['Succes'] = bool(res.success)
+                    df_resultat['Solveur'] = res.telemetrie['solveur']
+                    df_resultat['Temps_ms'] = res.telemetrie['temps']['total'] * 1000
+                    resultat['optimisation'] = df_resultat
+                if pareto:
+                    front = pareto_exact(df_optim, cache=cache, **params)
+                    resultat['pareto'] = pd.DataFrame({
+                        'w_carbone': front.w_carbone,
+                        'Contacts_utiles': front.contacts_utiles,
+                        'Carbone_g': front.carbone_g,
+                    })
+            except ValueError as e:
+                erreurs.append(f"{campagne} : {e}")
+
+    if stockage is not None:
+        stockage.fermer()
+    resultat['erreurs'] = erreurs
+    return resultat
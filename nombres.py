@@ -0,0 +1,105 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# Caractères parasites dans les nombres exportés: espaces (dont insécables), symboles monétaires
+_ESPACES = " \u00a0\u202f"
+_PARASITES = "\\s\u00a0\u202f€$£"
+_RE_PARASITES = re.compile(f"[{_PARASITES}]+")
+_RE_ESPACE_MILLIERS = re.compile(f"\\d([{_ESPACES}])\\d{{3}}")
+
+# Expressions de nettoyage compilées, par séparateur de milliers
+_REGEX_NETTOYAGE = {}
+
+# Nombre max d'indices de lignes rejetées conservés (le compte reste exact)
+MAX_REJETS = 1000
+
+
+def detecter_format(valeurs):
+    """
+    Déduit les séparateurs décimal et de milliers d'un échantillon de valeurs texte.
+
+    Règles, valeur par valeur (parasites retirés):
+      - "." et "," présents: le dernier est le décimal, l'autre le séparateur de milliers
+      - un seul séparateur, répété: séparateur de milliers
+      - un seul séparateur, unique, suivi de 1, 2 ou 4+ chiffres: séparateur décimal
+    Les espaces entre chiffres (normaux ou insécables) comptent comme séparateur de milliers.
+    En l'absence d'indice, le format "1234.5" est retenu.
+
+    Retourne un dict {'decimal': str, 'thousands': str ou None}.
+    """
+    votes_decimal = {".": 0, ",": 0}
+    votes_milliers = {}
+    for valeur in valeurs:
+        if not isinstance(valeur, str):
+            continue
+        valeur = valeur.strip()
+        espace = _RE_ESPACE_MILLIERS.search(valeur)
+        if espace:
+            votes_milliers[espace.group(1)] = votes_milliers.get(espace.group(1), 0) + 1
+        nombre = _RE_PARASITES.sub("", valeur)
+        points, virgules = nombre.count("."), nombre.count(",")
+        if points and virgules:
+            decimal = "." if nombre.rfind(".") > nombre.rfind(",") else ","
+            votes_decimal[decimal] += 1
+            autre = "," if decimal == "." else "."
+            votes_milliers[autre] = votes_milliers.get(autre, 0) + 1
+        elif points + virgules > 1:
+            sep = "." if points else ","
+            votes_milliers[sep] = votes_milliers.get(sep, 0) + 1
+        elif points + virgules == 1:
+            sep = "." if points else ","
+            if len(nombre) - nombre.find(sep) - 1 != 3:
+                votes_decimal[sep] += 1
+
+    decimal = "," if votes_decimal[","] > votes_decimal["."] else "."
+    votes_milliers.pop(decimal, None)
+    thousands = max(votes_milliers, key=votes_milliers.get) if votes_milliers else None
+    return {'decimal': decimal, 'thousands': thousands}
+
+
+def convertir(serie, decimal=".", thousands=None):
+    """
+    Convertit une colonne en float64.
+
+    Une colonne déjà numérique est renvoyée telle quelle. Sinon un seul passage d'expression
+    régulière retire les parasites (espaces, insécables, €...) et le séparateur de milliers,
+    puis le séparateur décimal est ramené à ".".
+    Les cellules vides deviennent NaN; les cellules non vides illisibles aussi, et sont rejetées.
+
+    Retourne (valeurs: np.ndarray float64, rejets: np.ndarray bool du même index).
+    """
+    if pd.api.types.is_numeric_dtype(serie.dtype):
+        return serie.to_numpy(dtype=float, na_value=np.nan), np.zeros(len(serie), dtype=bool)
+
+    texte = serie.astype("string")
+    texte = texte.str.replace(_regex_nettoyage(thousands), "", regex=True)
+    if decimal != ".":
+        texte = texte.str.replace(decimal, ".", regex=False)
+    valeurs = pd.to_numeric(texte, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    vides = texte.isna().to_numpy() | (texte == "").fillna(True).to_numpy()
+    rejets = np.isnan(valeurs) & ~vides
+    return valeurs, rejets
+
+
+def _regex_nettoyage(thousands):
+    """Expression compilée retirant parasites et séparateur de milliers (mémorisée)."""
+    if thousands not in _REGEX_NETTOYAGE:
+        motif = _PARASITES + (re.escape(thousands) if thousands and thousands not in _ESPACES else "")
+        _REGEX_NETTOYAGE[thousands] = re.compile(f"[{motif}]+")
+    return _REGEX_NETTOYAGE[thousands]
+
+
+def options_lecteur(fmt, delimiter):
+    """
+    Options decimal/thousands à passer à pd.read_csv pour que le lecteur C convertisse
+    directement les nombres (sans colonnes texte intermédiaires).
+    """
+    options = {}
+    if fmt['decimal'] != "." and fmt['decimal'] != delimiter:
+        options['decimal'] = fmt['decimal']
+    thousands = fmt['thousands']
+    if thousands is not None and thousands != delimiter and thousands != options.get('decimal', "."):
+        options['thousands'] = thousands
+    return options
@@ -1,27 +1,162 @@
 import numpy as np
-from scipy.optimize import minimize, LinearConstraint
+import pandas as pd
+from scipy import sparse
+from scipy.optimize import linprog, minimize, Bounds, LinearConstraint, OptimizeResult
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import copy
+import hashlib
+import os
+import threading
+import time
 import warnings
 
-def optimisation_media(
-    df,
-    w_carbone=0.5,
-    min_budget_par_canal=1000,
-    max_variation=0.5,
-    lambda_reg=1e-7,
-):
+from incertitude import tirer_facteurs
+from reponse import Reponse
+
+METHODES = ("auto", "waterfill", "trust-constr", "SLSQP")
+
+# Granularité des variables: un budget par support, ou par ligne de plan (lignes du CSV)
+GRANULARITES = ("support", "ligne")
+
+# Au-delà, SLSQP (matrices denses n x n) n'est plus utilisé, même en repli
+MAX_VARIABLES_SLSQP = 500
+
+# Au-delà, trust-constr reçoit Hessienne et contrainte creuses (en dessous, le dense est plus rapide)
+SEUIL_CREUX = 50
+
+# Nombre max d'éléments (poids x supports) traités d'un bloc par pareto_front
+TAILLE_BLOC = 2_000_000
+
+# Colonnes de df qui déterminent le problème (empreinte du cache)
+COLONNES_PROBLEME = ('Contacts_utiles_per_euro', 'Carbone_per_euro', 'Budget')
+
+# Itérations max du water-filling démarré à chaud (au-delà: résolution par tri)
+MAX_ITERATIONS_A_CHAUD = 50
+
+# Itérations max du solveur à courbes de réponse (Newton sur le multiplicateur, et par variable)
+MAX_ITERATIONS_REPONSE = 100
+
+# Itérations max du solveur à plafonds par période (points intérieurs)
+MAX_ITERATIONS_PERIODES = 100
+
+# Itérations max du mode plafond de carbone (Newton sur le multiplicateur du plafond)
+MAX_ITERATIONS_PLAFOND = 100
+
+# Critères de l'optimisation robuste, et tirages du programme linéaire de la CVaR (une
+# contrainte et une variable par tirage)
+CRITERES_ROBUSTES = ("cvar", "pire_cas")
+NB_SCENARIOS_ROBUSTE = 2_000
+
+# Intervalle (s) entre deux vérifications de l'annulation d'une grille de scénarios
+ATTENTE_ANNULATION = 0.1
+
+
+class CacheResultats:
     """
-    Paramètres:
-      - df: contient les colonnes 'Contacts_utiles_per_euro', 'Carbone_per_euro', 'Budget'
-      - w_carbone: poids du carbone dans [0,1]
-      - min_budget_par_canal: budget minimum par canal
-      - max_variation: variation max autorisée autour du budget initial pour chaque canal (ex: 0.5 => ±50%)
-      - lambda_reg: intensité L2; plus grand => allocations plus proches de x_center
+    Cache LRU borné des résultats d'optimisation, clé = empreinte du problème
+    (tableaux efficacité / carbone / budget + paramètres). Thread-safe, pour être
+    partagé entre sessions (ex: via st.cache_resource).
+
+    Avec un stockage (ex: stockage.Stockage, méthodes resultat / enregistrer_resultat), les
+    résultats sont aussi conservés sur disque et retrouvés d'un redémarrage à l'autre.
+    """
+
+    def __init__(self, taille_max=256, stockage=None):
+        self.taille_max = taille_max
+        self.stockage = stockage
+        self.hits = 0
+        self.hits_stockage = 0
+        self.misses = 0
+        self._resultats = OrderedDict()
+        self._verrou = threading.Lock()
+
+    @staticmethod
+    def cle(nom, df, **params):
+        """Empreinte SHA-1 du problème: nom de la fonction, colonnes du df et paramètres."""
+        h = hashlib.sha1(nom.encode())
+        for col in COLONNES_PROBLEME:
+            h.update(np.ascontiguousarray(df[col].values, dtype=float).tobytes())
+        for nom_param, valeur in sorted(params.items()):
+            h.update(nom_param.encode())
+            if isinstance(valeur, pd.DataFrame):
+                for colonne in valeur.columns:
+                    h.update(str(colonne).encode())
+                    h.update(pd.util.hash_pandas_object(valeur[colonne], index=False).to_numpy().tobytes())
+            elif isinstance(valeur, (np.ndarray, list, tuple)):
+                h.update(np.ascontiguousarray(valeur, dtype=float).tobytes())
+            else:
+                h.update(repr(valeur).encode())
+        return h.hexdigest()
+
+    def obtenir(self, cle, calcul):
+        """Renvoie une copie du résultat en cache (mémoire puis stockage), ou l'appel calcul() mémorisé."""
+        with self._verrou:
+            if cle in self._resultats:
+                self._resultats.move_to_end(cle)
+                self.hits += 1
+                return self._copie_en_cache(self._resultats[cle])
+        resultat = self.stockage.resultat(cle) if self.stockage is not None else None
+        if resultat is not None:
+            with self._verrou:
+                self.hits_stockage += 1
+                self._memoriser(cle, resultat)
+            return self._copie_en_cache(resultat)
+        with self._verrou:
+            self.misses += 1
+        # Calcul hors verrou: deux sessions peuvent calculer la même clé, le dernier écrit gagne
+        resultat = calcul()
+        with self._verrou:
+            self._memoriser(cle, resultat)
+        if self.stockage is not None:
+            self.stockage.enregistrer_resultat(cle, resultat)
+        return copy.deepcopy(resultat)
+
+    def _memoriser(self, cle, resultat):
+        self._resultats[cle] = resultat
+        self._resultats.move_to_end(cle)
+        while len(self._resultats) > self.taille_max:
+            self._resultats.popitem(last=False)
+
+    @staticmethod
+    def _copie_en_cache(resultat):
+        copie = copy.deepcopy(resultat)
+        if 'telemetrie' in copie:
+            copie['telemetrie']['cache'] = True
+        return copie
+
+    def stats(self):
+        with self._verrou:
+            return {
+                'hits': self.hits,
+                'hits_stockage': self.hits_stockage,
+                'misses': self.misses,
+                'taille': len(self._resultats),
+                'taille_max': self.taille_max,
+            }
+
+    def vider(self):
+        with self._verrou:
+            self._resultats.clear()
+            self.hits = 0
+            self.hits_stockage = 0
+            self.misses = 0
+        if self.stockage is not None:
+            self.stockage.vider_resultats()
+
+
+def _preparer(df, min_budget_par_canal, max_variation, granularite="support"):
+    """
+    Précalculs communs à toutes les résolutions sur un même df (indépendants de w_carbone):
+    coefficients par euro, écarts types de normalisation, bornes et point de départ.
+    En granularité "ligne", le plancher min_budget_par_canal ne s'applique pas (bornes >= 0).
     """
+    if granularite not in GRANULARITES:
+        raise ValueError(f"Granularité inconnue: {granularite!r} (attendu: {', '.join(GRANULARITES)})")
     efficacite = df['Contacts_utiles_per_euro'].values.astype(float)
     carbone = df['Carbone_per_euro'].values.astype(float)
     budgets_initiaux = df['Budget'].values.astype(float)
     budget_total = float(budgets_initiaux.sum())
-    n = len(df)
 
     # Normalisation: utiliser les écarts types des coefficients "par euro" (sans * budget_total)
     eps = 1e-12
@@ -34,18 +169,10 @@ def optimisation_media(
         warnings.warn("std_carbone == 0: normalisation du carbone désactivée (eps utilisé).")
         std_carbone = eps
 
-    # Vecteur coût (linéaire)
-    # Minimiser c^T x favorise efficacité (terme négatif) et pénalise carbone (terme positif)
-    c = w_carbone * (carbone / std_carbone) - (1.0 - w_carbone) * (efficacite / std_contacts)
-
     # Bornes individuelles [min_i, max_i] avec variation max autour de l'initial + plancher commun
-    lower_bounds = np.empty(n)
-    upper_bounds = np.empty(n)
-    for i in range(n):
-        lb = max(min_budget_par_canal, budgets_initiaux[i] * (1 - max_variation))
-        ub = budgets_initiaux[i] * (1 + max_variation)
-        lower_bounds[i] = float(lb)
-        upper_bounds[i] = float(ub)
+    plancher = min_budget_par_canal if granularite == "support" else 0.0
+    lower_bounds = np.maximum(plancher, budgets_initiaux * (1 - max_variation))
+    upper_bounds = budgets_initiaux * (1 + max_variation)
 
     # Vérifier faisabilité simple
     sum_low = float(lower_bounds.sum())
@@ -62,35 +189,252 @@ def optimisation_media(
     # Point de départ et centre de régularisation x_center (rend la régularisation pertinente et faisable)
     x0 = np.clip(budgets_initiaux, lower_bounds, upper_bounds)
 
-    x_center = x0.copy()  # centre de régularisation
+    return {
+        'efficacite': efficacite,
+        'carbone': carbone,
+        'budgets_initiaux': budgets_initiaux,
+        'budget_total': budget_total,
+        'std_contacts': std_contacts,
+        'std_carbone': std_carbone,
+        'lower_bounds': lower_bounds,
+        'upper_bounds': upper_bounds,
+        'x0': x0,
+    }
+
 
+def _cout(prep, w_carbone):
+    """
+    Vecteur coût (linéaire) pour un poids (n,) ou un tableau de poids (m, n).
+    Minimiser c^T x favorise efficacité (terme négatif) et pénalise carbone (terme positif)
+    """
+    w = np.asarray(w_carbone, dtype=float)
+    if w.ndim:
+        w = w[:, None]
+    return w * (prep['carbone'] / prep['std_carbone']) - (1.0 - w) * (prep['efficacite'] / prep['std_contacts'])
+
+
+def evaluer(df, X, courbes=None):
+    """
+    Contacts utiles et carbone (g) d'allocations budgétaires, en un seul produit matriciel.
+
+    Paramètres:
+      - df: contient les colonnes 'Contacts_utiles_per_euro' et 'Carbone_per_euro' (et 'Budget'
+            avec courbes)
+      - X: allocation (n,) ou matrice (m, n) d'allocations, une ligne par scénario
+      - courbes: courbes de réponse optionnelles (voir optimisation_media): contacts utiles à
+                 rendements décroissants au lieu d'être proportionnels au budget
+
+    Retourne (contacts_utiles, carbone_g): scalaires pour une allocation, vecteurs (m,) sinon.
+    """
+    coefficients = np.column_stack((
+        df['Contacts_utiles_per_euro'].to_numpy(dtype=float),
+        df['Carbone_per_euro'].to_numpy(dtype=float),
+    ))
+    totaux = np.asarray(X, dtype=float) @ coefficients
+    if courbes is not None:
+        budgets = df['Budget'].to_numpy(dtype=float)
+        reponse = Reponse(courbes, budgets, coefficients[:, 0] * budgets)
+        totaux[..., 0] = reponse.valeurs(X).sum(axis=-1)
+    return totaux[..., 0][()], totaux[..., 1][()]
+
+
+def _waterfill_lot(C, lambda_reg, x_center, lower_bounds, upper_bounds, budget_total):
+    """
+    Résout exactement, pour chaque ligne c de C (m, n):
+        min c^T x + (lambda/2) * ||x - x_center||^2  sous lower <= x <= upper et sum(x) == budget_total.
+
+    Conditions KKT: x_i(t) = clip(a_i - t, lower_i, upper_i) avec a_i = x_center_i - c_i/lambda
+    et t = nu/lambda (nu: multiplicateur de la contrainte de somme). S(t) = sum_i x_i(t) est
+    décroissante et linéaire par morceaux: sa pente perd 1 quand t franchit a_i - upper_i et
+    regagne 1 en a_i - lower_i. On trie les 2n points de cassure, on intègre les pentes et on
+    interpole sur le segment qui encadre budget_total (O(n log n) par ligne, sans boucle Python).
+    Pour lambda == 0 (programme linéaire), remplissage glouton par coût croissant.
+    """
+    m, n = C.shape
+    if lambda_reg <= 0:
+        # Cas linéaire: tout au plancher, puis on remplit les supports les moins coûteux
+        ordre = np.argsort(C, axis=1, kind="stable")
+        capacite = (upper_bounds - lower_bounds)[ordre]
+        reste = budget_total - float(lower_bounds.sum())
+        ajout = np.clip(reste - (np.cumsum(capacite, axis=1) - capacite), 0.0, capacite)
+        X = np.empty((m, n))
+        np.put_along_axis(X, ordre, lower_bounds[ordre] + ajout, axis=1)
+        return X
+
+    A = x_center - C / lambda_reg
+    points = np.concatenate((A - upper_bounds, A - lower_bounds), axis=1)
+    sauts = np.concatenate((np.full(n, -1.0), np.full(n, 1.0)))
+    ordre = np.argsort(points, axis=1, kind="stable")
+    P = np.take_along_axis(points, ordre, axis=1)
+    pente = np.cumsum(sauts[ordre], axis=1)
+    # Au premier point de cassure tous les supports sont à leur borne haute
+    S = np.empty_like(P)
+    S[:, 0] = upper_bounds.sum()
+    S[:, 1:] = S[:, :1] + np.cumsum(pente[:, :-1] * np.diff(P, axis=1), axis=1)
+
+    # Premier point où S(t) <= budget_total (S décroissante)
+    sous = S <= budget_total
+    j = np.where(sous[:, -1], np.argmax(sous, axis=1), 2 * n - 1)
+    j0 = np.maximum(j - 1, 0)
+    lignes = np.arange(m)
+    t0, t1 = P[lignes, j0], P[lignes, j]
+    s0, s1 = S[lignes, j0], S[lignes, j]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        frac = np.where(s0 > s1, (s0 - budget_total) / (s0 - s1), 0.0)
+    t = t0 + np.clip(frac, 0.0, 1.0) * (t1 - t0)
+    X = np.clip(A - t[:, None], lower_bounds, upper_bounds)
+
+    # Quand |c/lambda| est très grand devant les budgets (ex: normalisation eps), a_i - t perd
+    # sa précision: on reporte le reliquat sur les supports qui bornent le segment trouvé.
+    for k in (ordre[lignes, j] % n, ordre[lignes, j0] % n):
+        reliquat = budget_total - X.sum(axis=1)
+        X[lignes, k] = np.clip(X[lignes, k] + reliquat, lower_bounds[k], upper_bounds[k])
+    return X
+
+
+def _waterfill_a_chaud(c, lambda_reg, x_center, lower_bounds, upper_bounds, budget_total, x_depart):
+    """
+    Water-filling démarré depuis une allocation proche de l'optimum (ex: optimum avant l'ajout
+    ou le retrait d'un plan): t est estimé sur les variables libres de x_depart, puis corrigé
+    par pas de Newton sur S(t) (pente = -nombre de variables libres), en O(n) par itération au
+    lieu du tri O(n log n). Dès que l'ensemble actif est le bon, le pas tombe sur la solution
+    exacte. Un pas qui sort de l'intervalle encadrant t est remplacé par une bissection.
+
+    Retourne (x, iterations), ou None sans convergence en MAX_ITERATIONS_A_CHAUD itérations.
+    """
+    A = x_center - c / lambda_reg
+    libres = (x_depart > lower_bounds) & (x_depart < upper_bounds)
+    t = float(np.median((A - x_depart)[libres])) if libres.any() else float(np.median(A - x_center))
+    t_bas, t_haut = -np.inf, np.inf  # S(t_bas) > budget_total > S(t_haut)
+    tolerance = 1e-10 * max(1.0, abs(budget_total))
+    for iteration in range(1, MAX_ITERATIONS_A_CHAUD + 1):
+        y = A - t
+        x = np.clip(y, lower_bounds, upper_bounds)
+        ecart = float(x.sum()) - budget_total
+        if abs(ecart) <= tolerance:
+            return x, iteration
+        if ecart > 0:
+            t_bas = t
+        else:
+            t_haut = t
+        pente = np.count_nonzero((y > lower_bounds) & (y < upper_bounds))
+        t_newton = t + ecart / pente if pente else np.nan
+        if t_bas < t_newton < t_haut:
+            t = t_newton
+        elif np.isfinite(t_bas) and np.isfinite(t_haut):
+            t = 0.5 * (t_bas + t_haut)
+        else:
+            return None
+    return None
+
+
+def _projeter(x, lower_bounds, upper_bounds, budget_total):
+    """Projection euclidienne de x sur {lower <= x <= upper, sum(x) == budget_total}."""
+    return _waterfill_lot(np.zeros((1, len(x))), 1.0, x, lower_bounds, upper_bounds, budget_total)[0]
+
+
+def _waterfill(c, lambda_reg, x_center, lower_bounds, upper_bounds, budget_total, x_depart=None):
+    """
+    Water-filling pour un seul vecteur coût, résultat au format OptimizeResult.
+    Avec x_depart (et lambda > 0), démarrage à chaud (_waterfill_a_chaud), repli sur le tri.
+    """
+    debut = time.perf_counter()
+    a_chaud = None
+    if x_depart is not None and lambda_reg > 0:
+        a_chaud = _waterfill_a_chaud(c, lambda_reg, x_center, lower_bounds, upper_bounds, budget_total, x_depart)
+    if a_chaud is not None:
+        x, iterations = a_chaud
+    else:
+        x = _waterfill_lot(c[None, :], lambda_reg, x_center, lower_bounds, upper_bounds, budget_total)[0]
+        iterations = 1
+
+    dx = x - x_center
+    grad = c + lambda_reg * dx
+    # Multiplicateur de la contrainte de budget: -gradient commun des supports non saturés
+    libres = (x > lower_bounds) & (x < upper_bounds)
+    nu = -float(np.mean(grad[libres])) if libres.any() else 0.0
+    ecart = abs(float(x.sum()) - budget_total)
+    success = ecart <= 1e-9 * max(1.0, abs(budget_total))
+    res = OptimizeResult(
+        x=x,
+        fun=float(np.dot(c, x) + 0.5 * lambda_reg * np.dot(dx, dx)),
+        jac=grad,
+        success=bool(success),
+        status=0 if success else 1,
+        message="Solution exacte (water-filling)" if success else f"Écart sur la contrainte de budget: {ecart:.3e}",
+        nit=iterations,
+        nfev=0,
+        multiplicateur=nu,
+        method="waterfill",
+    )
+    res.telemetrie = _telemetrie_solveur("waterfill", res, time.perf_counter() - debut)
+    res.telemetrie['depart_a_chaud'] = a_chaud is not None
+    return res
+
+
+def _resoudre_scipy(c, lambda_reg, x0, x_center, lower_bounds, upper_bounds, budget_total, method, terme=None):
+    """
+    Résolution par scipy (trust-constr avec repli SLSQP, ou SLSQP seul).
+    Au-delà de SEUIL_CREUX variables, Hessienne et contrainte de budget sont creuses (mémoire O(n)).
+    SLSQP travaille en dense et n'est utilisé que jusqu'à MAX_VARIABLES_SLSQP variables.
+    terme: terme séparable optionnel ajouté à l'objectif, x -> (valeur, gradient, diagonale de la Hessienne).
+    """
+    n = len(c)
+    if method == "SLSQP" and n > MAX_VARIABLES_SLSQP:
+        raise ValueError(
+            f"SLSQP limité à {MAX_VARIABLES_SLSQP} variables ({n} demandées): utiliser 'waterfill' ou 'trust-constr'"
+        )
     w_diag = np.ones(n, dtype=float)
 
     # Définir objectif, gradient, Hessienne
     # f(x) = c^T x + (lambda/2) * sum_i w2_i * (x_i - x_center_i)^2
     def fun(x):
         dx = x - x_center
-        return float(np.dot(c, x) + 0.5 * lambda_reg * np.dot(w_diag * dx, dx))
+        valeur = float(np.dot(c, x) + 0.5 * lambda_reg * np.dot(w_diag * dx, dx))
+        return valeur if terme is None else valeur + terme(x)[0]
 
     def jac(x):
         dx = x - x_center
-        return c + lambda_reg * (w_diag * dx)
+        gradient = c + lambda_reg * (w_diag * dx)
+        return gradient if terme is None else gradient + terme(x)[1]
+
+    # Hessienne diagonale (constante sans terme), creuse pour les grands problèmes
+    creux = n > SEUIL_CREUX
+
+    def diagonale(d):
+        return sparse.diags(d, format="csr") if creux else np.diag(d)
 
-    def hess(_x):
-        # Hessienne constante (diagonale)
-        return np.diag(lambda_reg * w_diag)
-    
+    hessienne = diagonale(lambda_reg * w_diag)
+
+    def hess(x):
+        return hessienne if terme is None else diagonale(lambda_reg * w_diag + terme(x)[2])
 
     # Contrainte somme(x) == budget_total
-    constraint = LinearConstraint(np.ones((1, n)), [budget_total], [budget_total])
+    ligne_budget = sparse.csr_matrix(np.ones((1, n))) if creux else np.ones((1, n))
+    constraint = LinearConstraint(ligne_budget, [budget_total], [budget_total])
+    bornes = Bounds(lower_bounds, upper_bounds)
 
+    slsqp_kwargs = dict(
+        method="SLSQP",
+        jac=jac,
+        bounds=bornes,
+        constraints={"type": "eq", "fun": lambda x: np.sum(x) - budget_total, "jac": lambda x: np.ones_like(x)},
+        options={"maxiter": 2000, "ftol": 1e-9, "disp": False},
+    )
+    if method == "SLSQP":
+        debut = time.perf_counter()
+        res = minimize(fun, x0, **slsqp_kwargs)
+        res.telemetrie = _telemetrie_solveur("SLSQP", res, time.perf_counter() - debut)
+        return res
+
+    debut = time.perf_counter()
     res = minimize(
         fun,
         x0,
         method="trust-constr",
         jac=jac,
         hess=hess,
-        bounds=list(zip(lower_bounds, upper_bounds)),
+        bounds=bornes,
         constraints=[constraint],
         options={
             "maxiter": 2000,
@@ -101,16 +445,1322 @@ def optimisation_media(
         },
     )
 
+    telemetrie = _telemetrie_solveur("trust-constr", res, time.perf_counter() - debut)
+
     # Fallback SLSQP si jamais nécessaire
-    if not res.success:
-        res = minimize(
-            fun,
-            x0,
-            method="SLSQP",
-            jac=jac,
-            bounds=list(zip(lower_bounds, upper_bounds)),
-            constraints={"type": "eq", "fun": lambda x: np.sum(x) - budget_total, "jac": lambda x: np.ones_like(x)},
-            options={"maxiter": 2000, "ftol": 1e-9, "disp": False},
-        )
-
-    return res
\ No newline at end of file
+    if not res.success and n <= MAX_VARIABLES_SLSQP:
+        debut = time.perf_counter()
+        res = minimize(fun, x0, **slsqp_kwargs)
+        repli = _telemetrie_solveur("SLSQP", res, time.perf_counter() - debut)
+        telemetrie.update(
+            solveur="SLSQP",
+            repli=True,
+            iterations=telemetrie['iterations'] + repli['iterations'],
+            evaluations=telemetrie['evaluations'] + repli['evaluations'],
+        )
+        telemetrie['temps']['repli'] = repli['temps']['resolution']
+
+    res.telemetrie = telemetrie
+    return res
+
+
+def _resoudre_reponse(a, b, reponse, lambda_reg, x_center, lower_bounds, upper_bounds, budget_total, x_depart=None):
+    """
+    Résout min sum_i [a_i x_i - b U_i(x_i)] + (lambda/2) ||x - x_center||^2 sous
+    lower <= x <= upper et sum(x) == budget_total, avec U concave (reponse.Reponse).
+
+    L'objectif est séparable et strictement convexe (phi_i'' = lambda - b U_i'' > 0): comme pour
+    le water-filling, x_i(nu) minimise phi_i(x) + nu x sur [lower_i, upper_i], soit
+    phi_i'(x_i) = -nu (Newton vectorisé sur toutes les variables, protégé par bissection), et
+    S(nu) = sum_i x_i(nu) décroît. nu est obtenu par Newton protégé sur S(nu) = budget_total,
+    de pente -sum_libres 1/phi_i''. Dérivées analytiques, O(n) par itération.
+    """
+    debut = time.perf_counter()
+    if lambda_reg <= 0:
+        raise ValueError("Courbes de réponse: lambda_reg doit être > 0")
+
+    def derivees(x):
+        d1, d2 = reponse.derivees(x)
+        return a - b * d1 + lambda_reg * (x - x_center), lambda_reg - b * d2
+
+    # nu <= -phi'(upper): variable en borne haute; nu >= -phi'(lower): en borne basse
+    g_bas, g_haut = derivees(lower_bounds)[0], derivees(upper_bounds)[0]
+    nu_bas, nu_haut = float(np.min(-g_haut, initial=0.0)), float(np.max(-g_bas, initial=0.0))
+    tolerance_x = 1e-12 * np.maximum(1.0, upper_bounds)
+    evaluations = 0
+
+    def allocation(nu, x):
+        """x(nu): Newton par variable dans l'intervalle [bas, haut] qui encadre la racine."""
+        nonlocal evaluations
+        libres = (g_bas < -nu) & (g_haut > -nu) & (lower_bounds < upper_bounds)
+        fixe = np.where(g_haut <= -nu, upper_bounds, lower_bounds)
+        bas, haut = lower_bounds.copy(), upper_bounds.copy()
+        x = np.where(libres, np.clip(x, lower_bounds, upper_bounds), fixe)
+        for _ in range(MAX_ITERATIONS_REPONSE):
+            g, h = derivees(x)
+            evaluations += 1
+            r = np.where(libres, g + nu, 0.0)
+            bas = np.where(r < 0, x, bas)
+            haut = np.where(r > 0, x, haut)
+            pas = r / h
+            # Pas négligeable (résidu à la précision machine): variable résolue, sans bissection
+            resolues = np.abs(pas) <= tolerance_x
+            if resolues.all():
+                break
+            suivant = x - pas
+            suivant = np.where((suivant <= bas) | (suivant >= haut), 0.5 * (bas + haut), suivant)
+            x = np.where(resolues, x, suivant)
+        return x, libres, h
+
+    # Départ: multiplicateur estimé sur les variables libres du point de départ
+    x = np.clip(x_center if x_depart is None else x_depart, lower_bounds, upper_bounds)
+    g, _ = derivees(x)
+    libres = (x > lower_bounds) & (x < upper_bounds)
+    nu = float(-np.median(g[libres])) if libres.any() else 0.5 * (nu_bas + nu_haut)
+    if not nu_bas <= nu <= nu_haut:
+        nu = 0.5 * (nu_bas + nu_haut)
+
+    tolerance = 1e-10 * max(1.0, abs(budget_total))
+    for iteration in range(1, MAX_ITERATIONS_REPONSE + 1):
+        x, libres, h = allocation(nu, x)
+        ecart = float(x.sum()) - budget_total
+        if abs(ecart) <= tolerance:
+            break
+        if ecart > 0:
+            nu_bas = nu
+        else:
+            nu_haut = nu
+        pente = float(np.sum(1.0 / h[libres]))
+        nu_newton = nu + ecart / pente if pente > 0 else np.nan
+        nu = nu_newton if nu_bas < nu_newton < nu_haut else 0.5 * (nu_bas + nu_haut)
+
+    dx = x - x_center
+    gradient = derivees(x)[0]
+    success = abs(ecart) <= tolerance
+    res = OptimizeResult(
+        x=x,
+        fun=float(np.dot(a, x) - b * reponse.valeurs(x).sum() + 0.5 * lambda_reg * np.dot(dx, dx)),
+        jac=gradient,
+        success=bool(success),
+        status=0 if success else 1,
+        message="Solution optimale (courbes de réponse)" if success else f"Écart sur la contrainte de budget: {ecart:.3e}",
+        nit=iteration,
+        nfev=evaluations,
+        multiplicateur=nu,
+        method="reponse",
+    )
+    res.telemetrie = _telemetrie_solveur("reponse", res, time.perf_counter() - debut)
+    res.telemetrie['depart_a_chaud'] = x_depart is not None
+    return res
+
+
+def _resoudre_periodes(a, lower_bounds, upper_bounds, budget_total, groupes, k, plafonds_budget, plafonds_carbone):
+    """
+    Projection euclidienne de a sur {lower <= x <= upper, sum(x) == budget_total et, pour
+    chaque période p: sum_{i de p} x_i <= plafonds_budget[p], sum_{i de p} k_i x_i <=
+    plafonds_carbone[p]} (plafond infini: pas de contrainte). groupes: période de chaque variable.
+
+    Points intérieurs primal-dual (prédicteur-correcteur de Mehrotra). Les bornes s'éliminent
+    (diagonale H), et chaque itération se ramène à un système sur les multiplicateurs (budget
+    total, plafonds): une matrice en flèche, un bloc 2 x 2 par période bordé par la ligne du
+    budget total, formée par bincount et résolue par complément de Schur en O(n + P). Le nombre
+    d'itérations ne dépend guère de n ni de la dégénérescence (objectif presque linéaire pour
+    lambda petit, où les méthodes d'ensemble actif pivotent une variable à la fois).
+
+    Retourne (x, nu, mu, rho, iterations, residu): multiplicateurs en unités de a (rho par
+    gramme), residu: plus grand écart aux contraintes (€), et à la stationnarité si la méthode
+    n'a pas convergé en MAX_ITERATIONS_PERIODES itérations.
+    """
+    nb = len(plafonds_budget)
+    # Variables à bornes égales: fixées, leur part est retirée du budget et des plafonds
+    variables = upper_bounds > lower_bounds
+    fixes = ~variables
+    x_complet = lower_bounds.astype(float).copy()
+    budget = budget_total - float(lower_bounds[fixes].sum())
+    plafonds_budget = plafonds_budget - np.bincount(groupes[fixes], weights=lower_bounds[fixes], minlength=nb)
+    plafonds_carbone = plafonds_carbone - np.bincount(
+        groupes[fixes], weights=(k * lower_bounds)[fixes], minlength=nb,
+    )
+    # Mise à l'échelle: euros rapportés à la plus grande amplitude, carbone à l'intensité moyenne
+    echelle_x = float(np.max(upper_bounds - lower_bounds, initial=0.0)) or 1.0
+    echelle_k = float(np.mean(k)) if np.any(k > 0) else 1.0
+    a, g = a[variables] / echelle_x, groupes[variables]
+    lower, upper = lower_bounds[variables] / echelle_x, upper_bounds[variables] / echelle_x
+    kn = k[variables] / echelle_k
+    budget /= echelle_x
+    h = np.concatenate((plafonds_budget / echelle_x, plafonds_carbone / (echelle_x * echelle_k)))
+    actifs = np.isfinite(h)
+    h = np.where(actifs, h, 0.0)
+
+    def produit(x):
+        """G x: dépense et carbone par période."""
+        return np.concatenate((np.bincount(g, weights=x, minlength=nb), np.bincount(g, weights=kn * x, minlength=nb)))
+
+    def transpose(pi):
+        """G^T pi, par variable."""
+        return pi[g] + pi[nb + g] * kn
+
+    # Départ au milieu des bornes, multiplicateurs et écarts unitaires
+    x = 0.5 * (lower + upper)
+    nu = 0.0
+    pi = np.where(actifs, 1.0, 0.0)
+    s = np.where(actifs, np.maximum(h - produit(x), 1.0), 1.0)
+    w_bas, w_haut = x - lower, upper - x
+    z_bas, z_haut = np.ones_like(x), np.ones_like(x)
+    nb_complementaires = 2 * len(x) + int(actifs.sum())
+    tolerance_primale = 1e-9 * max(1.0, abs(budget))
+    tolerance_duale = 1e-9 * max(1.0, float(np.abs(a).max(initial=0.0)))
+    residu = np.inf
+    for iteration in range(1, MAX_ITERATIONS_PERIODES + 1):
+        r_d = x - a + nu + transpose(pi) - z_bas + z_haut
+        r_e = float(x.sum()) - budget
+        r_g = np.where(actifs, produit(x) + s - h, 0.0)
+        ecart = (w_bas @ z_bas + w_haut @ z_haut + s[actifs] @ pi[actifs]) / max(nb_complementaires, 1)
+        residu = max(abs(r_e), float(np.abs(r_g).max(initial=0.0)))
+        if (residu <= tolerance_primale and float(np.abs(r_d).max(initial=0.0)) <= tolerance_duale
+                and ecart <= 1e-3 * tolerance_duale * tolerance_primale):
+            break
+
+        # Système réduit en flèche: coin (budget total), bordure E_p et blocs D_p par période
+        inverse_h = 1.0 / (1.0 + z_bas / w_bas + z_haut / w_haut)
+        coin = float(inverse_h.sum())
+        e_mu = np.bincount(g, weights=inverse_h, minlength=nb)
+        e_rho = np.bincount(g, weights=kn * inverse_h, minlength=nb)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            s_sur_pi = np.where(actifs, s / pi, 0.0)
+        d_mm = np.where(actifs[:nb], e_mu + s_sur_pi[:nb], 1.0)
+        d_rr = np.where(actifs[nb:], np.bincount(g, weights=kn * kn * inverse_h, minlength=nb) + s_sur_pi[nb:], 1.0)
+        d_mr = np.where(actifs[:nb] & actifs[nb:], e_rho, 0.0)
+        e_mu, e_rho = np.where(actifs[:nb], e_mu, 0.0), np.where(actifs[nb:], e_rho, 0.0)
+        det = d_mm * d_rr - d_mr * d_mr
+
+        def blocs(u_mu, u_rho):
+            return (d_rr * u_mu - d_mr * u_rho) / det, (d_mm * u_rho - d_mr * u_mu) / det
+
+        s_mu, s_rho = blocs(e_mu, e_rho)
+        schur = coin - float(e_mu @ s_mu + e_rho @ s_rho)
+
+        def direction(c_bas, c_haut, c_s):
+            """Direction de Newton pour les seconds membres de complémentarité (c_bas, c_haut, c_s)."""
+            rho_x = -r_d + c_bas / w_bas - c_haut / w_haut
+            with np.errstate(divide="ignore", invalid="ignore"):
+                c_pi = np.where(actifs, c_s / pi, 0.0)
+            second = np.where(actifs, produit(inverse_h * rho_x) + c_pi + r_g, 0.0)
+            t_mu, t_rho = blocs(second[:nb], second[nb:])
+            # Complément nul: budget total redondant (tous les plafonds de dépense saturés), nu indéterminé
+            d_nu = (float(inverse_h @ rho_x) + r_e - float(e_mu @ t_mu + e_rho @ t_rho)) / schur if schur > 1e-12 * coin else 0.0
+            d_pi = np.concatenate((t_mu - s_mu * d_nu, t_rho - s_rho * d_nu))
+            d_x = inverse_h * (rho_x - d_nu - transpose(d_pi))
+            with np.errstate(divide="ignore", invalid="ignore"):
+                d_s = np.where(actifs, (c_s - s * d_pi) / pi, 0.0)
+            return d_x, d_nu, d_pi, d_s, (c_bas - z_bas * d_x) / w_bas, (c_haut + z_haut * d_x) / w_haut
+
+        def pas_max(d_x, d_pi, d_s, d_bas, d_haut):
+            """Plus grand pas (<= 1) qui garde écarts et multiplicateurs positifs: 1 / max(1, -d / v)."""
+            vitesse = max(
+                1.0, float(np.max(-d_x / w_bas)), float(np.max(d_x / w_haut)),
+                float(np.max(-d_bas / z_bas)), float(np.max(-d_haut / z_haut)),
+                float(np.max(-d_s[actifs] / s[actifs], initial=0.0)), float(np.max(-d_pi[actifs] / pi[actifs], initial=0.0)),
+            ) if len(d_x) else 1.0
+            return 1.0 / vitesse
+
+        # Prédicteur (affine), puis correcteur centré (sigma de Mehrotra)
+        p_x, p_nu, p_pi, p_s, p_bas, p_haut = direction(-w_bas * z_bas, -w_haut * z_haut, -s * pi)
+        alpha = pas_max(p_x, p_pi, p_s, p_bas, p_haut)
+        ecart_affine = (
+            (w_bas + alpha * p_x) @ (z_bas + alpha * p_bas) + (w_haut - alpha * p_x) @ (z_haut + alpha * p_haut)
+            + float(((s + alpha * p_s) * (pi + alpha * p_pi))[actifs].sum())
+        ) / max(nb_complementaires, 1)
+        sigma = min(1.0, (ecart_affine / ecart) ** 3) if ecart > 0 else 0.0
+        d_x, d_nu, d_pi, d_s, d_bas, d_haut = direction(
+            sigma * ecart - w_bas * z_bas - p_x * p_bas,
+            sigma * ecart - w_haut * z_haut + p_x * p_haut,
+            np.where(actifs, sigma * ecart - s * pi - p_s * p_pi, 0.0),
+        )
+        alpha = 0.99 * pas_max(d_x, d_pi, d_s, d_bas, d_haut)
+        x = x + alpha * d_x
+        # Écarts aux bornes mis à jour à part (x - lower s'annulerait par arrondi près d'une borne)
+        w_bas, w_haut = w_bas + alpha * d_x, w_haut - alpha * d_x
+        nu += alpha * d_nu
+        pi = np.where(actifs, pi + alpha * d_pi, 0.0)
+        s = np.where(actifs, s + alpha * d_s, 1.0)
+        z_bas, z_haut = z_bas + alpha * d_bas, z_haut + alpha * d_haut
+    else:
+        # Non convergé: l'écart à la stationnarité compte aussi
+        residu = max(residu, float(np.abs(r_d).max(initial=0.0)))
+
+    residu *= echelle_x
+    x_complet[variables] = np.clip(x * echelle_x, lower_bounds[variables], upper_bounds[variables])
+    return (
+        x_complet, nu * echelle_x, pi[:nb] * echelle_x, pi[nb:] * echelle_x / echelle_k, iteration, residu,
+    )
+
+
+def _resoudre_plafond_carbone(c, k, plafonds, lambda_reg, x_center, lower_bounds, upper_bounds, budget_total):
+    """
+    Pour chaque plafond X de plafonds (m,), résout exactement
+        min c^T x + (lambda/2) * ||x - x_center||^2  sous lower <= x <= upper, sum(x) == budget_total
+        et k^T x <= X.
+
+    Avec rho >= 0 le multiplicateur du plafond, x(rho) est le water-filling du coût c + rho * k
+    et le carbone K(rho) = k^T x(rho) est décroissant et affine par morceaux, de pente
+    -sum_libres (k_i - moyenne_libres(k))^2 / lambda. Newton sur rho (exact dès que les
+    variables libres sont les bonnes), remplacé par une bissection quand le pas sort de
+    l'intervalle qui encadre rho (par doublements tant qu'il n'est pas borné). Tous les
+    plafonds avancent ensemble: un _waterfill_lot par itération. Les plafonds doivent être
+    au-dessus du carbone minimal atteignable.
+
+    Retourne (X (m, n), rho (m,), iterations).
+    """
+    m = len(plafonds)
+    X = np.empty((m, len(c)))
+    rho = np.zeros(m)
+    rho_bas, rho_haut = np.zeros(m), np.full(m, np.inf)
+    # Échelle de rho à partir de laquelle le carbone l'emporte sur les écarts de coût
+    ecart_cout = float(np.ptp(c)) + lambda_reg * float(np.max(upper_bounds - lower_bounds, initial=0.0))
+    pas = np.full(m, max(ecart_cout, 1e-12) / max(float(np.ptp(k)), 1e-12))
+    tolerance = 1e-9 * np.maximum(1.0, np.abs(plafonds))
+    restants = np.arange(m)
+    iteration = 0
+    for iteration in range(1, MAX_ITERATIONS_PLAFOND + 1):
+        X[restants] = _waterfill_lot(
+            c + rho[restants, None] * k, lambda_reg, x_center, lower_bounds, upper_bounds, budget_total,
+        )
+        ecart = X[restants] @ k - plafonds[restants]
+        # Plafond atteint, ou non contraignant (rho = 0)
+        encours = (np.abs(ecart) > tolerance[restants]) & ((rho[restants] > 0) | (ecart > 0))
+        restants, ecart = restants[encours], ecart[encours]
+        if not len(restants):
+            break
+
+        depasse = ecart > 0
+        rho_bas[restants] = np.where(depasse, rho[restants], rho_bas[restants])
+        rho_haut[restants] = np.where(depasse, rho_haut[restants], rho[restants])
+        x = X[restants]
+        libres = (x > lower_bounds) & (x < upper_bounds)
+        moyenne = np.where(libres, k, 0.0).sum(axis=1) / np.maximum(libres.sum(axis=1), 1)
+        pente = np.where(libres, (k - moyenne[:, None]) ** 2, 0.0).sum(axis=1) / lambda_reg
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rho_newton = rho[restants] + ecart / pente
+        dans = (rho_newton > rho_bas[restants]) & (rho_newton < rho_haut[restants])
+        borne = np.isfinite(rho_haut[restants])
+        rho[restants] = np.where(
+            dans, rho_newton,
+            np.where(borne, 0.5 * (rho_bas[restants] + np.where(borne, rho_haut[restants], 0.0)),
+                     rho_bas[restants] + pas[restants]),
+        )
+        pas[restants] *= np.where(dans | borne, 1.0, 2.0)
+    return X, rho, iteration
+
+
+def _telemetrie_solveur(solveur, res, duree):
+    """Télémétrie d'une résolution: solveur, temps, itérations et évaluations de l'objectif."""
+    return {
+        'solveur': solveur,
+        'repli': False,
+        'cache': False,
+        'temps': {'resolution': duree, 'repli': 0.0},
+        'iterations': int(res.get('nit', 0) or 0),
+        'evaluations': int(res.get('nfev', 0) or 0),
+    }
+
+
+def _diagnostic(X, C, lambda_reg, x_center, lower_bounds, upper_bounds, budget_total):
+    """
+    Qualité d'allocations X (n,) ou (m, n) pour des coûts C de même forme: violation des
+    contraintes (€) et résidu KKT relatif, vectorisés sur les lignes.
+
+    Le résidu mesure la stationnarité projetée: avec g = c + lambda (x - x_center) et nu le
+    multiplicateur du budget, g_i + nu doit être nul pour un support libre, >= 0 en borne basse
+    et <= 0 en borne haute. nu est estimé sur les supports libres (milieu de l'intervalle
+    admissible s'il n'y en a aucun). Le résidu est rapporté à max(1, |g|max).
+    """
+    X, C = np.atleast_2d(X), np.atleast_2d(C)
+    G = C + lambda_reg * (X - x_center)
+    violation = np.maximum(
+        np.abs(X.sum(axis=1) - budget_total),
+        np.maximum(lower_bounds - X, X - upper_bounds).max(axis=1, initial=0.0),
+    )
+    tol = 1e-9 * max(1.0, float(np.abs(upper_bounds).max(initial=0.0)))
+    bas = X <= lower_bounds + tol
+    haut = (X >= upper_bounds - tol) & ~bas
+    libres = ~(bas | haut)
+    nb_libres = libres.sum(axis=1)
+    nu_libres = -np.where(libres, G, 0.0).sum(axis=1) / np.maximum(nb_libres, 1)
+    nu_min = np.where(bas, -G, -np.inf).max(axis=1, initial=-np.inf)
+    nu_max = np.where(haut, -G, np.inf).min(axis=1, initial=np.inf)
+    fini_min, fini_max = np.isfinite(nu_min), np.isfinite(nu_max)
+    nu_bornes = np.where(
+        fini_min & fini_max, (np.where(fini_min, nu_min, 0.0) + np.where(fini_max, nu_max, 0.0)) / 2,
+        np.where(fini_min, nu_min, np.where(fini_max, nu_max, 0.0)),
+    )
+    nu = np.where(nb_libres > 0, nu_libres, nu_bornes)
+    R = G + nu[:, None]
+    residu = np.maximum.reduce([
+        np.where(libres, np.abs(R), 0.0).max(axis=1, initial=0.0),
+        np.where(bas, np.maximum(-R, 0.0), 0.0).max(axis=1, initial=0.0),
+        np.where(haut, np.maximum(R, 0.0), 0.0).max(axis=1, initial=0.0),
+    ])
+    residu = residu / np.maximum(1.0, np.abs(G).max(axis=1, initial=0.0))
+    return {'violation_contraintes': violation, 'residu_kkt': residu}
+
+
+def _telemetrie_front(solveur, prep, weights, X, lambda_reg, temps, par_point=None):
+    """
+    Télémétrie agrégée d'un front de Pareto: temps par phase, itérations, pires violation et
+    résidu KKT, et détail par point (diagnostics, plus temps / solveur / itérations s'ils
+    sont fournis dans par_point).
+    """
+    par_point = dict(par_point or {})
+    par_point['w_carbone'] = np.asarray(weights, dtype=float)
+    par_point.update(_diagnostic(
+        X, _cout(prep, weights), lambda_reg, prep['x0'], prep['lower_bounds'], prep['upper_bounds'], prep['budget_total'],
+    ))
+    iterations = par_point.get('iterations')
+    return {
+        'solveur': solveur,
+        'cache': False,
+        'temps': temps,
+        'nb_points': len(X),
+        'nb_variables': X.shape[1],
+        'iterations': int(np.sum(iterations)) if iterations is not None else len(X),
+        'nb_replis': int(np.sum(par_point.get('repli', 0))),
+        'violation_contraintes': float(par_point['violation_contraintes'].max(initial=0.0)),
+        'residu_kkt': float(par_point['residu_kkt'].max(initial=0.0)),
+        'par_point': par_point,
+    }
+
+
+def optimisation_media(
+    df,
+    w_carbone=0.5,
+    min_budget_par_canal=1000,
+    max_variation=0.5,
+    lambda_reg=1e-7,
+    method="auto",
+    granularite="support",
+    cache=None,
+    x_depart=None,
+    courbes=None,
+):
+    """
+    Paramètres:
+      - df: contient les colonnes 'Contacts_utiles_per_euro', 'Carbone_per_euro', 'Budget'
+      - w_carbone: poids du carbone dans [0,1]
+      - min_budget_par_canal: budget minimum par canal
+      - max_variation: variation max autorisée autour du budget initial pour chaque canal (ex: 0.5 => ±50%)
+      - lambda_reg: intensité L2; plus grand => allocations plus proches de x_center
+      - method: "auto" / "waterfill" (solution exacte en O(n log n), par défaut),
+                "trust-constr" (scipy, repli SLSQP) ou "SLSQP"
+      - granularite: "support" (une ligne de df par support) ou "ligne" (une ligne de df par
+                     ligne de plan; plancher min_budget_par_canal non appliqué)
+      - cache: CacheResultats optionnel (résultat mémorisé par empreinte du problème)
+      - x_depart: allocation de départ optionnelle, alignée sur les lignes de df (ex: optimum
+                  obtenu avant l'ajout ou le retrait d'un plan; NaN => budget initial). Démarrage
+                  à chaud du solveur; la solution ne dépend pas de x_depart (hors clé de cache).
+      - courbes: courbes de réponse optionnelles, une ligne par ligne de df (DataFrame Modele,
+                 Forme, Echelle, Lignes, voir reponse.courbes_variables): contacts utiles à
+                 rendements décroissants U_i(x), égaux aux contacts initiaux au budget initial.
+                 Le carbone reste proportionnel au budget (objectif convexe). Résolution exacte
+                 par "auto" (Newton sur le multiplicateur du budget, dérivées analytiques) ou par
+                 les méthodes scipy; "waterfill" est réservé à l'objectif linéaire.
+
+    Retourne un OptimizeResult (.x, .success, .message, .nit, ...) avec .telemetrie: dict
+    {'solveur', 'repli', 'cache', 'temps': {'preparation', 'resolution', 'repli', 'total'} (s),
+    'iterations', 'evaluations', 'nb_variables', 'violation_contraintes' (€), 'residu_kkt',
+    'depart_a_chaud'}.
+    """
+    if method not in METHODES:
+        raise ValueError(f"Méthode inconnue: {method!r} (attendu: {', '.join(METHODES)})")
+
+    params = dict(
+        w_carbone=w_carbone,
+        min_budget_par_canal=min_budget_par_canal,
+        max_variation=max_variation,
+        lambda_reg=lambda_reg,
+        method=method,
+        granularite=granularite,
+        courbes=courbes,
+    )
+    if cache is not None:
+        return cache.obtenir(
+            cache.cle("optimisation_media", df, **params),
+            lambda: optimisation_media(df, **params, x_depart=x_depart),
+        )
+
+    debut = time.perf_counter()
+    prep = _preparer(df, min_budget_par_canal, max_variation, granularite)
+    c = _cout(prep, w_carbone)
+    x_center = prep['x0'].copy()  # centre de régularisation
+    if x_depart is not None:
+        x_depart = np.asarray(x_depart, dtype=float)
+        if x_depart.shape != x_center.shape:
+            raise ValueError(f"x_depart doit avoir {len(x_center)} valeurs (une par ligne de df)")
+        x_depart = np.where(np.isfinite(x_depart), x_depart, prep['x0'])
+    duree_preparation = time.perf_counter() - debut
+
+    if courbes is not None:
+        if method == "waterfill":
+            raise ValueError("Le water-filling ne traite pas les courbes de réponse: utiliser 'auto'")
+        if len(courbes) != len(c):
+            raise ValueError(f"courbes doit avoir {len(c)} lignes (une par ligne de df)")
+        reponse = Reponse(courbes, prep['budgets_initiaux'], prep['efficacite'] * prep['budgets_initiaux'])
+        # Objectif: w * carbone normalisé (linéaire) - (1 - w) * contacts utiles normalisés (concaves)
+        a = w_carbone * prep['carbone'] / prep['std_carbone']
+        b = (1.0 - w_carbone) / prep['std_contacts']
+        if method == "auto":
+            res = _resoudre_reponse(
+                a, b, reponse, lambda_reg, x_center,
+                prep['lower_bounds'], prep['upper_bounds'], prep['budget_total'], x_depart,
+            )
+        else:
+            def terme(x):
+                d1, d2 = reponse.derivees(x)
+                return -b * float(reponse.valeurs(x).sum()), -b * d1, -b * d2
+
+            x0 = prep['x0'] if x_depart is None else _projeter(
+                x_depart, prep['lower_bounds'], prep['upper_bounds'], prep['budget_total'],
+            )
+            res = _resoudre_scipy(
+                a, lambda_reg, x0, x_center,
+                prep['lower_bounds'], prep['upper_bounds'], prep['budget_total'], method, terme,
+            )
+            res.telemetrie['depart_a_chaud'] = x_depart is not None
+        # Gradient de la partie non quadratique au point trouvé (diagnostic KKT)
+        c = a - b * reponse.derivees(res.x)[0]
+    # Objectif séparable (linéaire + L2 diagonale): solution exacte par water-filling
+    elif method in ("auto", "waterfill"):
+        res = _waterfill(
+            c, lambda_reg, x_center, prep['lower_bounds'], prep['upper_bounds'], prep['budget_total'], x_depart,
+        )
+    else:
+        # Départ: projection de x_depart sur les contraintes (point admissible le plus proche)
+        x0 = prep['x0'] if x_depart is None else _projeter(
+            x_depart, prep['lower_bounds'], prep['upper_bounds'], prep['budget_total'],
+        )
+        res = _resoudre_scipy(
+            c, lambda_reg, x0, x_center,
+            prep['lower_bounds'], prep['upper_bounds'], prep['budget_total'], method,
+        )
+        res.telemetrie['depart_a_chaud'] = x_depart is not None
+
+    res.telemetrie['temps']['preparation'] = duree_preparation
+    res.telemetrie['temps']['total'] = time.perf_counter() - debut
+    res.telemetrie['nb_variables'] = len(c)
+    diagnostic = _diagnostic(
+        res.x, c, lambda_reg, x_center, prep['lower_bounds'], prep['upper_bounds'], prep['budget_total'],
+    )
+    res.telemetrie.update({cle: float(valeur[0]) for cle, valeur in diagnostic.items()})
+    return res
+
+
+def _plafonds_periodes(plafonds, periodes, nom):
+    """
+    Plafonds par période alignés sur periodes: None (aucun), scalaire (même plafond pour
+    toutes) ou dict / Series {période: plafond}; période absente ou plafond NaN: pas de plafond.
+    """
+    if plafonds is None:
+        return np.full(len(periodes), np.inf)
+    if np.isscalar(plafonds):
+        valeurs = np.full(len(periodes), float(plafonds))
+    else:
+        plafonds = pd.Series(plafonds, dtype=float)
+        inconnues = set(plafonds.index) - set(periodes)
+        if inconnues:
+            raise ValueError(f"{nom}: périodes inconnues: {', '.join(map(str, sorted(inconnues, key=str)))}")
+        valeurs = plafonds.reindex(periodes).to_numpy(dtype=float)
+    if np.any(valeurs < 0):
+        raise ValueError(f"{nom}: les plafonds doivent être positifs")
+    return np.where(np.isnan(valeurs), np.inf, valeurs)
+
+
+def _verifier_plafonds(prep, groupes, periodes, plafonds_budget, plafonds_carbone):
+    """
+    Faisabilité des plafonds par période (ValueError sinon): bornes basses sous les plafonds, et
+    budget total atteignable. Le budget maximal d'une période sous son plafond carbone s'obtient
+    en remplissant d'abord les variables les moins carbonées (sac à dos fractionnaire).
+    """
+    nb = len(periodes)
+    lower, upper, k = prep['lower_bounds'], prep['upper_bounds'], prep['carbone']
+    budget_bas = np.bincount(groupes, weights=lower, minlength=nb)
+    carbone_bas = np.bincount(groupes, weights=k * lower, minlength=nb)
+    for p in np.flatnonzero(budget_bas > plafonds_budget * (1 + 1e-9) + 1e-9):
+        raise ValueError(
+            f"Problème infaisable: période {periodes[p]}: somme des bornes basses {budget_bas[p]:.2f} € "
+            f"> plafond de budget {plafonds_budget[p]:.2f} €"
+        )
+    for p in np.flatnonzero(carbone_bas > plafonds_carbone * (1 + 1e-9) + 1e-9):
+        raise ValueError(
+            f"Problème infaisable: période {periodes[p]}: carbone des bornes basses {carbone_bas[p]:.0f} g "
+            f"> plafond de carbone {plafonds_carbone[p]:.0f} g"
+        )
+    ordre = np.lexsort((k, groupes))
+    capacite, k_ordre, g_ordre = (upper - lower)[ordre], k[ordre], groupes[ordre]
+    cumul = np.cumsum(k_ordre * capacite)
+    # Carbone consommé par les variables moins carbonées de la même période
+    debuts = np.searchsorted(g_ordre, np.arange(nb))
+    avant = cumul - k_ordre * capacite - np.concatenate(([0.0], cumul))[debuts][g_ordre]
+    reste = (plafonds_carbone - carbone_bas)[g_ordre] - avant
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ajout = np.where(k_ordre > 0, np.clip(reste / k_ordre, 0.0, capacite), capacite)
+    budget_max = np.minimum(plafonds_budget, budget_bas + np.bincount(g_ordre, weights=ajout, minlength=nb))
+    if budget_max.sum() < prep['budget_total'] * (1 - 1e-9) - 1e-9:
+        raise ValueError(
+            f"Problème infaisable: budget maximal sous les plafonds par période {budget_max.sum():.2f} € "
+            f"< budget_total {prep['budget_total']:.2f} €"
+        )
+
+
+def optimisation_periodes(
+    df,
+    w_carbone=0.5,
+    max_variation=0.5,
+    lambda_reg=1e-7,
+    plafonds_budget=None,
+    plafonds_carbone=None,
+    cache=None,
+):
+    """
+    Optimisation par support et par période (flighting): une variable par ligne de df, avec
+    des plafonds de dépense et de carbone par période.
+
+    Paramètres:
+      - df: colonnes 'Periode', 'Contacts_utiles_per_euro', 'Carbone_per_euro', 'Budget' (une
+            ligne par couple support x période, voir moteur.donnees_optimisation_periodes)
+      - w_carbone, max_variation, lambda_reg: comme optimisation_media (bornes de chaque
+            variable: budget initial ± max_variation, sans plancher par canal)
+      - plafonds_budget: budget max (€) par période: scalaire ou dict {période: plafond}
+      - plafonds_carbone: carbone max (g) par période, même format
+      - cache: CacheResultats optionnel
+
+    Le budget total est conservé et peut passer d'une période à l'autre. L'objectif étant
+    séparable à courbure commune lambda, la solution est la projection euclidienne de
+    x_center - c/lambda sur les contraintes, calculée par points intérieurs (_resoudre_periodes).
+
+    Retourne un OptimizeResult (.x, .success, .message, .nit, .periodes, .multiplicateur,
+    .multiplicateurs_budget, .multiplicateurs_carbone: coût marginal d'un euro / d'un gramme
+    de plafond en plus par période, 0 si le plafond n'est pas atteint) avec .telemetrie comme
+    optimisation_media, plus 'nb_periodes'.
+    Lève ValueError si les plafonds sont infaisables.
+    """
+    periodes = pd.unique(df['Periode'])
+    plafonds_budget = _plafonds_periodes(plafonds_budget, periodes, "plafonds_budget")
+    plafonds_carbone = _plafonds_periodes(plafonds_carbone, periodes, "plafonds_carbone")
+    params = dict(
+        w_carbone=w_carbone,
+        max_variation=max_variation,
+        lambda_reg=lambda_reg,
+        plafonds_budget=plafonds_budget,
+        plafonds_carbone=plafonds_carbone,
+        periodes=df[['Periode']].astype(str),
+    )
+    if cache is not None:
+        return cache.obtenir(
+            cache.cle("optimisation_periodes", df, **params),
+            lambda: optimisation_periodes(
+                df, w_carbone, max_variation, lambda_reg, dict(zip(periodes, plafonds_budget)),
+                dict(zip(periodes, plafonds_carbone)),
+            ),
+        )
+    if lambda_reg <= 0:
+        raise ValueError("Optimisation par période: lambda_reg doit être > 0")
+
+    debut = time.perf_counter()
+    prep = _preparer(df, 0.0, max_variation, "ligne")
+    groupes = pd.Index(periodes).get_indexer(df['Periode'])
+    _verifier_plafonds(prep, groupes, periodes, plafonds_budget, plafonds_carbone)
+    c = _cout(prep, w_carbone)
+    x_center = prep['x0']
+    duree_preparation = time.perf_counter() - debut
+
+    x, nu, mu, rho, iterations, residu = _resoudre_periodes(
+        x_center - c / lambda_reg, prep['lower_bounds'], prep['upper_bounds'], prep['budget_total'],
+        groupes, prep['carbone'], plafonds_budget, plafonds_carbone,
+    )
+    duree_resolution = time.perf_counter() - debut - duree_preparation
+    dx = x - x_center
+    success = residu <= 1e-9 * max(1.0, prep['budget_total'])
+    res = OptimizeResult(
+        x=x,
+        fun=float(np.dot(c, x) + 0.5 * lambda_reg * np.dot(dx, dx)),
+        success=bool(success),
+        status=0 if success else 1,
+        message="Solution optimale (plafonds par période)" if success else f"Écart sur les contraintes: {residu:.3e}",
+        nit=iterations,
+        nfev=iterations,
+        periodes=np.asarray(periodes),
+        multiplicateur=lambda_reg * nu,
+        multiplicateurs_budget=lambda_reg * mu,
+        multiplicateurs_carbone=lambda_reg * rho,
+        method="periodes",
+    )
+    res.telemetrie = _telemetrie_solveur("periodes", res, duree_resolution)
+    res.telemetrie['temps'].update(preparation=duree_preparation, total=time.perf_counter() - debut)
+    res.telemetrie.update(nb_variables=len(x), nb_periodes=len(periodes), depart_a_chaud=False)
+    # Diagnostic KKT: coût augmenté des multiplicateurs des plafonds (celui du budget total est estimé)
+    diagnostic = _diagnostic(
+        x, c + lambda_reg * (mu[groupes] + rho[groupes] * prep['carbone']), lambda_reg, x_center,
+        prep['lower_bounds'], prep['upper_bounds'], prep['budget_total'],
+    )
+    res.telemetrie.update({cle: float(valeur[0]) for cle, valeur in diagnostic.items()})
+    depassement = np.concatenate((
+        np.bincount(groupes, weights=x, minlength=len(periodes)) - plafonds_budget,
+        (np.bincount(groupes, weights=prep['carbone'] * x, minlength=len(periodes)) - plafonds_carbone)
+        / max(float(np.mean(prep['carbone'])), 1e-12),
+    ))
+    res.telemetrie['violation_contraintes'] = max(
+        res.telemetrie['violation_contraintes'], float(np.max(depassement, initial=0.0)),
+    )
+    return res
+
+
+def pareto_front(
+    df,
+    weights=None,
+    min_budget_par_canal=1000,
+    max_variation=0.5,
+    lambda_reg=1e-7,
+    method="auto",
+    granularite="support",
+    cache=None,
+):
+    """
+    Balayage de Pareto: résout optimisation_media pour tout un vecteur de poids carbone.
+
+    Les précalculs (normalisation, bornes, point de départ) sont faits une seule fois.
+    Avec "auto"/"waterfill", tous les poids sont résolus d'un bloc (matrice poids x supports);
+    avec les méthodes scipy, chaque résolution repart de la solution du poids voisin.
+
+    Paramètres: ceux d'optimisation_media, plus
+      - weights: poids carbone dans [0,1] (par défaut 201 points réguliers)
+      - cache: CacheResultats optionnel
+
+    Retourne un OptimizeResult avec:
+      - w_carbone: (m,) poids résolus
+      - x: (m, n) allocations, une ligne par poids
+      - contacts_utiles, carbone_g: (m,) totaux de chaque allocation
+      - success: (m,) booléens
+      - telemetrie: temps par phase, itérations, replis, pires violation / résidu KKT et
+        détail par poids ('par_point')
+    """
+    if method not in METHODES:
+        raise ValueError(f"Méthode inconnue: {method!r} (attendu: {', '.join(METHODES)})")
+
+    weights = np.linspace(0.0, 1.0, 201) if weights is None else np.asarray(weights, dtype=float).ravel()
+    params = dict(
+        weights=weights,
+        min_budget_par_canal=min_budget_par_canal,
+        max_variation=max_variation,
+        lambda_reg=lambda_reg,
+        method=method,
+        granularite=granularite,
+    )
+    if cache is not None:
+        return cache.obtenir(cache.cle("pareto_front", df, **params), lambda: pareto_front(df, **params))
+
+    debut = time.perf_counter()
+    prep = _preparer(df, min_budget_par_canal, max_variation, granularite)
+    lower_bounds, upper_bounds = prep['lower_bounds'], prep['upper_bounds']
+    budget_total = prep['budget_total']
+    x_center = prep['x0']
+    m, n = len(weights), len(x_center)
+    temps = {'preparation': time.perf_counter() - debut}
+    par_point = None
+
+    X = np.empty((m, n))
+    success = np.zeros(m, dtype=bool)
+    if method in ("auto", "waterfill"):
+        # Par blocs de lignes pour borner la mémoire des tris (m x 2n)
+        pas = max(1, TAILLE_BLOC // max(1, 2 * n))
+        for premier in range(0, m, pas):
+            bloc = slice(premier, premier + pas)
+            X[bloc] = _waterfill_lot(
+                _cout(prep, weights[bloc]), lambda_reg, x_center, lower_bounds, upper_bounds, budget_total
+            )
+        success[:] = np.abs(X.sum(axis=1) - budget_total) <= 1e-9 * max(1.0, abs(budget_total))
+    else:
+        x_depart = prep['x0']
+        par_point = {'temps': np.zeros(m), 'iterations': np.zeros(m, dtype=int), 'repli': np.zeros(m, dtype=bool), 'solveur': []}
+        for k, w in enumerate(weights):
+            res = _resoudre_scipy(
+                _cout(prep, w), lambda_reg, x_depart, x_center,
+                lower_bounds, upper_bounds, budget_total, method,
+            )
+            X[k] = res.x
+            success[k] = res.success
+            par_point['temps'][k] = res.telemetrie['temps']['resolution'] + res.telemetrie['temps']['repli']
+            par_point['iterations'][k] = res.telemetrie['iterations']
+            par_point['repli'][k] = res.telemetrie['repli']
+            par_point['solveur'].append(res.telemetrie['solveur'])
+            if res.success:
+                x_depart = np.clip(res.x, lower_bounds, upper_bounds)
+    temps['resolution'] = time.perf_counter() - debut - temps['preparation']
+
+    contacts_utiles, carbone_g = evaluer(df, X)
+    telemetrie = _telemetrie_front(
+        "waterfill" if method in ("auto", "waterfill") else method, prep, weights, X, lambda_reg, temps, par_point,
+    )
+    temps['total'] = time.perf_counter() - debut
+    return OptimizeResult(
+        w_carbone=weights,
+        x=X,
+        contacts_utiles=contacts_utiles,
+        carbone_g=carbone_g,
+        success=success,
+        telemetrie=telemetrie,
+    )
+
+
+def _segment(prep, labels, lambda_reg, x_center, d, e):
+    """
+    Pour un ensemble actif fixé (labels: -1 borne basse, 0 libre, +1 borne haute), renvoie
+    nu(w) = nu0 + nu1 * w et x(w) = x0 + x1 * w (valables tant que l'ensemble actif ne change pas).
+    Nécessite au moins un support libre.
+    """
+    lower_bounds, upper_bounds = prep['lower_bounds'], prep['upper_bounds']
+    libres = labels == 0
+    k = int(libres.sum())
+    fixe = np.where(labels < 0, lower_bounds, upper_bounds)
+    reste = prep['budget_total'] - float(fixe[~libres].sum())
+    # x_i = xc_i - (c_i(w) + nu(w)) / lambda, c(w) = -e + w d, et sum_F x_i = reste
+    nu0 = lambda_reg * (float(x_center[libres].sum()) - reste) / k + float(e[libres].mean())
+    nu1 = -float(d[libres].mean())
+    x0 = np.where(libres, x_center - (-e + nu0) / lambda_reg, fixe)
+    x1 = np.where(libres, -(d + nu1) / lambda_reg, 0.0)
+    return nu0, nu1, x0, x1
+
+
+def pareto_exact(
+    df,
+    min_budget_par_canal=1000,
+    max_variation=0.5,
+    lambda_reg=1e-7,
+    max_iter=None,
+    granularite="support",
+    cache=None,
+):
+    """
+    Front de Pareto exact par homotopie sur w_carbone.
+
+    Le coût c(w) = -e + w * (e + g) est affine en w: tant que l'ensemble des supports saturés
+    (borne basse / haute) ne change pas, l'allocation optimale est affine en w et le front est
+    un segment. On suit ces ensembles actifs de w = 0 à w = 1 et on ne garde que les points
+    de cassure: le front entier est la ligne brisée qui les relie (aucun échantillonnage).
+
+    Paramètres: ceux d'optimisation_media (lambda_reg > 0), plus
+      - max_iter: nombre max de points de cassure (par défaut 4n + 10)
+      - cache: CacheResultats optionnel
+
+    Retourne un OptimizeResult avec:
+      - w_carbone: (k,) poids des points de cassure (0 et 1 inclus)
+      - x: (k, n) allocations en ces points
+      - contacts_utiles, carbone_g: (k,) totaux de chaque allocation
+      - changements: liste (k,) de listes [(indice, ancien, nouveau)], états 'bas'/'libre'/'haut'
+      - success: bool
+      - telemetrie: comme pareto_front (itérations = événements de l'homotopie)
+    """
+    if lambda_reg <= 0:
+        raise ValueError("pareto_exact nécessite lambda_reg > 0")
+    params = dict(
+        min_budget_par_canal=min_budget_par_canal,
+        max_variation=max_variation,
+        lambda_reg=lambda_reg,
+        max_iter=max_iter,
+        granularite=granularite,
+    )
+    if cache is not None:
+        return cache.obtenir(cache.cle("pareto_exact", df, **params), lambda: pareto_exact(df, **params))
+
+    debut = time.perf_counter()
+    prep = _preparer(df, min_budget_par_canal, max_variation, granularite)
+    lower_bounds, upper_bounds = prep['lower_bounds'], prep['upper_bounds']
+    x_center = prep['x0']
+    n = len(x_center)
+    e = prep['efficacite'] / prep['std_contacts']
+    d = prep['carbone'] / prep['std_carbone'] + e
+    temps = {'preparation': time.perf_counter() - debut}
+    max_iter = 4 * n + 10 if max_iter is None else max_iter
+    etats = {-1: 'bas', 0: 'libre', 1: 'haut'}
+
+    # Ensemble actif initial à w = 0
+    x = _waterfill_lot(_cout(prep, [0.0]), lambda_reg, x_center, lower_bounds, upper_bounds, prep['budget_total'])[0]
+    tol_x = 1e-9 * max(1.0, float(upper_bounds.max()))
+    labels = np.zeros(n, dtype=int)
+    labels[x <= lower_bounds + tol_x] = -1
+    labels[x >= upper_bounds - tol_x] = 1
+    labels[lower_bounds == upper_bounds] = 1
+
+    w = 0.0
+    poids, allocations, changements = [0.0], [x], [[]]
+    success = True
+    iterations = 0
+    for iterations in range(1, max_iter + 1):
+        libres = labels == 0
+        if libres.any():
+            nu0, nu1, x0, x1 = _segment(prep, labels, lambda_reg, x_center, d, e)
+            evenements = np.full(n, np.inf)
+            nouveaux = labels.copy()
+            with np.errstate(divide="ignore", invalid="ignore"):
+                # Support libre qui atteint une borne
+                w_haut = (upper_bounds - x0) / x1
+                w_bas = (lower_bounds - x0) / x1
+                vers_haut = libres & (x1 > 0)
+                vers_bas = libres & (x1 < 0)
+                evenements[vers_haut] = w_haut[vers_haut]
+                nouveaux[vers_haut] = 1
+                evenements[vers_bas] = w_bas[vers_bas]
+                nouveaux[vers_bas] = -1
+                # Support saturé dont le gradient réduit p_i(w) change de signe
+                borne = np.where(labels < 0, lower_bounds, upper_bounds)
+                p0 = -e + nu0 + lambda_reg * (borne - x_center)
+                p1 = d + nu1
+                w_p = -p0 / p1
+                sortie = ((labels > 0) & (p1 > 0)) | ((labels < 0) & (p1 < 0))
+                evenements[sortie] = w_p[sortie]
+                nouveaux[sortie] = 0
+            evenements[evenements < w] = w
+        else:
+            # Aucun support libre: nu est dans un intervalle [max_bas, min_haut] qui se referme
+            # quand un support en borne basse et un en borne haute deviennent libres ensemble.
+            x0, x1 = np.where(labels < 0, lower_bounds, upper_bounds), np.zeros(n)
+            # -(c_i(w) + lambda (b_i - xc_i)) = q0_i + q1_i w
+            q0 = e - lambda_reg * (x0 - x_center)
+            q1 = -d
+            bas, haut = np.flatnonzero(labels < 0), np.flatnonzero(labels > 0)
+            # intervalle vide quand q_bas(w) > q_haut(w)
+            dq0 = q0[bas][:, None] - q0[haut][None, :]
+            dq1 = q1[bas][:, None] - q1[haut][None, :]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                w_paires = np.where(dq1 > 0, -dq0 / dq1, np.inf)
+            w_paires = np.maximum(w_paires, w)
+            evenements = np.full(n, np.inf)
+            nouveaux = labels.copy()
+            if w_paires.size:
+                ib, ih = np.unravel_index(np.argmin(w_paires), w_paires.shape)
+                evenements[[bas[ib], haut[ih]]] = w_paires[ib, ih]
+                nouveaux[[bas[ib], haut[ih]]] = 0
+
+        w_suivant = float(evenements.min())
+        if w_suivant >= 1.0:
+            break
+        concernes = np.flatnonzero(evenements <= w_suivant + 1e-12)
+        w = w_suivant
+        x = np.clip(x0 + x1 * w, lower_bounds, upper_bounds)
+        changement = [(int(i), etats[int(labels[i])], etats[int(nouveaux[i])]) for i in concernes]
+        labels[concernes] = nouveaux[concernes]
+        if poids[-1] == w:
+            # Plusieurs changements simultanés: un seul point de cassure
+            allocations[-1] = x
+            changements[-1].extend(changement)
+        else:
+            poids.append(w)
+            allocations.append(x)
+            changements.append(changement)
+    else:
+        success = False
+
+    x_fin = _waterfill_lot(_cout(prep, [1.0]), lambda_reg, x_center, lower_bounds, upper_bounds, prep['budget_total'])[0]
+    poids.append(1.0)
+    allocations.append(x_fin)
+    changements.append([])
+
+    X = np.array(allocations)
+    temps['resolution'] = time.perf_counter() - debut - temps['preparation']
+    contacts_utiles, carbone_g = evaluer(df, X)
+    poids = np.array(poids)
+    telemetrie = _telemetrie_front("homotopie", prep, poids, X, lambda_reg, temps)
+    telemetrie['iterations'] = iterations
+    temps['total'] = time.perf_counter() - debut
+    return OptimizeResult(
+        w_carbone=poids,
+        x=X,
+        contacts_utiles=contacts_utiles,
+        carbone_g=carbone_g,
+        changements=changements,
+        success=success,
+        telemetrie=telemetrie,
+    )
+
+
+def _carbone_minimal(prep):
+    """Carbone minimal (g) sous les bornes de prep: bornes basses, puis remplissage par carbone croissant."""
+    lower_bounds, upper_bounds, k = prep['lower_bounds'], prep['upper_bounds'], prep['carbone']
+    ordre = np.argsort(k, kind="stable")
+    capacite = (upper_bounds - lower_bounds)[ordre]
+    ajout = np.clip(prep['budget_total'] - lower_bounds.sum() - (np.cumsum(capacite) - capacite), 0.0, capacite)
+    return float(k @ lower_bounds + k[ordre] @ ajout)
+
+
+def carbone_minimal(df, min_budget_par_canal=1000, max_variation=0.5, granularite="support"):
+    """
+    Carbone minimal atteignable (g) avec le budget total et les bornes d'optimisation_media:
+    plus petit plafond accepté par optimisation_plafond_carbone. Sans résolution (un tri).
+    Lève ValueError si les bornes sont infaisables.
+    """
+    return _carbone_minimal(_preparer(df, min_budget_par_canal, max_variation, granularite))
+
+
+def optimisation_plafond_carbone(
+    df,
+    carbone_max,
+    min_budget_par_canal=1000,
+    max_variation=0.5,
+    lambda_reg=1e-7,
+    granularite="support",
+    cache=None,
+):
+    """
+    Mode epsilon-contrainte: maximise les contacts utiles sous un plafond de carbone en
+    grammes (carbone = somme des Carbone_per_euro x budget), au lieu de pondérer le carbone
+    par w_carbone. Mêmes bornes et régularisation qu'optimisation_media avec w_carbone = 0.
+
+    Paramètres: ceux d'optimisation_media (lambda_reg > 0), plus
+      - carbone_max: plafond (g), ou vecteur de plafonds: le front entier en un appel
+      - cache: CacheResultats optionnel
+
+    Résolution exacte par _resoudre_plafond_carbone (water-filling sur le coût augmenté du
+    multiplicateur du plafond), tous les plafonds d'un bloc. Un plafond au-dessus du carbone
+    de l'optimum sans plafond n'est pas atteint.
+
+    Retourne un OptimizeResult avec carbone_max, x, contacts_utiles, carbone_g,
+    contacts_par_gramme (contacts utiles gagnés par gramme de plafond en plus, au premier
+    ordre; 0 si le plafond n'est pas atteint), success, message, nit et telemetrie: valeurs
+    scalaires et x (n,) pour un plafond, vecteurs et x (m, n) pour un vecteur de plafonds.
+    Lève ValueError pour un plafond unique sous le carbone minimal atteignable; dans un
+    vecteur, ces plafonds ont x à NaN et success faux.
+    """
+    plafonds = np.asarray(carbone_max, dtype=float)
+    params = dict(
+        carbone_max=plafonds,
+        min_budget_par_canal=min_budget_par_canal,
+        max_variation=max_variation,
+        lambda_reg=lambda_reg,
+        granularite=granularite,
+    )
+    if cache is not None:
+        return cache.obtenir(
+            cache.cle("optimisation_plafond_carbone", df, **params),
+            lambda: optimisation_plafond_carbone(df, **params),
+        )
+    if lambda_reg <= 0:
+        raise ValueError("optimisation_plafond_carbone nécessite lambda_reg > 0")
+    if np.isnan(plafonds).any():
+        raise ValueError("carbone_max: plafond manquant (NaN)")
+
+    debut = time.perf_counter()
+    prep = _preparer(df, min_budget_par_canal, max_variation, granularite)
+    lower_bounds, upper_bounds, k = prep['lower_bounds'], prep['upper_bounds'], prep['carbone']
+    budget_total = prep['budget_total']
+    c = _cout(prep, 0.0)
+    carbone_min = _carbone_minimal(prep)
+    faisables = plafonds.ravel() >= carbone_min * (1 - 1e-9) - 1e-9
+    if plafonds.ndim == 0 and not faisables[0]:
+        raise ValueError(
+            f"Problème infaisable: plafond de carbone {float(plafonds):.0f} g < carbone minimal {carbone_min:.0f} g"
+        )
+    duree_preparation = time.perf_counter() - debut
+
+    m, n = plafonds.size, len(c)
+    X = np.full((m, n), np.nan)
+    rho = np.zeros(m)
+    iterations = 0
+    indices = np.flatnonzero(faisables)
+    # Par blocs de plafonds pour borner la mémoire des tris (m x 2n)
+    taille = max(1, TAILLE_BLOC // max(1, 2 * n))
+    for premier in range(0, len(indices), taille):
+        bloc = indices[premier:premier + taille]
+        X[bloc], rho[bloc], nit = _resoudre_plafond_carbone(
+            c, k, np.maximum(plafonds.ravel()[bloc], carbone_min), lambda_reg, prep['x0'],
+            lower_bounds, upper_bounds, budget_total,
+        )
+        iterations = max(iterations, nit)
+    duree_resolution = time.perf_counter() - debut - duree_preparation
+
+    unique = plafonds.ndim == 0
+    contacts_utiles, carbone_g = evaluer(df, X[0] if unique else X)
+    carbone_g = np.atleast_1d(carbone_g)
+    tolerance = 1e-9 * np.maximum(1.0, np.abs(plafonds.ravel()))
+    success = faisables & (
+        (np.abs(X.sum(axis=1) - budget_total) <= 1e-9 * max(1.0, budget_total))
+        & ((np.abs(carbone_g - plafonds.ravel()) <= tolerance) | ((rho == 0) & (carbone_g <= plafonds.ravel() + tolerance)))
+    )
+    diagnostic = _diagnostic(
+        np.where(faisables[:, None], X, prep['x0']), c + rho[:, None] * k, lambda_reg, prep['x0'],
+        lower_bounds, upper_bounds, budget_total,
+    )
+    # Dépassement du plafond converti en euros (intensité carbone moyenne), comme les contraintes de budget
+    depassement = np.maximum(carbone_g - plafonds.ravel(), 0.0) / max(float(np.mean(k)), 1e-12)
+    violation = np.where(faisables, np.maximum(diagnostic['violation_contraintes'], depassement), np.nan)
+    residu = np.where(faisables, diagnostic['residu_kkt'], np.nan)
+    telemetrie = {
+        'solveur': "plafond_carbone",
+        'repli': False,
+        'cache': False,
+        'temps': {'preparation': duree_preparation, 'resolution': duree_resolution},
+        'iterations': int(iterations),
+        'evaluations': 0,
+        'nb_variables': n,
+        'depart_a_chaud': False,
+        'violation_contraintes': float(np.nanmax(violation, initial=0.0)),
+        'residu_kkt': float(np.nanmax(residu, initial=0.0)),
+    }
+    if plafonds.ndim:
+        telemetrie.update(nb_points=m, par_point={
+            'carbone_max': plafonds.ravel(), 'violation_contraintes': violation, 'residu_kkt': residu,
+        })
+    telemetrie['temps']['total'] = time.perf_counter() - debut
+
+    nb_echecs = int((~success).sum())
+    return OptimizeResult(
+        carbone_max=plafonds[()],
+        x=X[0] if unique else X,
+        contacts_utiles=contacts_utiles,
+        carbone_g=carbone_g[0] if unique else carbone_g,
+        contacts_par_gramme=(rho * prep['std_contacts'])[0] if unique else rho * prep['std_contacts'],
+        success=bool(success[0]) if unique else success,
+        status=int(not success[0]) if unique else (~success).astype(int),
+        message=(
+            "Solution exacte (plafond de carbone)" if not nb_echecs
+            else f"{nb_echecs} plafond(s) infaisable(s) ou non atteint(s) (carbone minimal {carbone_min:.0f} g)"
+        ),
+        nit=iterations,
+        carbone_min=carbone_min,
+        telemetrie=telemetrie,
+    )
+
+
+def optimisation_robuste(
+    df,
+    incertitudes,
+    w_carbone=0.5,
+    critere="cvar",
+    niveau=0.95,
+    min_budget_par_canal=1000,
+    max_variation=0.5,
+    lambda_reg=1e-7,
+    nb_scenarios=NB_SCENARIOS_ROBUSTE,
+    loi="triangulaire",
+    graine=1,
+    cache=None,
+):
+    """
+    Optimisation robuste aux incertitudes sur CO2g/Contact et Alpha (facteurs multiplicatifs par
+    support, voir incertitude.tirer_facteurs), par support. L'objectif est celui
+    d'optimisation_media (w * carbone - (1 - w) * contacts utiles, normalisés), dont on
+    minimise selon critere:
+      - "cvar": la CVaR au niveau niveau (moyenne des 1 - niveau scénarios les plus coûteux)
+                sur nb_scenarios tirages, par programme linéaire (HiGHS, formulation de
+                Rockafellar-Uryasev; sans régularisation L2)
+      - "pire_cas": le coût au pire des intervalles (carbone au maximum, contacts au minimum:
+                    avec des budgets positifs, le pire de chaque support), par water-filling
+
+    Paramètres: ceux d'optimisation_media, plus
+      - incertitudes: DataFrame indexé par Support, colonnes 'CO2' et 'Alpha' (0.2 = ±20 %)
+      - nb_scenarios, loi, graine: tirages de la CVaR (graine différente de celle de
+                                   l'évaluation, pour évaluer hors échantillon)
+      - cache: CacheResultats optionnel
+
+    Retourne un OptimizeResult (.x, .fun: critère à l'optimum, .success, .message, .nit, .critere,
+    .telemetrie comme optimisation_media).
+    """
+    if critere not in CRITERES_ROBUSTES:
+        raise ValueError(f"Critère inconnu: {critere!r} (attendu: {', '.join(CRITERES_ROBUSTES)})")
+    if not 0 <= niveau < 1:
+        raise ValueError("niveau doit être dans [0, 1[")
+    params = dict(
+        incertitudes=incertitudes,
+        w_carbone=w_carbone,
+        critere=critere,
+        niveau=niveau,
+        min_budget_par_canal=min_budget_par_canal,
+        max_variation=max_variation,
+        lambda_reg=lambda_reg,
+        nb_scenarios=nb_scenarios,
+        loi=loi,
+        graine=graine,
+    )
+    if cache is not None:
+        # Incertitudes alignées sur les supports de df (l'empreinte ignore l'index)
+        cle = cache.cle("optimisation_robuste", df, **{**params, 'incertitudes': incertitudes.reindex(df['Support'])})
+        return cache.obtenir(cle, lambda: optimisation_robuste(df, **params))
+
+    debut = time.perf_counter()
+    prep = _preparer(df, min_budget_par_canal, max_variation)
+    lower_bounds, upper_bounds, budget_total = prep['lower_bounds'], prep['upper_bounds'], prep['budget_total']
+    n = len(lower_bounds)
+    # Tirages de la CVaR (un seul au pire cas: validation des incertitudes et des supports)
+    tirages = tirer_facteurs(incertitudes, nb_scenarios if critere == "cvar" else 1, loi, graine)
+    duree_preparation = time.perf_counter() - debut
+
+    if critere == "pire_cas":
+        co2_max, alpha_min = tirages.bornes(df)
+        c = (
+            w_carbone * prep['carbone'] * co2_max / prep['std_carbone']
+            - (1 - w_carbone) * prep['efficacite'] * alpha_min / prep['std_contacts']
+        )
+        res = _waterfill(c, lambda_reg, prep['x0'], lower_bounds, upper_bounds, budget_total)
+        diagnostic = _diagnostic(res.x, c, lambda_reg, prep['x0'], lower_bounds, upper_bounds, budget_total)
+        res.telemetrie['solveur'] = "pire_cas"
+    else:
+        # min t + somme(u) / ((1 - niveau) N)  sous  u_j >= G_j . x - t, u >= 0, avec x = budget_total * y
+        contacts, carbone = tirages.coefficients(df)
+        G = budget_total * (
+            w_carbone * carbone / prep['std_carbone'] - (1 - w_carbone) * contacts / prep['std_contacts']
+        )
+        N = len(G)
+        objectif = np.concatenate((np.zeros(n), [1.0], np.full(N, 1.0 / ((1 - niveau) * N))))
+        A_ub = sparse.hstack([sparse.csr_matrix(G), -np.ones((N, 1)), -sparse.eye(N)], format="csr")
+        A_eq = np.concatenate((np.ones(n), np.zeros(N + 1)))[None, :]
+        bornes = np.concatenate((
+            np.column_stack((lower_bounds, upper_bounds)) / budget_total,
+            [[-np.inf, np.inf]],
+            np.column_stack((np.zeros(N), np.full(N, np.inf))),
+        ))
+        duree_preparation = time.perf_counter() - debut
+        lp = linprog(objectif, A_ub=A_ub, b_ub=np.zeros(N), A_eq=A_eq, b_eq=[1.0], bounds=bornes, method="highs")
+        x = lp.x[:n] * budget_total if lp.x is not None else prep['x0'].copy()
+        res = OptimizeResult(
+            x=x,
+            fun=float(lp.fun) if lp.x is not None else np.nan,
+            success=bool(lp.success),
+            status=0 if lp.success else 1,
+            message=f"Solution optimale (CVaR {100 * niveau:.0f} %, {N} scénarios)" if lp.success else lp.message,
+            nit=int(lp.nit),
+            nfev=0,
+        )
+        res.telemetrie = _telemetrie_solveur("cvar", res, time.perf_counter() - debut - duree_preparation)
+        res.telemetrie['depart_a_chaud'] = False
+        # Stationnarité du programme linéaire (multiplicateurs de HiGHS), relative à max(1, |coût|)
+        residu = np.nan
+        if lp.success:
+            stationnarite = (
+                objectif - A_ub.T @ lp.ineqlin.marginals - A_eq[0] * lp.eqlin.marginals[0]
+                - lp.lower.marginals - lp.upper.marginals
+            )
+            residu = float(np.abs(stationnarite).max() / max(1.0, float(np.abs(objectif).max())))
+        diagnostic = _diagnostic(x, np.zeros(n), 0.0, prep['x0'], lower_bounds, upper_bounds, budget_total)
+        diagnostic['residu_kkt'] = np.array([residu])
+
+    res.critere = critere
+    res.telemetrie['temps']['preparation'] = duree_preparation
+    res.telemetrie['temps']['total'] = time.perf_counter() - debut
+    res.telemetrie['nb_variables'] = n
+    res.telemetrie.update({cle: float(valeur[0]) for cle, valeur in diagnostic.items()})
+    return res
+
+
+# Problème partagé par les tâches d'une grille de scénarios (une copie par processus)
+_grille = {}
+
+
+def _initialiser_grille(df, weights, options):
+    _grille.update(df=df, weights=weights, options=options)
+
+
+def _tranche_grille(indice, max_variation, min_budget_par_canal):
+    """Front pour un couple (max_variation, min_budget_par_canal) de la grille, sur tous les poids."""
+    weights = _grille['weights']
+    try:
+        front = pareto_front(
+            _grille['df'], weights=weights, min_budget_par_canal=min_budget_par_canal,
+            max_variation=max_variation, **_grille['options'],
+        )
+    except ValueError as e:
+        m, n = len(weights), len(_grille['df'])
+        front = OptimizeResult(
+            w_carbone=weights, x=np.full((m, n), np.nan), contacts_utiles=np.full(m, np.nan),
+            carbone_g=np.full(m, np.nan), success=np.zeros(m, dtype=bool), telemetrie=None, erreur=str(e),
+        )
+    front.update(indice=indice, max_variation=max_variation, min_budget_par_canal=min_budget_par_canal)
+    front.setdefault('erreur', None)
+    return front
+
+
+def grille_scenarios(
+    df,
+    w_carbone,
+    max_variation,
+    min_budget_par_canal,
+    lambda_reg=1e-7,
+    method="auto",
+    granularite="support",
+    max_workers=None,
+    annulation=None,
+):
+    """
+    Grille de scénarios w_carbone x max_variation x min_budget_par_canal, répartie sur un
+    ProcessPoolExecutor. Chaque tâche résout tous les poids d'un couple (max_variation,
+    min_budget_par_canal) avec pareto_front (d'un bloc avec waterfill).
+
+    Générateur: les tranches sont renvoyées dans l'ordre où elles se terminent, pour mettre
+    à jour graphique et progression au fil de l'eau. Arrêter l'itération (ou fermer le
+    générateur) annule les tâches non commencées.
+
+    Paramètres: ceux de pareto_front, plus
+      - w_carbone, max_variation, min_budget_par_canal: valeurs (scalaires ou listes) de la grille
+      - max_workers: nombre de processus (défaut: nombre de cœurs; 1 => calcul dans ce processus)
+      - annulation: objet optionnel avec is_set() (ex: threading.Event), vérifié entre les
+                    tranches; la grille s'arrête dès qu'il est levé
+
+    Chaque tranche est l'OptimizeResult de pareto_front (w_carbone, x, contacts_utiles,
+    carbone_g, success, telemetrie) avec 'indice' (position dans la grille), 'max_variation',
+    'min_budget_par_canal' et 'erreur' (message si le scénario est infaisable, sinon None).
+    """
+    if method not in METHODES:
+        raise ValueError(f"Méthode inconnue: {method!r} (attendu: {', '.join(METHODES)})")
+    if granularite not in GRANULARITES:
+        raise ValueError(f"Granularité inconnue: {granularite!r} (attendu: {', '.join(GRANULARITES)})")
+
+    weights = np.atleast_1d(np.asarray(w_carbone, dtype=float))
+    tranches = [
+        (indice, float(mv), float(mb))
+        for indice, (mv, mb) in enumerate(
+            (mv, mb) for mv in np.atleast_1d(max_variation) for mb in np.atleast_1d(min_budget_par_canal)
+        )
+    ]
+    df = df[list(COLONNES_PROBLEME)].copy()
+    options = dict(lambda_reg=lambda_reg, method=method, granularite=granularite)
+    max_workers = min(max_workers or os.cpu_count() or 1, len(tranches))
+
+    if max_workers <= 1:
+        _initialiser_grille(df, weights, options)
+        for tranche in tranches:
+            if annulation is not None and annulation.is_set():
+                return
+            yield _tranche_grille(*tranche)
+        return
+
+    executeur = ProcessPoolExecutor(
+        max_workers=max_workers, initializer=_initialiser_grille, initargs=(df, weights, options)
+    )
+    try:
+        en_cours = {executeur.submit(_tranche_grille, *tranche) for tranche in tranches}
+        while en_cours:
+            termines, en_cours = wait(en_cours, timeout=ATTENTE_ANNULATION, return_when=FIRST_COMPLETED)
+            for tache in termines:
+                if annulation is not None and annulation.is_set():
+                    return
+                yield tache.result()
+            if annulation is not None and annulation.is_set():
+                return
+    finally:
+        # Fin normale, annulation ou générateur fermé: les tâches non commencées sont abandonnées
+        executeur.shutdown(wait=False, cancel_futures=True)
+
+
+def point_coude(carbone, contacts):
+    """
+    Indice du point de compromis (coude) d'un front: le point le plus éloigné de la corde
+    reliant les deux extrémités, axes normalisés dans [0, 1].
+    """
+    carbone = np.asarray(carbone, dtype=float)
+    contacts = np.asarray(contacts, dtype=float)
+    if len(carbone) < 3:
+        return 0
+    etendue_x = np.ptp(carbone) or 1.0
+    etendue_y = np.ptp(contacts) or 1.0
+    xn = (carbone - carbone.min()) / etendue_x
+    yn = (contacts - contacts.min()) / etendue_y
+    dx, dy = xn[-1] - xn[0], yn[-1] - yn[0]
+    distance = np.abs(dy * (xn - xn[0]) - dx * (yn - yn[0]))
+    return int(np.argmax(distance))
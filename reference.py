@@ -0,0 +1,110 @@
+import os
+import pickle
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Fichier de référence des facteurs CO2 par support
+FICHIER_REFERENCE = 'CO2g contact.xlsx'
+# Version du format du cache binaire (à incrémenter si TableSupports change)
+VERSION_CACHE = 1
+
+_tables = {}
+_verrou = threading.Lock()
+
+
+class TableSupports:
+    """
+    Facteurs de référence par support: CO2g/Contact et Alpha (NaN si non défini).
+    Recherche en O(1) par nom de support.
+    """
+
+    def __init__(self, supports, co2, alpha):
+        self.noms = list(supports)
+        self.co2_g_contact = np.asarray(co2, dtype=float)
+        self.alphas = np.asarray(alpha, dtype=float)
+        self.index = {}
+        for i, support in enumerate(self.noms):
+            self.index.setdefault(support, i)  # première ligne si doublon
+        self.supports = sorted(self.index)
+
+    def __contains__(self, support):
+        return support in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def facteurs(self, support):
+        """(CO2g/Contact, Alpha) du support; KeyError si inconnu."""
+        i = self.index[support]
+        return float(self.co2_g_contact[i]), float(self.alphas[i])
+
+    def co2(self, support):
+        return float(self.co2_g_contact[self.index[support]])
+
+    def alpha(self, support):
+        """Alpha du support, NaN si non défini ou support inconnu."""
+        i = self.index.get(support)
+        return float(self.alphas[i]) if i is not None else float("nan")
+
+    def to_dataframe(self):
+        return pd.DataFrame({'Support': self.noms, 'CO2g/Contact': self.co2_g_contact, 'Alpha': self.alphas})
+
+
+def charger_reference(chemin=FICHIER_REFERENCE):
+    """
+    Charge la table de référence des supports.
+
+    Le fichier Excel n'est lu (openpyxl) qu'une fois: il est compilé dans un cache binaire
+    voisin ('.<nom>.cache.pkl'), réutilisé tant que la date de modification et la taille de
+    l'Excel ne changent pas. La table est aussi gardée en mémoire pour le processus.
+    """
+    stat = os.stat(chemin)
+    signature = (VERSION_CACHE, stat.st_mtime_ns, stat.st_size)
+    with _verrou:
+        en_memoire = _tables.get(chemin)
+        if en_memoire is not None and en_memoire[0] == signature:
+            return en_memoire[1]
+
+    chemin_cache = _chemin_cache(chemin)
+    table = None
+    try:
+        with open(chemin_cache, "rb") as f:
+            contenu = pickle.load(f)
+        if contenu.get('signature') == signature:
+            table = TableSupports(contenu['supports'], contenu['co2'], contenu['alpha'])
+    except (OSError, pickle.UnpicklingError, EOFError, KeyError, AttributeError):
+        pass
+
+    if table is None:
+        table = _compiler(chemin)
+        contenu = {
+            'signature': signature,
+            'supports': table.noms,
+            'co2': table.co2_g_contact,
+            'alpha': table.alphas,
+        }
+        try:
+            with open(chemin_cache, "wb") as f:
+                pickle.dump(contenu, f, protocol=pickle.HIGHEST_PROTOCOL)
+        except OSError:
+            pass  # dossier en lecture seule: le cache mémoire suffit
+
+    with _verrou:
+        _tables[chemin] = (signature, table)
+    return table
+
+
+def _compiler(chemin):
+    """Lit l'Excel de référence et garde Support, CO2g/Contact et Alpha (même NaN)."""
+    df = pd.read_excel(chemin)
+    df = df[['Support', 'CO2g/Contact', 'Alpha']]
+    df = df[df['Support'].notna() & df['CO2g/Contact'].notna()]
+    alpha = pd.to_numeric(df['Alpha'], errors="coerce")
+    return TableSupports(df['Support'].astype(str).tolist(), df['CO2g/Contact'].astype(float), alpha)
+
+
+def _chemin_cache(chemin):
+    dossier, nom = os.path.split(chemin)
+    return os.path.join(dossier, f".{nom}.cache.pkl")
@@ -0,0 +1,213 @@
+import numpy as np
+import pandas as pd
+
+# Modèles de courbe de réponse g (contacts d'une ligne selon son budget z), concaves et croissants:
+#   lineaire: z   puissance: z^forme (0 < forme <= 1)   log: log(1 + z/echelle)
+#   hill: z^forme / (z^forme + echelle^forme) (0 < forme <= 1)
+MODELES = ("lineaire", "puissance", "log", "hill")
+
+# Nombre de paramètres de forme de chaque modèle (critère AIC du choix automatique)
+NB_PARAMETRES = {'lineaire': 1, 'puissance': 2, 'log': 2, 'hill': 3}
+
+# Lignes (budget et contacts > 0) nécessaires pour ajuster une courbe: en dessous, linéaire
+MIN_LIGNES_COURBE = 10
+# Au-delà, l'ajustement se fait sur un échantillon régulier des lignes
+ECHANTILLON_COURBE = 5_000
+# Exposant minimal des modèles puissance et hill
+FORME_MIN = 0.05
+# Grilles d'ajustement: échelles relatives aux budgets observés, exposants de hill
+GRILLE_ECHELLES = np.geomspace(1e-3, 1e3, 61)
+GRILLE_FORMES_HILL = np.linspace(0.2, 1.0, 9)
+# Budget minimal par ligne dans les dérivées (g' infinie en 0 pour les exposants < 1)
+Z_MIN = 1e-9
+
+
+def _g(modele, z, forme, echelle):
+    """g(z) d'un modèle, vectorisé (paramètres scalaires ou tableaux de même forme que z)."""
+    if modele == "puissance":
+        return z ** forme
+    if modele == "log":
+        return np.log1p(z / echelle)
+    if modele == "hill":
+        zf = z ** forme
+        return zf / (zf + echelle ** forme)
+    return z
+
+
+def _derivees(modele, z, forme, echelle):
+    """(g'(z), g''(z)) d'un modèle, vectorisées (z > 0)."""
+    if modele == "puissance":
+        d1 = forme * z ** (forme - 1)
+        return d1, d1 * (forme - 1) / z
+    if modele == "log":
+        d1 = 1.0 / (echelle + z)
+        return d1, -d1 * d1
+    if modele == "hill":
+        zf, kf = z ** forme, echelle ** forme
+        somme = zf + kf
+        d1 = forme * kf * zf / (z * somme * somme)
+        return d1, d1 * ((forme - 1) * somme - 2 * forme * zf) / (z * somme)
+    return np.ones_like(z), np.zeros_like(z)
+
+
+def _ecarts_log(log_c, log_g):
+    """
+    Somme des carrés des écarts en log (log c - log a - log g) pour l'amplitude a optimale,
+    par ligne de log_g (grille de paramètres x lignes du plan).
+    """
+    residus = log_c - log_g
+    return ((residus - residus.mean(axis=-1, keepdims=True)) ** 2).sum(axis=-1)
+
+
+def ajuster_courbe(budgets, contacts, modele="auto"):
+    """
+    Ajuste une courbe de réponse contacts = a * g(budget) sur les lignes d'un support.
+
+    Moindres carrés sur les logarithmes (écarts relatifs: lignes de tailles très différentes),
+    amplitude a en forme close; exposant de "puissance" par régression log-log, échelle de
+    "log" et (échelle, exposant) de "hill" sur grille. Avec modele="auto", le modèle retenu
+    minimise l'AIC. Moins de MIN_LIGNES_COURBE lignes exploitables (ou budgets tous égaux):
+    modèle linéaire.
+
+    Retourne un dict {'Modele', 'Forme', 'Echelle', 'R2', 'Lignes'} (Forme / Echelle à NaN si
+    sans objet, R2 sur les logarithmes, Lignes: nombre de lignes à budget > 0).
+    """
+    if modele != "auto" and modele not in MODELES:
+        raise ValueError(f"Modèle de réponse inconnu: {modele!r} (attendu: auto, {', '.join(MODELES)})")
+    budgets = np.asarray(budgets, dtype=float)
+    contacts = np.asarray(contacts, dtype=float)
+    lignes = int(np.count_nonzero(budgets > 0))
+    valides = (budgets > 0) & (contacts > 0) & np.isfinite(budgets) & np.isfinite(contacts)
+    b, c = budgets[valides], contacts[valides]
+    if len(b) > ECHANTILLON_COURBE:
+        pas = -(-len(b) // ECHANTILLON_COURBE)
+        b, c = b[::pas], c[::pas]
+    lineaire = {'Modele': "lineaire", 'Forme': np.nan, 'Echelle': np.nan, 'R2': np.nan, 'Lignes': lignes}
+    log_b, log_c = np.log(b), np.log(c)
+    if len(b) < MIN_LIGNES_COURBE or np.ptp(log_b) < 1e-6 or modele == "lineaire":
+        return lineaire
+
+    # Candidats: (modele, forme, echelle, somme des carrés)
+    candidats = [("lineaire", np.nan, np.nan, _ecarts_log(log_c, log_b))]
+    if modele in ("auto", "puissance"):
+        centre = log_b - log_b.mean()
+        forme = float(np.clip(np.dot(centre, log_c) / np.dot(centre, centre), FORME_MIN, 1.0))
+        candidats.append(("puissance", forme, np.nan, _ecarts_log(log_c, forme * log_b)))
+    echelles = GRILLE_ECHELLES * np.median(b)
+    if modele in ("auto", "log"):
+        ecarts = _ecarts_log(log_c, np.log(np.log1p(b[None, :] / echelles[:, None])))
+        k = int(np.argmin(ecarts))
+        candidats.append(("log", np.nan, float(echelles[k]), ecarts[k]))
+    if modele in ("auto", "hill"):
+        formes = GRILLE_FORMES_HILL[:, None, None]
+        log_g = formes * log_b - np.logaddexp(formes * log_b, formes * np.log(echelles)[None, :, None])
+        ecarts = _ecarts_log(log_c, log_g)
+        i, k = np.unravel_index(np.argmin(ecarts), ecarts.shape)
+        candidats.append(("hill", float(GRILLE_FORMES_HILL[i]), float(echelles[k]), ecarts[i, k]))
+
+    n = len(b)
+    if modele == "auto":
+        aic = [n * np.log(max(sce, 1e-300) / n) + 2 * NB_PARAMETRES[m] for m, _, _, sce in candidats]
+        choisi = candidats[int(np.argmin(aic))]
+    else:
+        choisi = candidats[-1]
+    nom, forme, echelle, sce = choisi
+    total = float(((log_c - log_c.mean()) ** 2).sum())
+    return {
+        'Modele': nom,
+        'Forme': forme,
+        'Echelle': echelle,
+        'R2': 1.0 - float(sce) / total if total > 0 else np.nan,
+        'Lignes': lignes,
+    }
+
+
+def ajuster_courbes(df_lignes, modele="auto"):
+    """
+    Une courbe de réponse par support, ajustée sur ses lignes de plan.
+
+    Paramètres:
+      - df_lignes: une ligne par ligne de plan, colonnes 'Support', 'Budget', 'Contacts'
+      - modele: "auto" (choix par AIC) ou un des MODELES
+
+    Retourne un DataFrame indexé par Support: Modele, Forme, Echelle, R2, Lignes.
+    """
+    courbes = {
+        support: ajuster_courbe(groupe['Budget'].to_numpy(), groupe['Contacts'].to_numpy(), modele)
+        for support, groupe in df_lignes.groupby('Support', sort=False)
+    }
+    return pd.DataFrame.from_dict(
+        courbes, orient="index", columns=['Modele', 'Forme', 'Echelle', 'R2', 'Lignes'],
+    ).rename_axis('Support')
+
+
+def courbes_variables(df_variables, courbes):
+    """
+    Courbes alignées sur les variables de l'optimiseur (paramètre courbes de
+    optimizer.optimisation_media): celle du support de chaque variable, répartie sur ses
+    Lignes en granularité "support", sur une seule ligne en granularité "ligne" (colonne Plan).
+    Un support sans courbe reste linéaire.
+    """
+    alignees = courbes.reindex(df_variables['Support'].to_numpy())
+    alignees['Modele'] = alignees['Modele'].fillna("lineaire")
+    if 'Plan' in df_variables.columns:
+        alignees['Lignes'] = 1
+    alignees['Lignes'] = alignees['Lignes'].fillna(1).clip(lower=1).astype(float)
+    return alignees[['Modele', 'Forme', 'Echelle', 'Lignes']].reset_index(drop=True)
+
+
+class Reponse:
+    """
+    Contacts utiles des variables de l'optimiseur selon leur budget x, avec rendements
+    décroissants: U_i(x) = K_i * g_i(x / n_i), le budget d'une variable étant réparti sur ses
+    n_i lignes (colonne Lignes). K_i ancre la courbe sur la situation initiale:
+    U_i(budget initial) = contacts utiles initiaux (avec g linéaire, U_i(x) = efficacite_i * x).
+    U est concave: -U est un terme convexe de l'objectif.
+    """
+
+    def __init__(self, courbes, budgets, contacts_utiles):
+        modeles = courbes['Modele'].to_numpy()
+        inconnus = set(modeles) - set(MODELES)
+        if inconnus:
+            raise ValueError(f"Modèle de réponse inconnu: {', '.join(map(repr, sorted(inconnus)))}")
+        self.lignes = courbes['Lignes'].to_numpy(dtype=float)
+        budgets = np.asarray(budgets, dtype=float)
+        self._groupes = []
+        for modele in MODELES:
+            indices = np.flatnonzero(modeles == modele)
+            if len(indices):
+                self._groupes.append((
+                    modele, indices,
+                    courbes['Forme'].to_numpy(dtype=float)[indices],
+                    courbes['Echelle'].to_numpy(dtype=float)[indices],
+                ))
+        reference = self._appliquer(_g, budgets)[0]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.ancres = np.where(
+                (budgets > 0) & (reference > 0), np.asarray(contacts_utiles, dtype=float) / reference, 0.0,
+            )
+
+    def _appliquer(self, fonction, x, z_min=0.0):
+        """fonction(modele, z, forme, echelle) par groupe de modèle, résultats remis dans l'ordre des variables."""
+        z = np.maximum(np.asarray(x, dtype=float) / self.lignes, z_min)
+        sorties = None
+        for modele, indices, forme, echelle in self._groupes:
+            valeurs = fonction(modele, z[indices], forme, echelle)
+            valeurs = valeurs if isinstance(valeurs, tuple) else (valeurs,)
+            if sorties is None:
+                sorties = tuple(np.zeros_like(z) for _ in valeurs)
+            for sortie, valeur in zip(sorties, valeurs):
+                sortie[indices] = valeur
+        return sorties if sorties is not None else (np.zeros_like(z),)
+
+    def valeurs(self, x):
+        """U(x): contacts utiles par variable pour l'allocation x (n,) ou (m, n)."""
+        x = np.asarray(x, dtype=float)
+        if x.ndim == 2:
+            return np.vstack([self.valeurs(ligne) for ligne in x])
+        return self.ancres * self._appliquer(_g, x)[0]
+
+    def derivees(self, x):
+        """(U'(x), U''(x)) par variable, dérivées analytiques (U'' <= 0)."""
+        d1, d2 = self._appliquer(_derivees, x, Z_MIN)
+        return self.ancres / self.lignes * d1, self.ancres / self.lignes ** 2 * d2
@@ -0,0 +1,242 @@
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from ingestion import lire_plan
+
+# Base SQLite locale: fichiers déjà lus, plans de l'espace de travail, résultats d'optimisation
+FICHIER_STOCKAGE = '.carbone.sqlite'
+# Version du schéma (à incrémenter si les tables changent: la base est alors recréée)
+VERSION_STOCKAGE = 4
+# Taille des morceaux lus pour l'empreinte du contenu
+TAILLE_MORCEAU = 1 << 20
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fichiers (
+    empreinte TEXT PRIMARY KEY,
+    contacts REAL NOT NULL,
+    budget REAL NOT NULL,
+    nb_lignes INTEGER NOT NULL,
+    nb_rejets INTEGER NOT NULL,
+    lignes_rejetees TEXT NOT NULL,
+    format TEXT,
+    statistiques TEXT,
+    periodes TEXT,
+    lignes_contact BLOB,
+    lignes_budget BLOB,
+    date REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS plans (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    espace TEXT NOT NULL,
+    nom TEXT NOT NULL,
+    support TEXT NOT NULL,
+    co2_factor REAL NOT NULL,
+    empreinte TEXT NOT NULL REFERENCES fichiers(empreinte)
+);
+CREATE INDEX IF NOT EXISTS plans_espace ON plans (espace, id);
+CREATE TABLE IF NOT EXISTS resultats (
+    cle TEXT PRIMARY KEY,
+    resultat BLOB NOT NULL,
+    date REAL NOT NULL
+);
+"""
+
+
+def empreinte_contenu(fichier):
+    """SHA-1 du contenu complet d'un chemin ou d'un objet fichier binaire (repositionné au début)."""
+    h = hashlib.sha1()
+    if isinstance(fichier, (str, bytes)) or hasattr(fichier, "__fspath__"):
+        with open(fichier, "rb") as f:
+            for morceau in iter(lambda: f.read(TAILLE_MORCEAU), b""):
+                h.update(morceau)
+        return h.hexdigest()
+    fichier.seek(0)
+    for morceau in iter(lambda: fichier.read(TAILLE_MORCEAU), b""):
+        h.update(morceau)
+    fichier.seek(0)
+    return h.hexdigest()
+
+
+class Stockage:
+    """
+    Stockage persistant (SQLite) partagé entre sessions et processus:
+      - fichiers: totaux (et par période) et lignes (Contact, Budget) de chaque fichier lu, par
+        empreinte du contenu; un fichier déjà vu n'est pas relu
+      - plans: plans de chaque espace de travail (références légères vers les fichiers): les
+        sessions d'un même espace partagent leurs plans, les autres espaces n'y ont pas accès
+        (fichiers et résultats, identifiés par leur contenu, restent communs)
+      - resultats: résultats d'optimisation / Pareto par clé de CacheResultats
+
+    Thread-safe (une connexion protégée par un verrou).
+    """
+
+    def __init__(self, chemin=FICHIER_STOCKAGE):
+        self.chemin = chemin
+        self._verrou = threading.Lock()
+        self._connexion = sqlite3.connect(chemin, check_same_thread=False, timeout=30)
+        with self._verrou, self._connexion:
+            self._connexion.execute("PRAGMA journal_mode=WAL")
+            version = self._connexion.execute("PRAGMA user_version").fetchone()[0]
+            if version not in (0, VERSION_STOCKAGE):
+                # Schéma d'une ancienne version: tables recréées (base neuve: version 0, rien à supprimer)
+                for table in ("plans", "fichiers", "resultats"):
+                    self._connexion.execute(f"DROP TABLE IF EXISTS {table}")
+            self._connexion.executescript(_SCHEMA)
+            self._connexion.execute(f"PRAGMA user_version={VERSION_STOCKAGE}")
+
+    def _executer(self, requete, parametres=()):
+        with self._verrou, self._connexion:
+            return self._connexion.execute(requete, parametres).fetchall()
+
+    # Fichiers lus
+
+    def lecture(self, empreinte):
+        """
+        Résultat de lecture mémorisé (format de ingestion.lire_plan, 'data' à None) avec
+        'lignes_stockees' (bool), ou None si le fichier n'a jamais été lu.
+        """
+        lignes = self._executer(
+            "SELECT contacts, budget, nb_lignes, nb_rejets, lignes_rejetees, format, statistiques, periodes,"
+            " lignes_contact IS NOT NULL FROM fichiers WHERE empreinte = ?",
+            (empreinte,),
+        )
+        if not lignes:
+            return None
+        contacts, budget, nb_lignes, nb_rejets, lignes_rejetees, fmt, statistiques, periodes, lignes_stockees = lignes[0]
+        return {
+            'contacts': contacts,
+            'budget': budget,
+            'nb_lignes': nb_lignes,
+            'data': None,
+            'format': json.loads(fmt) if fmt else None,
+            'nb_rejets': nb_rejets,
+            'lignes_rejetees': json.loads(lignes_rejetees),
+            'statistiques': json.loads(statistiques) if statistiques else None,
+            'periodes': json.loads(periodes) if periodes else None,
+            'lignes_stockees': bool(lignes_stockees),
+        }
+
+    def enregistrer_lecture(self, empreinte, lecture):
+        """Mémorise totaux et, si lecture['data'] est présent, lignes d'un fichier lu."""
+        data = lecture['data']
+        contact = budget = None
+        if data is not None:
+            contact = np.ascontiguousarray(data['Contact'], dtype=float).tobytes()
+            budget = np.ascontiguousarray(data['Budget'], dtype=float).tobytes()
+        self._executer(
+            "INSERT OR REPLACE INTO fichiers VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                empreinte, lecture['contacts'], lecture['budget'], lecture['nb_lignes'], lecture['nb_rejets'],
+                json.dumps(lecture['lignes_rejetees']), json.dumps(lecture.get('format')),
+                json.dumps(lecture.get('statistiques')), json.dumps(lecture.get('periodes')), contact, budget,
+                time.time(),
+            ),
+        )
+
+    def lignes(self, empreinte, debut=0, fin=None):
+        """
+        DataFrame (Contact, Budget) des lignes [debut, fin) d'un fichier (toutes par défaut),
+        ou None si ses lignes n'ont pas été conservées. Seule la tranche demandée est lue.
+        """
+        taille = np.dtype(float).itemsize
+        # substr de SQLite sur un BLOB: octets à partir de 1, longueur optionnelle
+        tranche = "?1" if fin is None else "?1, ?3"
+        lignes = self._executer(
+            f"SELECT substr(lignes_contact, {tranche}), substr(lignes_budget, {tranche}) FROM fichiers"
+            " WHERE empreinte = ?2 AND lignes_contact IS NOT NULL",
+            (debut * taille + 1, empreinte) + (() if fin is None else (max(0, fin - debut) * taille,)),
+        )
+        if not lignes:
+            return None
+        contact, budget = lignes[0]
+        index = pd.RangeIndex(debut, debut + len(contact) // taille)
+        return pd.DataFrame({'Contact': np.frombuffer(contact), 'Budget': np.frombuffer(budget)}, index=index)
+
+    # Plans de l'espace de travail
+
+    def plans(self, espace):
+        """
+        Plans enregistrés de l'espace de travail, dans l'ordre d'ajout: lecture mémorisée + 'id',
+        'nom', 'support', 'co2_factor', 'empreinte'.
+        """
+        plans = []
+        for id_plan, nom, support, co2_factor, empreinte in self._executer(
+            "SELECT id, nom, support, co2_factor, empreinte FROM plans WHERE espace = ? ORDER BY id", (espace,)
+        ):
+            lecture = self.lecture(empreinte)
+            if lecture is None:
+                continue
+            lecture.update(id=id_plan, nom=nom, support=support, co2_factor=co2_factor, empreinte=empreinte)
+            plans.append(lecture)
+        return plans
+
+    def ajouter_plan(self, plan, espace):
+        """Enregistre un plan (dict de moteur.creer_plan avec 'empreinte') dans l'espace de travail et renvoie son id."""
+        with self._verrou, self._connexion:
+            curseur = self._connexion.execute(
+                "INSERT INTO plans (espace, nom, support, co2_factor, empreinte) VALUES (?, ?, ?, ?, ?)",
+                (espace, plan['nom'], plan['support'], plan['co2_factor'], plan['empreinte']),
+            )
+            return curseur.lastrowid
+
+    def supprimer_plan(self, id_plan, espace):
+        self._executer("DELETE FROM plans WHERE id = ? AND espace = ?", (id_plan, espace))
+
+    def vider_plans(self, espace):
+        self._executer("DELETE FROM plans WHERE espace = ?", (espace,))
+
+    # Résultats d'optimisation
+
+    def resultat(self, cle):
+        """Résultat mémorisé pour une clé de CacheResultats, ou None."""
+        lignes = self._executer("SELECT resultat FROM resultats WHERE cle = ?", (cle,))
+        return pickle.loads(lignes[0][0]) if lignes else None
+
+    def enregistrer_resultat(self, cle, resultat):
+        self._executer(
+            "INSERT OR REPLACE INTO resultats VALUES (?, ?, ?)",
+            (cle, pickle.dumps(resultat, protocol=pickle.HIGHEST_PROTOCOL), time.time()),
+        )
+
+    def vider_resultats(self):
+        self._executer("DELETE FROM resultats")
+
+    def fermer(self):
+        with self._verrou:
+            self._connexion.close()
+
+
+def lire_plan_memorise(fichier, stockage, garder_lignes=False, progression=None, schema=None):
+    """
+    lire_plan avec mémorisation par empreinte du contenu: un fichier déjà lu (avec ses lignes
+    si garder_lignes) n'est pas relu. Les lignes sont enregistrées dans le stockage mais pas
+    renvoyées ('data' à None, voir Stockage.lignes).
+
+    Retourne le dict de lire_plan, plus 'empreinte' et 'lignes_stockees'.
+    """
+    empreinte = empreinte_contenu(fichier)
+    lecture = stockage.lecture(empreinte)
+    if lecture is None or (garder_lignes and not lecture['lignes_stockees']):
+        lecture = lire_plan(fichier, schema=schema, garder_lignes=garder_lignes, progression=progression)
+        stockage.enregistrer_lecture(empreinte, lecture)
+        lecture.update(data=None, lignes_stockees=garder_lignes)
+    elif progression is not None:
+        progression(1.0)
+    lecture['empreinte'] = empreinte
+    return lecture
+
+
+def ouvrir_stockage(chemin=FICHIER_STOCKAGE):
+    """Stockage à ce chemin, ou None si la base ne peut pas être ouverte (dossier en lecture seule...)."""
+    try:
+        return Stockage(chemin)
+    except (sqlite3.Error, OSError):
+        return None
@@ -0,0 +1,141 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Nombre de calculs exécutés en même temps (les autres attendent leur tour)
+NB_TACHES_SIMULTANEES = 2
+# Nombre de tâches terminées conservées (les plus anciennes sont oubliées)
+TAILLE_HISTORIQUE_TACHES = 64
+
+EN_ATTENTE, EN_COURS, TERMINEE, ECHEC, ANNULEE = "en_attente", "en_cours", "terminee", "echec", "annulee"
+ETATS_FINAUX = (TERMINEE, ECHEC, ANNULEE)
+
+
+class Tache:
+    """
+    Calcul exécuté en arrière-plan par un GestionnaireTaches.
+
+    Une fonction soumise avec suivi=True reçoit la Tache en premier argument: elle peut signaler
+    son avancement (avancer) et doit s'arrêter si annulee() devient vrai.
+    Attributs lus par l'interface: etat, progression (0 à 1), message, partiel (résultat
+    partiel optionnel), resultat, erreur, contexte (données libres de l'appelant), duree.
+    """
+
+    def __init__(self, description, contexte=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.description = description
+        self.contexte = contexte or {}
+        self.etat = EN_ATTENTE
+        self.progression = 0.0
+        self.message = ""
+        self.partiel = None
+        self.resultat = None
+        self.erreur = None
+        self.creation = time.time()
+        self.debut = None
+        self.fin = None
+        self._annulation = threading.Event()
+        self._finie = threading.Event()
+
+    @property
+    def terminee(self):
+        return self.etat in ETATS_FINAUX
+
+    @property
+    def duree(self):
+        """Secondes écoulées depuis le début du calcul (jusqu'à sa fin s'il est terminé)."""
+        if self.debut is None:
+            return 0.0
+        return (self.fin or time.time()) - self.debut
+
+    @property
+    def annulation(self):
+        """Événement levé à l'annulation (ex: pour optimizer.grille_scenarios)."""
+        return self._annulation
+
+    def annulee(self):
+        return self._annulation.is_set()
+
+    def avancer(self, progression, message=None, partiel=None):
+        """Avancement du calcul: fraction dans [0, 1], message et résultat partiel optionnels."""
+        self.progression = min(1.0, max(0.0, float(progression)))
+        if message is not None:
+            self.message = message
+        if partiel is not None:
+            self.partiel = partiel
+
+    def attendre(self, timeout=None):
+        """Attend la fin de la tâche (au plus timeout secondes); renvoie vrai si elle est terminée."""
+        return self._finie.wait(timeout)
+
+
+class GestionnaireTaches:
+    """
+    File de calculs en arrière-plan (pool de threads), indépendante du cycle de vie du script
+    Streamlit: partagée entre sessions via st.cache_resource, elle conserve les tâches par id.
+    Un rerun (slider déplacé...) n'interrompt pas un calcul: la page interroge la tâche.
+
+    Les fonctions soumises ne doivent pas appeler Streamlit. Les calculs lourds en Python pur
+    peuvent répartir leur travail sur des processus (ex: optimizer.grille_scenarios).
+    """
+
+    def __init__(self, max_workers=NB_TACHES_SIMULTANEES, taille_historique=TAILLE_HISTORIQUE_TACHES):
+        self.taille_historique = taille_historique
+        self._taches = OrderedDict()
+        self._verrou = threading.Lock()
+        self._executeur = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tache")
+
+    def soumettre(self, description, fonction, *args, contexte=None, suivi=False, **kwargs):
+        """
+        Met en file fonction(*args, **kwargs) (fonction(tache, *args, **kwargs) avec suivi=True)
+        et renvoie l'id de la tâche.
+        """
+        tache = Tache(description, contexte)
+        if suivi:
+            args = (tache,) + args
+        with self._verrou:
+            self._taches[tache.id] = tache
+            self._oublier_anciennes()
+        self._executeur.submit(self._executer, tache, fonction, args, kwargs)
+        return tache.id
+
+    def tache(self, id_tache):
+        """Tâche de cet id, ou None (id inconnu ou tâche oubliée)."""
+        with self._verrou:
+            return self._taches.get(id_tache)
+
+    def taches(self):
+        """Toutes les tâches conservées, de la plus ancienne à la plus récente."""
+        with self._verrou:
+            return list(self._taches.values())
+
+    def annuler(self, id_tache):
+        """Demande l'arrêt d'une tâche (immédiat si elle n'a pas commencé)."""
+        tache = self.tache(id_tache)
+        if tache is not None:
+            tache._annulation.set()
+
+    def _executer(self, tache, fonction, args, kwargs):
+        if tache.annulee():
+            tache.etat = ANNULEE
+            tache._finie.set()
+            return
+        tache.etat, tache.debut = EN_COURS, time.time()
+        try:
+            tache.resultat = fonction(*args, **kwargs)
+            tache.etat = ANNULEE if tache.annulee() else TERMINEE
+            if tache.etat == TERMINEE:
+                tache.progression = 1.0
+        except Exception as e:
+            tache.erreur = f"{type(e).__name__}: {e}"
+            tache.etat = ECHEC
+        finally:
+            tache.fin = time.time()
+            tache._finie.set()
+
+    def _oublier_anciennes(self):
+        finies = [id_tache for id_tache, tache in self._taches.items() if tache.terminee]
+        for id_tache in finies[:max(0, len(self._taches) - self.taille_historique)]:
+            del self._taches[id_tache]